@@ -0,0 +1,55 @@
+import argparse
+import datetime
+import json
+from classes.backtest_class import backtest, summarize
+
+
+def values(text, kind=int):
+    """
+    Parses a comma separated list of values.
+    """
+    return [kind(x) for x in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the planner on the prices in the price store.")
+    parser.add_argument("first", type=datetime.date.fromisoformat, help="first day (YYYY-MM-DD)")
+    parser.add_argument("last", type=datetime.date.fromisoformat, help="last day (YYYY-MM-DD)")
+    parser.add_argument("--max", type=values, help="max_percload values, comma separated")
+    parser.add_argument("--min", type=values, help="min_percload values, comma separated")
+    parser.add_argument("--unload", type=lambda text: values(text, float), help="unload_perc_hour values, comma separated")
+    parser.add_argument("--planner", type=lambda text: values(text, str), default=["heuristic"], help="planners, comma separated (heuristic,optimal)")
+    parser.add_argument("--perc", type=int, default=50, help="battery percentage at 0:00")
+    parser.add_argument("--capacity", type=float, default=20, help="battery capacity (kWh)")
+    parser.add_argument("--maxload", type=float, default=5, help="max load per hour (kWh)")
+    parser.add_argument("--drain", type=float, help="actual consumption per hour (kWh), default unload_perc_hour of every strategy")
+    parser.add_argument("--pv", help="JSON file with the production (Wh) per hour per day: {\"YYYY-MM-DD\": [24 values]}")
+    parser.add_argument("--workers", type=int, help="number of processes")
+    parser.add_argument("--json", help="write the result of every day to this file")
+    args = parser.parse_args()
+
+    with open("config.json") as json_data_file:
+        cfg = json.load(json_data_file)
+
+    grid = {"planner": args.planner}
+    for name, option in (("max_percload", args.max), ("min_percload", args.min), ("unload_perc_hour", args.unload)):
+        grid[name] = option or [cfg["kiwatt"][name]]
+
+    pv = None
+    if args.pv:
+        with open(args.pv) as f:
+            pv = json.load(f)
+
+    results = backtest(cfg, args.first, args.last, grid, args.perc, args.capacity, args.maxload, args.drain, pv, args.workers)
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            file.write(json.dumps(results))
+
+    print("{:<70} {:>5} {:>9} {:>7} {:>6} {:>8} {:>7}".format("strategy", "days", "cost", "cycles", "empty", "invalid", "errors"))
+    for total in summarize(results):
+        print("{strategy:<70} {days:>5} {cost:>9.2f} {cycles:>7.1f} {empty:>6} {invalid:>8} {errors:>7}".format(**total))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark of the streaming ENTSO-e A44 parser against the BeautifulSoup parser it replaced.
+
+Usage: python benchmarks/bench_entsoe.py [entsoe.xml]
+
+Without a file a synthetic document is used: two days of quarter-hour A03 prices with every third
+position left out.
+"""
+import datetime
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from classes.entsoe_class import parse_a44  # noqa: E402
+
+NS = "urn:iec62325.351:tc57wg16:451-3:publicationdocument:7:3"
+
+
+def synthetic_a44(days=2, resolution=15):
+    """
+    Builds an A44 document with one A03 TimeSeries per day.
+
+    Args:
+        days (int): Number of days.
+        resolution (int): Minutes per position.
+
+    Returns:
+        bytes: The XML document.
+    """
+    start = datetime.datetime(2025, 10, 1, 22, 0)
+    series = []
+    for day in range(days):
+        begin = start + datetime.timedelta(days=day)
+        points = "".join(
+            "<Point><position>%d</position><price.amount>%.2f</price.amount></Point>" % (x, 50 + (x * 7) % 90)
+            for x in range(1, 1440 // resolution + 1) if x % 3 != 2
+        )
+        series.append(
+            "<TimeSeries><mRID>%d</mRID><curveType>A03</curveType><Period><timeInterval><start>%s</start><end>%s</end></timeInterval>"
+            "<resolution>PT%dM</resolution>%s</Period></TimeSeries>" % (
+                day + 1, begin.strftime("%Y-%m-%dT%H:%MZ"), (begin + datetime.timedelta(days=1)).strftime("%Y-%m-%dT%H:%MZ"), resolution, points)
+        )
+    return ('<?xml version="1.0" encoding="utf-8"?><Publication_MarketDocument xmlns="%s">%s</Publication_MarketDocument>' % (NS, "".join(series))).encode()
+
+
+def parse_bs4(content):
+    """
+    The BeautifulSoup parser as it was in Battery.get_hour_prices.
+
+    Args:
+        content (bytes): The XML document.
+
+    Returns:
+        dict: Price per position.
+    """
+    import bs4
+
+    soup = bs4.BeautifulSoup(content, 'xml')
+    if len(soup.find_all('Point')) == 0:
+        return None
+    p48 = {}
+    x = 24
+    if len(soup.find_all('timeseries')) > 1:
+        x = 48
+    series_offset = 0
+    for timeseries in soup.find_all('TimeSeries'):
+        for point in timeseries.find_all('Point'):
+            position = int(point.find('position').text) - 1 + series_offset
+            p48[position] = float(point.find('price.amount').text)
+        series_offset += 24
+    for i in range(x):
+        if i not in p48:
+            p48[i] = p48[i - 1] if i > 0 else 0
+    return dict(sorted(p48.items()))
+
+
+def bench(name, function, content, number):
+    """
+    Times a parser and prints the result.
+
+    Args:
+        name (str): Name of the parser.
+        function (callable): The parser.
+        content (bytes): The XML document.
+        number (int): Number of runs.
+    """
+    seconds = min(timeit.repeat(lambda: function(content), number=number, repeat=5)) / number
+    print("{:<12} {:>10.3f} ms".format(name, seconds * 1000))
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'rb') as f:
+            content = f.read()
+    else:
+        content = synthetic_a44()
+
+    curve = parse_a44(content)
+    print("Document: {} bytes, {} slots of {} minutes".format(len(content), len(curve), curve.resolution))
+
+    bench("iterparse", parse_a44, content, 50)
+    try:
+        bench("bs4", parse_bs4, content, 10)
+    except ImportError:
+        print("bs4          not installed")
+
+
+if __name__ == "__main__":
+    main()
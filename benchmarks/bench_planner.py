@@ -0,0 +1,272 @@
+"""
+Benchmark of the planning stages of Battery over growing price curves.
+
+Usage: python benchmarks/bench_planner.py [--xml entsoe.xml] [--forecast forecast.json] [--save]
+
+Every stage is timed and memory profiled on curves of 24 and 48 hourly slots and of 24 and 48 hours of
+quarter-hour slots. The planner plans per hour: hour_prices averages quarter-hour prices to the hour,
+so on the quarter-hour curves the planning stages run on 24 and 48 hours again and only hour_prices
+and notify_ha (the quarter-hour sensor attributes) see 96 and 192 slots. Without files the prices and
+forecast are synthetic, with --xml the prices of a recorded ENTSO-e document are repeated or cut to
+every size. Nothing is fetched and nothing is
+written to the battery or Home Assistant: the Battery is built with run=False on a scratch
+configuration and the Home Assistant client is a stub.
+
+The results of the hourly curves are compared with benchmarks/baseline_planner.json, --save replaces
+the baseline. The quarter-hour curves are shown without a baseline.
+"""
+import argparse
+import array
+import datetime
+import json
+import math
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from classes.battery_class import Battery  # noqa: E402
+from classes.entsoe_class import PriceCurve, parse_a44  # noqa: E402
+from classes.forecast_class import production_vector  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_planner.json")
+
+# Every curve: (label, number of slots, minutes per slot), only the hourly curves are in the baseline
+SIZES = (("24h", 24, 60), ("48h", 48, 60), ("24h@15m", 96, 15), ("48h@15m", 192, 15))
+
+# The day and hour of the planning run
+DAY = datetime.date(2025, 1, 6)
+HOUR = 6
+
+STAGES = ("hour_prices", "prepare", "get_low", "get_high_low", "additional_load_check", "calc_load_points", "optimize", "notify_ha")
+
+
+class StubState:
+    """
+    The state of a Home Assistant entity.
+    """
+
+    def __init__(self):
+        self.attributes = {}
+
+
+class StubClient:
+    """
+    A Home Assistant client that keeps the state in memory.
+    """
+
+    def __init__(self):
+        self.state = StubState()
+
+    def get_entity(self, entity_id):
+        return self
+
+    def set_state(self, state):
+        self.state = state
+
+
+def synthetic_prices(n, resolution):
+    """
+    Builds prices with a morning and an evening peak.
+
+    Args:
+        n (int): Number of slots.
+        resolution (int): Minutes per slot.
+
+    Returns:
+        list: Price (EUR/MWh) per slot.
+    """
+    prices = []
+    for slot in range(n):
+        hour = slot * resolution / 60 % 24
+        prices.append(80 + 40 * math.sin((hour - 4) / 24 * 2 * math.pi) + 25 * math.sin(hour / 6 * math.pi) + (slot * 37) % 11)
+    return prices
+
+
+def synthetic_forecast(resolution=60):
+    """
+    Builds a forecast cache entry of two sunny days.
+
+    Args:
+        resolution (int): Minutes per production slot.
+
+    Returns:
+        dict: The forecast cache entry.
+    """
+    periods = {}
+    for day in range(2):
+        for hour in range(8, 18):
+            moment = datetime.datetime.combine(DAY + datetime.timedelta(days=day), datetime.time(hour))
+            periods[moment.isoformat(sep=" ")] = round(900 * math.sin((hour - 7) / 11 * math.pi))
+    start, production = production_vector(periods, resolution)
+    return {"fetched": 0, "expires": 0, "retry_at": 0, "start": start, "resolution": resolution, "production": production}
+
+
+def recorded_prices(path, n, resolution):
+    """
+    Repeats or cuts the prices of a recorded ENTSO-e document to a number of slots.
+
+    Args:
+        path (str): The XML document.
+        n (int): Number of slots.
+        resolution (int): Minutes per slot.
+
+    Returns:
+        list: Price (EUR/MWh) per slot.
+    """
+    with open(path, 'rb') as f:
+        curve = parse_a44(f.read())
+    if curve is None:
+        raise SystemExit("No prices in " + path)
+    prices = curve.average(None, resolution, len(curve)) if resolution >= curve.resolution else [x for x in curve.prices for y in range(curve.resolution // resolution)]
+    return [prices[x % len(prices)] for x in range(n)]
+
+
+def build(directory, prices, resolution, forecast):
+    """
+    Builds a Battery on a scratch configuration, with the network and Modbus left out.
+
+    Args:
+        directory (str): Directory of the scratch files.
+        prices (list): Price (EUR/MWh) per slot.
+        resolution (int): Minutes per slot.
+        forecast (dict): The forecast cache entry.
+
+    Returns:
+        tuple: The Battery and the price curve.
+    """
+    with open(os.path.join(ROOT, "config copy.json")) as f:
+        cfg = json.load(f)
+    for section, key in (("entsoe", "store"), ("forecast.solar", "cache"), ("telegram", "state"), ("homeassistant", "state"), ("consumption", "path"), ("journal", "path")):
+        cfg.setdefault(section, {})[key] = os.path.join(directory, key)
+    cfg["homeassistant"]["resolution"] = resolution
+    cfg["compare_planners"] = True
+
+    battery = Battery(run=False, cfg=cfg)
+    moment = datetime.datetime.combine(DAY, datetime.time(HOUR, 0, 30))
+    battery.clock = lambda: moment
+    battery.get_hour()
+    battery.publisher.path = None
+    battery.publisher.client = StubClient()
+    battery.perc = 35
+    battery.batt_capacity = 20
+    battery.maxload = 5
+    battery.set_forecast(forecast)
+    curve = PriceCurve(battery.store.day_start(DAY), resolution, array.array("d", prices))
+    return battery, curve
+
+
+def run_stages(battery, curve, measure):
+    """
+    Runs the planning stages in the order of Battery.plan.
+
+    Args:
+        battery (Battery): The battery.
+        curve (PriceCurve): The prices.
+        measure (callable): Called with the name and function of every stage, returns its result.
+    """
+    battery.set_points = []
+    battery.load_points = []
+    battery.loads = []
+    battery.messages = []
+    battery.publisher.published = {}
+    battery.p24, battery.p48, battery.prices = measure("hour_prices", lambda: battery.hour_prices(curve))
+    battery.prices_day = battery.get_prices_day()
+    for stage in STAGES[1:]:
+        measure(stage, getattr(battery, stage))
+
+
+def bench(battery, curve, repeat):
+    """
+    Times and memory profiles every stage.
+
+    Args:
+        battery (Battery): The battery.
+        curve (PriceCurve): The prices.
+        repeat (int): Number of runs, the median is kept.
+
+    Returns:
+        dict: Stage -> {"us": median microseconds, "kib": peak KiB allocated}.
+    """
+    times = {stage: [] for stage in STAGES}
+
+    def timed(stage, function):
+        start = time.perf_counter()
+        result = function()
+        times[stage].append(time.perf_counter() - start)
+        return result
+
+    for x in range(repeat):
+        run_stages(battery, curve, timed)
+
+    peaks = {}
+
+    def traced(stage, function):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        result = function()
+        peaks[stage] = tracemalloc.get_traced_memory()[1] - before
+        return result
+
+    tracemalloc.start()
+    try:
+        run_stages(battery, curve, traced)
+    finally:
+        tracemalloc.stop()
+
+    return {stage: {"us": round(statistics.median(times[stage]) * 1e6, 1), "kib": round(peaks[stage] / 1024, 1)} for stage in STAGES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the planning stages over growing price curves.")
+    parser.add_argument("--xml", help="recorded ENTSO-e document, default synthetic prices")
+    parser.add_argument("--forecast", help="forecast cache file (forecast.json), default a synthetic forecast")
+    parser.add_argument("--repeat", type=int, default=50, help="runs per stage")
+    parser.add_argument("--save", action="store_true", help="save the results as the baseline")
+    args = parser.parse_args()
+
+    if args.forecast:
+        with open(args.forecast) as f:
+            forecast = json.load(f)
+    else:
+        forecast = synthetic_forecast()
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+
+    directory = tempfile.mkdtemp(prefix="kiwatt-")
+    results = {}
+    try:
+        for label, n, resolution in SIZES:
+            prices = recorded_prices(args.xml, n, resolution) if args.xml else synthetic_prices(n, resolution)
+            battery, curve = build(directory, prices, resolution, forecast)
+            results[label] = bench(battery, curve, args.repeat)
+    finally:
+        shutil.rmtree(directory)
+
+    print("{:<22}".format("stage") + "".join("{:>28}".format(label) for label, n, resolution in SIZES))
+    for stage in STAGES:
+        row = "{:<22}".format(stage)
+        for label, n, resolution in SIZES:
+            result = results[label][stage]
+            before = baseline.get(label, {}).get(stage) if resolution == 60 else None
+            change = " {:>+5.0f}%".format((result["us"] / before["us"] - 1) * 100) if before and before["us"] else " " * 7
+            row += "{:>11.1f}us {:>7.1f}KiB{}".format(result["us"], result["kib"], change)
+        print(row)
+
+    if args.save:
+        with open(BASELINE, 'w') as f:
+            json.dump({label: results[label] for label, n, resolution in SIZES if resolution == 60}, f, indent=2)
+        print("Baseline saved to " + BASELINE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark of the startup time of every entso.py command.
+
+Usage: python benchmarks/bench_startup.py
+
+Every command needs its own set of modules, each set is imported in a fresh interpreter. The imports
+of Battery before the heavy dependencies were made lazy are the baseline. The plan command needs
+no network, it is also timed end to end on two days of synthetic prices in a scratch directory.
+"""
+import array
+import datetime
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zoneinfo
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from classes.entsoe_class import PriceCurve  # noqa: E402
+from classes.price_provider_class import bidding_zone  # noqa: E402
+from classes.price_store_class import PriceStore  # noqa: E402
+
+# Modules imported by every command, the baseline is what importing Battery used to load
+COMMANDS = {
+    "baseline": ["classes.battery_class", "requests", "pysolarmanv5", "homeassistant_api"],
+    "plan": ["classes.battery_class"],
+    "status": ["classes.battery_class", "pysolarmanv5"],
+    "dry-run": ["classes.battery_class", "requests", "pysolarmanv5"],
+    "apply": ["classes.battery_class", "requests", "pysolarmanv5", "homeassistant_api"],
+}
+
+
+def run(args, cwd=ROOT, repeat=7):
+    """
+    Runs a Python command in fresh interpreters.
+
+    Args:
+        args (list): Arguments of the interpreter.
+        cwd (str): Working directory.
+        repeat (int): Number of runs.
+
+    Returns:
+        float: Median wall time in seconds, None if the command failed.
+    """
+    times = []
+    for x in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable] + args, cwd=cwd, capture_output=True)
+        if result.returncode != 0:
+            return None
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def scratch():
+    """
+    Builds a scratch directory with a config.json and two days of prices in the price store.
+
+    Returns:
+        str: The directory.
+    """
+    directory = tempfile.mkdtemp(prefix="kiwatt-")
+    with open(os.path.join(ROOT, "config copy.json")) as f:
+        cfg = json.load(f)
+    with open(os.path.join(directory, "config.json"), 'w') as f:
+        json.dump(cfg, f)
+    store = PriceStore(os.path.join(directory, cfg["entsoe"].get("store", "prices.db")), zoneinfo.ZoneInfo(cfg["entsoe"]["tz"]))
+    today = datetime.date.today()
+    store.save(bidding_zone(cfg["entsoe"].get("country")), PriceCurve(store.day_start(today), 60, array.array("d", (50 + (x * 37) % 90 for x in range(72)))))
+    return directory
+
+
+def main():
+    interpreter = run(["-c", "pass"])
+    print("{:<10} {:>10.1f} ms".format("python", interpreter * 1000))
+
+    for command, modules in COMMANDS.items():
+        seconds = run(["-c", "import " + ", ".join(modules)])
+        if seconds is None:
+            print("{:<10} {:>13}".format(command, "not installed"))
+        else:
+            print("{:<10} {:>10.1f} ms imports".format(command, (seconds - interpreter) * 1000))
+
+    directory = scratch()
+    try:
+        seconds = run([os.path.join(ROOT, "entso.py"), "plan", "--perc", "50"], cwd=directory)
+        print("{:<10} {:>10.1f} ms end to end".format("plan", seconds * 1000) if seconds is not None else "plan       failed")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
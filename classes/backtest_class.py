@@ -0,0 +1,189 @@
+import concurrent.futures
+import copy
+import datetime
+import itertools
+from classes.battery_class import Battery
+from classes.optimizer_class import Optimizer, TABLE_SLOTS
+from classes.registers_class import Snapshot
+
+# Load table in the inverter at the start of every simulated day
+START_TABLE = ([0, 100, 200, 300, 400, 500], [10, 10, 10, 10, 10, 10], [0, 0, 0, 0, 0, 0])
+
+
+def strategies(grid):
+    """
+    Builds every combination of the planner settings in a grid.
+
+    Args:
+        grid (dict): Setting -> list of values, kiwatt settings or "planner".
+
+    Returns:
+        list: (name, settings) of every strategy.
+    """
+    names = sorted(grid)
+    result = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        settings = dict(zip(names, values))
+        result.append((" ".join(name + "=" + str(settings[name]) for name in names), settings))
+    return result
+
+
+def valid_table(set_points, loads, load_points):
+    """
+    Checks if the inverter accepts a load table.
+
+    Args:
+        set_points (list): Set points (hour*100 + minute).
+        loads (list): Loads (percentage).
+        load_points (list): Load points (0=off, 1=on).
+
+    Returns:
+        bool: True if the table is valid.
+    """
+    return (
+        len(set_points) == len(loads) == len(load_points) == TABLE_SLOTS
+        and len(set(set_points)) == TABLE_SLOTS
+        and all(0 <= x // 100 < 24 and 0 <= x % 100 < 60 for x in set_points)
+        and all(0 <= x <= 100 for x in loads)
+        and all(x in (0, 1) for x in load_points)
+    )
+
+
+def run_day(job):
+    """
+    Simulates one day of hourly runs of the planner for one strategy.
+
+    Every hour the unchanged planner runs in dry run mode on the stored prices with the clock set to that
+    hour, the battery then follows the load table for an hour of consumption and PV production.
+
+    Args:
+        job (dict): cfg, strategy, settings, day, perc (battery percentage at 0:00), capacity (kWh),
+            maxload (kWh per hour), drain (kWh per hour, None for unload_perc_hour of the strategy) and pv (Wh per hour of the day and the next day).
+
+    Returns:
+        dict: Cost (EUR), cycles, hours the battery ran empty, invalid tables and planner errors.
+    """
+    cfg = copy.deepcopy(job["cfg"])
+    settings = dict(job["settings"])
+    if "planner" in settings:
+        cfg["planner"] = settings.pop("planner")
+    cfg["kiwatt"].update(settings)
+    cfg["compare_planners"] = False
+    # Plan on the consumption of the strategy, never on the profile learned by the live battery
+    cfg["consumption"] = dict(cfg.get("consumption", {}), path=None)
+    drain = job["drain"]
+    if drain is None:
+        drain = job["capacity"] * cfg["kiwatt"]["unload_perc_hour"] / 100
+
+    day = job["day"]
+    battery = Battery(run=False, cfg=cfg)
+    battery.dry_run = True
+    optimizer = Optimizer(job["capacity"], cfg["kiwatt"]["min_percload"], cfg["kiwatt"]["max_percload"], job["maxload"])
+    pv = job["pv"] or [0] * 48
+
+    result = {"strategy": job["strategy"], "day": day.isoformat(), "cost": 0.0, "cycles": 0.0, "empty": 0, "invalid": 0, "errors": 0}
+    table = START_TABLE
+    perc = job["perc"]
+    start_perc = perc
+    prices = []
+
+    for hour in range(24):
+        moment = datetime.datetime.combine(day, datetime.time(hour, 0, 30))
+        battery.clock = lambda: moment
+        battery.get_hour()
+
+        # Tomorrow's prices are published at 13:00
+        curve = battery.store.load(battery.domain, day, 2 if hour >= 13 else 1)
+        hourly = battery.hour_prices(curve) if curve is not None else None
+        if hourly is None:
+            result["errors"] += 1
+            return result
+        battery.p24, battery.p48, battery.prices = hourly
+        battery.production = pv
+        battery.production_start = 0
+        battery.production_today = 0
+        battery.perc = int(round(perc))
+        battery.batt_capacity = job["capacity"]
+        battery.maxload = job["maxload"]
+        battery.snapshot = Snapshot(job["capacity"], job["maxload"], 1, table[0], table[1], table[2], battery.perc, {})
+
+        try:
+            battery.plan()
+            planned = (list(battery.set_points), list(battery.loads), list(battery.load_points))
+            if valid_table(*planned):
+                table = planned
+            else:
+                result["invalid"] += 1
+        except Exception:
+            result["errors"] += 1
+
+        # The battery follows the table in the inverter for one hour
+        price = battery.consumer_price(battery.p48[hour])
+        prices.append(price)
+        schedule = optimizer.from_table(*table, hour * 60, 1)
+        cost, trajectory, bought = optimizer.simulate(schedule, [price], [drain], [pv[hour] / 1000], perc, value_end=False)
+        if schedule[0] is None and bought > 0:
+            result["empty"] += 1
+        result["cost"] += cost
+        result["cycles"] += max(0.0, trajectory[-1] - perc) / 100
+        perc = trajectory[-1]
+
+    # Value the change of the battery content at the average price of the day
+    result["cost"] -= (perc - start_perc) / 100 * job["capacity"] * sum(prices) / len(prices)
+    return result
+
+
+def backtest(cfg, first, last, grid, perc=50, capacity=20, maxload=5, drain=None, pv=None, workers=None):
+    """
+    Simulates every strategy of the grid on every day with prices in the store, in a process pool.
+
+    Args:
+        cfg (dict): Configuration settings.
+        first (date): First day.
+        last (date): Last day.
+        grid (dict): Setting -> list of values, kiwatt settings or "planner".
+        perc (int): Battery percentage at the start of every day.
+        capacity (float): Capacity of the battery in kWh.
+        maxload (float): Max load of the battery per hour in kWh.
+        drain (float): Actual consumption in kWh per hour, defaults to unload_perc_hour of every strategy.
+        pv (dict): Day (ISO) -> production (Wh) per hour.
+        workers (int): Number of processes, None for the number of CPUs.
+
+    Returns:
+        list: Result of every day of every strategy.
+    """
+    pv = pv or {}
+
+    jobs = []
+    day = first
+    while day <= last:
+        tomorrow = (day + datetime.timedelta(days=1)).isoformat()
+        production = (pv.get(day.isoformat(), [0] * 24) + pv.get(tomorrow, [0] * 24)) if pv else None
+        for strategy, settings in strategies(grid):
+            jobs.append({
+                "cfg": cfg, "strategy": strategy, "settings": settings, "day": day, "perc": perc,
+                "capacity": capacity, "maxload": maxload, "drain": drain, "pv": production,
+            })
+        day += datetime.timedelta(days=1)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run_day, jobs, chunksize=max(1, len(jobs) // 64)))
+
+
+def summarize(results):
+    """
+    Sums the results per strategy.
+
+    Args:
+        results (list): Result of every day of every strategy.
+
+    Returns:
+        list: Totals per strategy, cheapest first.
+    """
+    totals = {}
+    for result in results:
+        total = totals.setdefault(result["strategy"], {"strategy": result["strategy"], "days": 0, "cost": 0.0, "cycles": 0.0, "empty": 0, "invalid": 0, "errors": 0})
+        total["days"] += 1
+        for key in ("cost", "cycles", "empty", "invalid", "errors"):
+            total[key] += result[key]
+    return sorted(totals.values(), key=lambda total: total["cost"])
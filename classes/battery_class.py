@@ -1,10 +1,26 @@
 import json
+import os
 import datetime
-import requests
-import bs4
-from pysolarmanv5 import PySolarmanV5
+import time
+import concurrent.futures
+import itertools
 import math
-from homeassistant_api import Client
+import zoneinfo
+from classes.registers_class import REGISTERS, RegisterMap, Snapshot, WriteError
+from classes.modbus_class import ModbusSession
+from classes.price_provider_class import EntsoeProvider, FeedProvider, FileProvider, bidding_zone, race
+from classes.entsoe_class import parse_a44
+from classes.price_store_class import PriceStore
+from classes.forecast_class import hourly_production, merge_entries, plane_caches
+from classes.optimizer_class import Optimizer
+from classes.price_series_class import PriceSeries
+from classes.notifier_class import Notifier
+from classes.homeassistant_class import HomeAssistantPublisher
+from classes.metrics_class import Metrics
+from classes.consumption_class import ConsumptionProfile
+from classes.journal_class import RunJournal, fingerprint
+from classes.telemetry_class import RingBuffer
+
 
 class Battery:
     """
@@ -12,12 +28,38 @@ class Battery:
 
     Attributes:
         cfg (list): Configuration settings loaded from a JSON file.
+        clock (callable): Returns the current time, None for the system clock.
+        dry_run (bool): Plan only, no notifications and no writes to the battery or Home Assistant.
+        messages (list): Notifications not sent yet, every notification in a dry run.
+        notifier (Notifier): Sends the notifications of a run as one Telegram message in the background.
+        publisher (HomeAssistantPublisher): Publishes the price sensor to Home Assistant when it changed.
         p24 (list): Prices for the next 24 hours.
         p48 (list): Prices for the next 48 hours.
+        prices (PriceCurve): Prices at the resolution of the ENTSO-e document (hourly or quarter-hourly).
+        series (PriceSeries): Ranked prices of p48, built once per plan.
+        store (PriceStore): Prices of every delivery day fetched so far.
+        domain (str): ENTSO-e bidding zone of the country in the configuration.
+        providers (list): Sources of the prices missing in the store, raced in this order.
         production_start (bool): Indicates if production has started today.
-        production_today (float): Total production for today.
-        modbus (bool): Connection to the battery using Modbus protocol.
+        production_today (float): Forecast production (kWh) from now until 24:00.
+        modbus (ModbusSession): Connection to the battery, reconnects and retries by itself.
+        timings (dict): Seconds spent in each acquisition leg.
+        metrics (Metrics): Timing spans and counters of every run, exported when enabled in the config.
+        snapshot (Snapshot): Register state of the inverter, read once per run.
+        inverter_read (bool): The snapshot was read from the inverter in this run, not restored from the journal.
+        journal (RunJournal): Inputs, plan and writes of every run.
+        forecast (dict): The forecast cache entry with the production per slot.
+        forecast_caches (list): Disk caches of the forecast.solar estimate, one per plane.
+        production (list): Forecast production (Wh) per hour for the next 48 hours, of all planes.
+        consumption (ConsumptionProfile): Expected consumption per hour of the week, learned from history.
+        drain (list): Expected consumption (kWh) per hour of the prices, built once per plan.
+        projection (list): Projected battery percentage without grid charge at the start of every hour
+            from hour_now, built once per plan.
+        prices_day (date): The day of price index 0.
+        prices_expire (float): Unix timestamp when the prices must be fetched again.
+        forecast_expire (float): Unix timestamp when the forecast must be fetched again.
         batt_capacity (float): Capacity of the battery in kWh.
+        maxload (float): Max load of the battery per hour in kWh.
         perc (float): Current percentage of battery charge.
         low (list): Three lowest prices for the next 24 hours.
         lowTomorrow (list): Three lowest prices for tomorrow.
@@ -26,18 +68,45 @@ class Battery:
         high_afternoon (int): Highest price for the next afternoon.
         high_tomorrow (int): Highest price for tomorrow.
         low_tomorrow (int): Lowest price for tomorrow.
+        writes (list): Register writes of the last plan as (address, values).
         set_points (list): Set points for battery charging (hour*100 + minute).
         load_points (list): Load points (0=off, 1=on).
         loads (list): Load requirements for each set point.
+        expected_cost (dict): Expected cost (EUR) of the heuristic and the optimal load table.
     """
 
     cfg = []
+    clock = None
+    dry_run = False
+    messages = []
+    notifier = False
+    publisher = False
     p24 = []
     p48 = []
+    prices = False
+    series = False
+    store = False
+    domain = False
+    providers = []
     production_start = False
     production_today = False
     modbus = False
+    timings = {}
+    metrics = False
+    snapshot = False
+    inverter_read = False
+    journal = False
+    forecast = False
+    forecast_caches = []
+    production = []
+    consumption = False
+    drain = []
+    projection = []
+    prices_day = False
+    prices_expire = 0
+    forecast_expire = 0
     batt_capacity = False
+    maxload = False
     perc = False
     low = []
     lowTomorrow = []
@@ -46,60 +115,526 @@ class Battery:
     high_afternoon = 0
     high_tomorrow = 0
     low_tomorrow = 0
+    writes = []
     set_points = []
     load_points = []
     loads = []
+    expected_cost = {}
 
-    def __init__(self):
+    def __init__(self, run=True, cfg=None):
         """
         Initializes the Battery class by setting up configuration, prices, and battery parameters.
+
+        Args:
+            run (bool): Plan and program the battery right away, False to only load the configuration.
+            cfg (dict): Configuration settings, loaded from config.json when None.
+        """
+        # Load configuration
+        if cfg is None:
+            self.get_config()
+        else:
+            self.cfg = cfg
+        self.store = PriceStore(self.cfg["entsoe"].get("store", "prices.db"), zoneinfo.ZoneInfo(self.cfg["entsoe"]["tz"]))
+        self.journal = RunJournal(self.cfg.get("journal", {}).get("path", "journal.db"))
+        self.domain = bidding_zone(self.cfg["entsoe"].get("country"))
+        self.forecast_caches = plane_caches(self.cfg["forecast.solar"], self.cfg.get("forecast_ttl", 3600))
+        consumption = self.cfg.get("consumption", {})
+        self.consumption = ConsumptionProfile(consumption.get("path", "consumption.json"), consumption.get("window", 8), consumption.get("min_samples", 2))
+        self.messages = []
+        metrics = self.cfg.get("metrics", {})
+        self.metrics = Metrics(metrics.get("enabled", False), metrics.get("trace", "trace.jsonl"), metrics.get("prometheus", "kiwatt.prom"))
+        entsoe_file = self.cfg["entsoe"].get("file", "entsoe.xml")
+        self.providers = [EntsoeProvider(self.cfg["entsoe"]["key"], self.domain, self.metrics, entsoe_file)]
+        self.providers += [FeedProvider(**feed) for feed in self.cfg.get("prices", {}).get("feeds", [])]
+        self.providers.append(FileProvider(entsoe_file))
+        telegram = self.cfg["telegram"]
+        self.notifier = Notifier(telegram["botID"], telegram["chatID"], telegram.get("retries", 3), telegram.get("backoff", 2), telegram.get("timeout", 10), telegram.get("dedupe", 3600), telegram.get("state", "notified.json"))
+        ha = self.cfg["homeassistant"]
+        self.publisher = HomeAssistantPublisher(ha["url"], ha["token"], ha.get("entity_id", "sensor.load_now"), ha.get("refresh", 86400), ha.get("state", "homeassistant.json"))
+
+        if run:
+            self.run()
+
+    def run(self):
+        """
+        Gets the current hour, refreshes the inputs that expired and plans the battery.
+        """
+        self.metrics.begin()
+        try:
+            self.get_hour()
+            self.acquire()
+            if not self.replay():
+                self.plan()
+        finally:
+            # Also send what was queued before a failure
+            self.flush()
+            self.metrics.end(perc=self.perc)
+
+    def run_offline(self, perc, batt_capacity, maxload):
+        """
+        Plans from the price store and the forecast cache files only, without network and without the
+        battery. The plan is a dry run, the notifications are kept in messages.
+
+        Args:
+            perc (float): Battery percentage.
+            batt_capacity (float): Capacity of the battery in kWh.
+            maxload (float): Max load of the battery per hour in kWh.
+        """
+        self.dry_run = True
+        self.get_hour()
+        curve = self.store.load(self.domain, self.get_prices_day(), 2)
+        prices = self.hour_prices(curve) if curve is not None else None
+        if prices is None:
+            raise ValueError("No prices in " + self.store.path)
+        self.set_prices(prices)
+
+        try:
+            self.forecast = self.load_forecast()
+        except ValueError as e:
+            print(str(e) + ", planning without production")
+            self.forecast = {"start": self.now().date().isoformat(), "resolution": 60, "production": []}
+        self.set_forecast(self.forecast)
+
+        self.perc = perc
+        self.batt_capacity = batt_capacity
+        self.maxload = maxload
+        self.snapshot = Snapshot(batt_capacity, maxload, 1, [], [], [], perc, {})
+        self.plan()
+
+    def now(self):
+        """
+        Returns the current time from the injected clock, or the system clock.
+
+        Returns:
+            datetime: The current local time.
+        """
+        if self.clock is None:
+            return datetime.datetime.now()
+        return self.clock()
+
+    def get_hour(self):
+        """
+        Sets the current hour, the next hour when the run starts in the last minute of the hour.
         """
-        # Get current hour
-        self.hour_now = int(datetime.datetime.now().strftime("%H"))
-        if int(datetime.datetime.now().strftime("%M")) > 58:
+        now = self.now()
+        self.hour_now = now.hour
+        if now.minute > 58:
             self.hour_now += 1
 
-        # Load configuration
-        self.get_config()
+    def plan(self):
+        """
+        Plans the load points from the acquired prices, forecast and battery state and programs the battery.
+        """
+        # Start every plan from an empty load table
+        self.writes = []
+        self.set_points = []
+        self.load_points = []
+        self.loads = []
+
+        self.prepare()
+
+        with self.metrics.span("plan"):
+            # Determine lowest and highest prices
+            self.get_low()
+            self.get_high_low()
+
+            # Check if additional load is needed
+            self.additional_load_check()
+
+            # Calculate load points for today
+            self.calc_load_points()
+
+        # Compare with the cheapest schedule over the full price horizon
+        with self.metrics.span("optimize"):
+            self.optimize()
+
+        # Write the load table to the battery
+        confirmed = self.program_battery()
+        self.record_run(confirmed)
+
+        # Notify Home Assistant
+        with self.metrics.span("notify_ha"):
+            self.notify_ha()
 
-        # Get prices and forecasts
-        self.get_hour_prices()
-        self.get_forecast()
+        # Send the notifications of this run
+        self.flush()
 
-        # Establish Modbus connection to the battery
-        self.modbus = PySolarmanV5(self.cfg["kiwatt"]["ip"], self.cfg["kiwatt"]["sn"], port=self.cfg["kiwatt"]["port"], mb_slave_id=1, verbose=0)
+    def prepare(self):
+        """
+        Builds what every stage of a plan looks up: the ranked prices, the expected consumption per hour,
+        the projected battery percentage and the hour the battery runs empty.
+        """
+        # Rank the prices once for every price query of this plan
+        self.series = PriceSeries(self.p48[x] for x in sorted(self.p48))
 
-        # Get battery capacity (kWh)
-        self.batt_capacity = self.modbus.read_holding_registers(register_addr=102, quantity=1)[0] * 50 / 1000
+        # Look up the expected consumption of every hour once
+        default = self.batt_capacity * self.cfg["kiwatt"]["unload_perc_hour"] / 100
+        self.drain = self.consumption.hours(datetime.datetime.combine(self.get_prices_day(), datetime.time()), max(48, len(self.series)), default)
 
-        # Get current battery percentage
-        self.perc = self.modbus.read_holding_registers(register_addr=588, quantity=1)[0]
+        # Project the battery percentage on the forecast production and expected consumption
+        self.projection = self.get_projection()
 
         # Calculate estimated battery empty time
-        self.batt_empty = math.floor((self.perc - self.cfg["kiwatt"]["min_percload"]) / self.cfg["kiwatt"]["unload_perc_hour"]) + self.hour_now
+        self.batt_empty = self.get_batt_empty()
+
+    def acquire(self):
+        """
+        Runs the price, forecast and inverter legs concurrently.
+
+        Prices and forecast are kept in memory until they expire, so only the inverter leg runs when a
+        resident process plans again within the hour. The inverter leg is left out too when the journal
+        knows the registers in the inverter and the telemetry has a recent battery percentage. Every leg
+        gets its own timeout (cfg["timeouts"], seconds). The price and forecast legs fall back to the
+        cached entsoe.xml / forecast.json when they fail or run late, the inverter leg has no fallback.
+        The time spent in each leg is stored in self.timings.
+        """
+        timeouts = {"prices": 20, "forecast": 10, "inverter": 20}
+        timeouts.update(self.cfg.get("timeouts", {}))
+        known = self.known_snapshot()
+        legs = {} if known else {"inverter": (self.fetch_inverter, None)}
+        if self.prices_expired():
+            legs["prices"] = (self.fetch_hour_prices, self.cached_hour_prices)
+        if time.time() >= self.forecast_expire:
+            legs["forecast"] = (self.fetch_forecast, self.cached_forecast)
+
+        if "inverter" in legs:
+            # The inverter leg must read on the session created here, see below
+            self.connect(timeouts["inverter"])
+        self.timings = {}
+        results = {}
+        cached = set()
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(legs)))
+        started = time.monotonic()
+        futures = {name: executor.submit(self.timed_leg, name, legs[name][0], timeouts[name]) for name in legs}
+
+        try:
+            for name, (fetch, fallback) in legs.items():
+                try:
+                    results[name] = futures[name].result(timeout=max(0, started + timeouts[name] - time.monotonic()))
+                except Exception as e:
+                    if name not in self.timings:
+                        self.timings[name] = round(time.monotonic() - started, 3)
+                    if name == "inverter" and not futures[name].done():
+                        # The late read keeps running on its session, close it so the read stops and
+                        # the next request gets a session of its own
+                        self.modbus.close()
+                        self.modbus = False
+                    if fallback is None:
+                        self.notify('Inverter unreachable: ' + (str(e) or type(e).__name__))
+                        raise
+                    print("Leg " + name + " failed (" + (str(e) or type(e).__name__) + "), using cache")
+                    results[name] = fallback()
+                    cached.add(name)
+                    self.metrics.count("fallback_" + name)
+        finally:
+            # Never wait for a leg that ran over its timeout
+            executor.shutdown(wait=False)
+
+        if "prices" in results:
+            self.set_prices(results["prices"], "prices" in cached)
+        if "forecast" in results:
+            self.forecast = results["forecast"]
+            self.forecast_expire = 0 if "forecast" in cached else max(self.forecast["expires"], self.forecast["retry_at"])
+        self.set_forecast(self.forecast)
+
+        self.inverter_read = "inverter" in results
+        self.snapshot = results["inverter"] if self.inverter_read else known
+        self.batt_capacity = self.snapshot.batt_capacity
+        self.perc = self.snapshot.perc
+        self.maxload = self.snapshot.maxload
+
+        print("Acquired in " + ", ".join(name + ": " + str(self.timings[name]) + "s" for name in legs) + ("" if self.inverter_read else ", registers from the journal"))
+
+    def known_snapshot(self):
+        """
+        Restores the register state the last run left in the inverter, with the battery percentage of the
+        telemetry, so the inverter does not have to be read.
 
-        # Determine lowest and highest prices
-        self.get_low()
-        self.get_high_low()
+        The registers are only trusted for cfg["journal"]["trust"] seconds after they were last read from
+        the inverter, a load table changed by hand is noticed after that.
 
-        # Check if additional load is needed
-        self.additional_load_check()
+        Returns:
+            Snapshot: The register state, None if the inverter must be read.
+        """
+        journal = self.cfg.get("journal", {})
+        last = self.journal.last(read=True)
+        if last is None or time.time() - last["time"] > journal.get("trust", 7200):
+            return None
+        perc = self.telemetry_perc(journal.get("max_age", 120))
+        if perc is None:
+            return None
+
+        values = self.journal.last()["registers"]
+        values[REGISTERS["soc"][0]] = perc
+        try:
+            return Snapshot.from_registers(values, self.register_map().registers)
+        except KeyError:
+            return None
+
+    def telemetry_perc(self, max_age):
+        """
+        Returns the battery percentage of the last telemetry sample.
 
-        # Calculate load points for today
-        self.calc_load_points()
+        Args:
+            max_age (float): Max age of the sample in seconds.
 
-        # Notify Home Assistant
-        self.notify_ha()
+        Returns:
+            int: The percentage, None if there is no sample that recent.
+        """
+        path = self.cfg.get("telemetry", {}).get("path", "telemetry.bin")
+        if not os.path.exists(path):
+            return None
+        ring = RingBuffer(path)
+        try:
+            samples = list(ring.samples(time.time() - max_age, time.time() + 1))
+        finally:
+            ring.close()
+        return samples[-1][1] if samples else None
+
+    def inputs(self):
+        """
+        Returns the fingerprint of the planning inputs: the prices, the production, the consumption
+        profile, the battery and its percentage rounded down to cfg["journal"]["soc_bucket"], the hour
+        and the configuration.
+
+        Returns:
+            str: The fingerprint.
+        """
+        bucket = self.cfg.get("journal", {}).get("soc_bucket", 5)
+        return fingerprint(
+            self.get_prices_day(), self.hour_now, sorted(self.p48.items()), self.production, self.consumption.means,
+            self.batt_capacity, self.maxload, self.perc // bucket, self.cfg)
+
+    def replay(self):
+        """
+        Keeps the plan of the last run when the planning inputs did not change since and the inverter holds
+        the load table of that plan, nothing is planned or written. A plan whose write was not confirmed
+        is never kept.
+
+        Returns:
+            bool: True if the plan of the last run was kept.
+        """
+        last = self.journal.last()
+        if last is None or not last["confirmed"] or last["fingerprint"] != self.inputs():
+            return False
+        plan = last["plan"]
+        snapshot = self.snapshot
+        if [snapshot.work_mode, snapshot.set_points, snapshot.loads, snapshot.load_points] != [plan["work_mode"], plan["set_points"], plan["loads"], plan["load_points"]]:
+            return False
+
+        self.set_points = plan["set_points"]
+        self.loads = plan["loads"]
+        self.load_points = plan["load_points"]
+        self.expected_cost = plan.get("expected_cost", {})
+        self.writes = []
+        print("Inputs unchanged since " + time.strftime("%H:%M", time.localtime(last["time"])) + ", keeping the plan")
+        self.metrics.count("journal_hits")
+        self.record_run(True, True)
+        return True
+
+    def record_run(self, confirmed, memoized=False):
+        """
+        Appends the inputs, plan, writes and register state of this run to the journal, a dry run is not
+        recorded.
+
+        Args:
+            confirmed (bool): The inverter holds the planned load table.
+            memoized (bool): The plan was kept from the last run.
+        """
+        if self.dry_run:
+            return
+        plan = {"work_mode": 1, "set_points": self.set_points, "loads": self.loads, "load_points": self.load_points, "expected_cost": self.expected_cost}
+        self.journal.record(self.inputs(), plan, self.writes, self.snapshot.registers, self.inverter_read, confirmed, memoized)
+
+    def set_prices(self, prices, cached=False):
+        """
+        Keeps acquired prices in memory until they expire.
+
+        Args:
+            prices (tuple): Prices for the next 24 hours, the next 48 hours and the price curve.
+            cached (bool): The prices came from the cached entsoe.xml, they are retried on the next run.
+        """
+        self.p24, self.p48, self.prices = prices
+        self.prices_day = self.get_prices_day()
+        self.prices_expire = 0 if cached else self.get_prices_expire()
+
+    def get_prices_day(self):
+        """
+        Returns the day the price index starts at, tomorrow once the run is for the first hour of tomorrow.
+
+        Returns:
+            datetime.date: The day of price index 0.
+        """
+        if self.hour_now < 24:
+            return self.now().date()
+        return self.now().date() + datetime.timedelta(days=1)
+
+    def get_prices_expire(self):
+        """
+        Returns when the prices in memory must be fetched again.
+
+        Tomorrow's prices are published in the early afternoon, until then the prices are fetched again
+        every hour from 13:00.
+
+        Returns:
+            float: Expiry as a unix timestamp.
+        """
+        now = self.now()
+        if len(self.p48) > 24:
+            return datetime.datetime.combine(self.prices_day + datetime.timedelta(days=1), datetime.time()).timestamp()
+        if now.hour < 13:
+            return now.replace(hour=13, minute=0, second=0, microsecond=0).timestamp()
+        return (now.replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1)).timestamp()
+
+    def prices_expired(self):
+        """
+        Checks if the prices in memory must be fetched again.
+
+        Returns:
+            bool: True if the prices expired or the price index moved to another day.
+        """
+        return time.time() >= self.prices_expire or self.prices_day != self.get_prices_day()
+
+    def timed_leg(self, name, leg, timeout):
+        """
+        Runs one acquisition leg and records how long it took.
+
+        Args:
+            name (str): The name of the leg.
+            leg (callable): The fetch function, called with the timeout of the leg.
+            timeout (float): The timeout in seconds.
+
+        Returns:
+            The result of the leg.
+        """
+        start = time.monotonic()
+        try:
+            with self.metrics.span(name):
+                return leg(timeout)
+        finally:
+            self.timings[name] = round(time.monotonic() - start, 3)
+
+    def fetch_inverter(self, timeout):
+        """
+        Connects to the battery if not connected yet and reads all registers the planner needs in one snapshot.
+
+        Args:
+            timeout (float): Max seconds of the read with its retries.
+
+        Returns:
+            Snapshot: The register state of the inverter.
+        """
+        # Keep the session of this read, acquire() replaces the session when the read runs late
+        modbus = self.connect(timeout)
+        registers = self.register_map()
+        with self.metrics.span("modbus_read"):
+            snapshot = registers.snapshot(modbus)
+        self.metrics.count("modbus_reads", len(registers.blocks()))
+        self.metrics.count("modbus_bytes", 2 * len(snapshot.registers))
+        return snapshot
+
+    def connect(self, timeout):
+        """
+        Creates the Modbus session if there is none yet, a resident process keeps the session, and its
+        circuit breaker, between runs. The session connects on its first request.
+
+        Every attempt of a request gets an equal share of the timeout as socket timeout, and no retry
+        starts later than one socket timeout before the end, so a dropped frame is retried within the
+        inverter leg instead of using it up.
+
+        Args:
+            timeout (float): Max seconds of a request with its retries.
+
+        Returns:
+            ModbusSession: The session.
+        """
+        if not self.modbus:
+            kiwatt = self.cfg["kiwatt"]
+            retry = self.cfg.get("modbus", {})
+            retries = retry.get("retries", 3)
+            socket_timeout = timeout / (retries + 1)
+            deadline = min(retry.get("deadline", 15), timeout - socket_timeout)
+            self.modbus = ModbusSession(
+                kiwatt["ip"], kiwatt["sn"], kiwatt["port"], socket_timeout, retries, retry.get("backoff", 0.5),
+                deadline, retry.get("failures", 3), retry.get("cooldown", 300), self.metrics.count)
+        return self.modbus
+
+    def register_map(self):
+        """
+        Returns the registers the planner reads and writes.
+        """
+        return RegisterMap(max_read=self.cfg["kiwatt"].get("max_read", 125))
 
     def notify(self, text):
         """
-        Sends a notification via Telegram.
+        Queues a notification, the notifications of a run are sent as one Telegram message by flush().
 
         Args:
             text (str): The message to send.
         """
-        url = f'https://api.telegram.org/bot{self.cfg["telegram"]["botID"]}/sendMessage?chat_id={self.cfg["telegram"]["chatID"]}&text={text}'
-        requests.post(url)
+        self.messages.append(text)
+
+    def flush(self):
+        """
+        Sends the queued notifications in the background, a dry run keeps them in messages.
+        """
+        if self.dry_run or not self.messages:
+            return
+        if self.notifier.send(self.messages):
+            self.metrics.count("telegram_messages")
+        else:
+            self.metrics.count("telegram_duplicates")
+        self.messages = []
+
+    def drain_perc(self, hour):
+        """
+        Returns the expected consumption of an hour as a percentage of the battery.
+
+        Args:
+            hour (int): The hour of the prices.
+
+        Returns:
+            float: Percentage of the battery.
+        """
+        if hour < len(self.drain):
+            kwh = self.drain[hour]
+        else:
+            kwh = self.batt_capacity * self.cfg["kiwatt"]["unload_perc_hour"] / 100
+        return kwh / self.batt_capacity * 100
+
+    def get_projection(self):
+        """
+        Projects the battery percentage without grid charge over the hours of the plan. Every hour the
+        forecast production minus the expected consumption goes into the battery, production beyond a full
+        battery is lost. Below min_percload the projection keeps falling, that part comes from the grid.
+
+        Returns:
+            list: The percentage at the start of every hour from hour_now, one more than the hours left.
+        """
+        net = [(self.production[x] / 1000 if x < len(self.production) else 0) / self.batt_capacity * 100 - self.drain_perc(x) for x in range(self.hour_now, len(self.drain))]
+        return list(itertools.accumulate(net, lambda perc, change: min(100, perc + change), initial=self.perc))
+
+    def projected(self, hour):
+        """
+        Returns the projected battery percentage at the start of an hour.
+
+        Args:
+            hour (int): The hour of the prices, from hour_now.
+
+        Returns:
+            float: The percentage, the last projected percentage after the end of the projection.
+        """
+        return self.projection[min(max(0, hour - self.hour_now), len(self.projection) - 1)]
+
+    def get_batt_empty(self):
+        """
+        Calculates the hour the projected battery percentage drops below min_percload.
+
+        Returns:
+            int: The hour of the prices, at most the end of the projection.
+        """
+        floor = self.cfg["kiwatt"]["min_percload"]
+        return next((self.hour_now + x for x in range(len(self.projection) - 1) if self.projection[x + 1] < floor), self.hour_now + len(self.projection) - 1)
 
     def additional_load_check(self):
         """
@@ -118,26 +653,27 @@ class Battery:
         if self.batt_empty < check_load:
             lowprice = 9999
             highcount = 0
+            highdrain = 0
 
-            for x in range(self.hour_now, check_load):
-                if x in self.p48:
-                    if self.p48[x] < lowprice:
-                        if highcount > 0:
-                            break
-                        else:
-                            nextLoadpoint = x
-                            lowprice = self.p48[x]
+            for x in range(self.hour_now, min(check_load, len(self.series))):
+                if self.series[x] < lowprice:
+                    if highcount > 0:
+                        break
                     else:
-                        highcount += 1
+                        nextLoadpoint = x
+                        lowprice = self.series[x]
+                else:
+                    highcount += 1
+                    highdrain += self.drain_perc(x)
 
             load_needed = 99
 
             # Check low points tomorrow
             if highcount > 0:
-                load_needed = self.cfg["kiwatt"]["min_percload"] + 10 + highcount * self.cfg["kiwatt"]["unload_perc_hour"]
+                load_needed = int(round(self.cfg["kiwatt"]["min_percload"] + 10 + highdrain))
 
             if nextLoadpoint < 24:
-                if (load_needed > 99 or (self.p48[nextLoadpoint] < self.p48[self.low_tomorrow] and max(self.low) < self.hour_now)):
+                if (load_needed > 99 or (self.series[nextLoadpoint] < self.series[self.low_tomorrow] and max(self.low) < self.hour_now)):
                     load_needed = 99
 
                 self.notify('Additional after loadpoint found:' + str(nextLoadpoint))
@@ -166,28 +702,28 @@ class Battery:
 
         if low and self.batt_empty < min(low):
             # Find the lowest price between now and the first load point
-            for x in range(self.hour_now, self.batt_empty):
-                if self.p48[nextLoadpoint] > self.p48[x]:
-                    nextLoadpoint = x
+            nextLoadpoint = self.series.lowest(self.hour_now, self.batt_empty, self.hour_now)
 
             # Check if the hours between this load point and the first low point are lower or higher
             for x in range(nextLoadpoint + 1, min(low)):
-                if self.p48[nextLoadpoint] > self.p48[x]:
+                if self.series[nextLoadpoint] > self.series[x]:
                     nextLoadpoint = x
                 else:
                     break
 
             count = 0
+            drain = 0
 
             # Calculate how many hours we need to load before reaching the first low point
             for x in range(nextLoadpoint + 1, min(low)):
-                if self.p48[nextLoadpoint] < self.p48[x]:
+                if self.series[nextLoadpoint] < self.series[x]:
                     count += 1
+                    drain += self.drain_perc(x)
                 else:
                     break
 
             if count > 0:
-                load_needed = self.perc + count * self.cfg["kiwatt"]["unload_perc_hour"] + 10
+                load_needed = int(round(self.perc + drain + 10))
                 self.notify('Additional before loadpoint found:' + str(nextLoadpoint))
                 self.notify('%:' + str(load_needed))
                 self.notify('Empty:' + str(self.batt_empty))
@@ -199,23 +735,6 @@ class Battery:
                 self.load_points.append(0)
                 self.loads.append(self.cfg["kiwatt"]["min_percload"])
 
-    def check_sell(self):
-        """
-        Checks if the current time matches the optimal selling times and executes selling logic.
-        """
-        if self.hour_now == self.high_morning:
-            self.notify('Battery percentage : ' + str(self.perc) + '%')
-            self.selling_first(17)
-            exit()
-
-        if self.hour_now == self.high_afternoon:
-            self.notify('High Afternoon: ' + str(self.high_afternoon) + ':00')
-            if self.p48[self.high_afternoon] > self.p48[self.high_tomorrow]:
-                # Enable selling first
-                self.selling_first(40)
-            else:
-                self.notify('Not selling because price is lower than tomorrow morning (' + self.get_price(self.p48[self.high_afternoon]) + '/' + self.get_price(self.p48[self.high_tomorrow]) + ')')
-
     def get_price(self, price):
         """
         Formats the price for display.
@@ -226,29 +745,64 @@ class Battery:
         Returns:
             str: The formatted price.
         """
-        return '{:.3f}'.format(round((price / 1000 + 0.14349) * 1.21, 3))
+        return '{:.3f}'.format(round(self.consumer_price(price), 3))
 
-    def get_high_low(self):
+    def consumer_price(self, price):
         """
-        Determines the highest and lowest prices for the next day based on the price data.
+        Converts a day ahead price to the price per kWh including energy tax and VAT.
+
+        Args:
+            price (float): The day ahead price (EUR/MWh).
+
+        Returns:
+            float: The price (EUR/kWh).
         """
-        h48 = self.p48.copy()
-        while (self.high_afternoon == 0 or self.high_morning == 0 or self.high_tomorrow == 0 or self.low_tomorrow == 0) and len(h48) > 0:
-            if self.low_tomorrow == 0 and len(h48) > 24:
-                test = min(h48, key=h48.get)
-                if test >= 24:
-                    self.low_tomorrow = test
-                h48.pop(test)
+        return (price / 1000 + 0.14349) * 1.21
 
-            high = max(h48, key=h48.get)
-            if high <= 12 and self.high_morning == 0:
-                self.high_morning = high
-            if (high > 12 and high < 24) and self.high_afternoon == 0:
-                self.high_afternoon = high
-            if high >= 24 and high <= 36 and self.high_tomorrow == 0:
-                self.high_tomorrow = high
+    def optimize(self):
+        """
+        Plans the cheapest schedule over the full price horizon and reports its expected cost next to the
+        expected cost of the load table of the heuristic. With cfg["planner"] set to "optimal" the load
+        table of the optimizer replaces the one of the heuristic unless it is expected to cost more, with
+        cfg["compare_planners"] set to False the heuristic runs without the optimizer.
+        """
+        planner = self.cfg.get("planner", "heuristic")
+        if planner == "heuristic" and not self.cfg.get("compare_planners", True):
+            return
+
+        kiwatt = self.cfg["kiwatt"]
+        hours = range(self.hour_now, len(self.series))
+        if not hours:
+            return
+
+        prices = [self.consumer_price(self.series[x]) for x in hours]
+        drain = [self.drain_perc(x) * self.batt_capacity / 100 for x in hours]
+        pv = [self.production[x] / 1000 if x < len(self.production) else 0 for x in hours]
+        start = hours[0] % 24 * 60
+
+        optimizer = Optimizer(self.batt_capacity, kiwatt["min_percload"], kiwatt["max_percload"], self.maxload, step=kiwatt.get("optimizer_step", 1))
+        table = optimizer.to_table(optimizer.optimize(prices, drain, pv, self.perc), start)
+
+        heuristic = optimizer.simulate(optimizer.from_table(self.set_points, self.loads, self.load_points, start, len(hours)), prices, drain, pv, self.perc)[0]
+        optimal = optimizer.simulate(optimizer.from_table(*table, start, len(hours)), prices, drain, pv, self.perc)[0]
+        self.expected_cost = {"heuristic": round(heuristic, 2), "optimal": round(optimal, 2)}
+        self.notify('Expected cost ' + str(len(hours)) + 'h heuristic: ' + '{:.2f}'.format(heuristic) + ' optimal: ' + '{:.2f}'.format(optimal))
+
+        if planner == "optimal":
+            # The table repeats after 24 hours, over the horizon it can cost more than the heuristic
+            if optimal > heuristic:
+                self.notify('Optimal table dearer than heuristic, keeping the heuristic table')
+            else:
+                self.set_points, self.loads, self.load_points = table
 
-            h48.pop(high)
+    def get_high_low(self):
+        """
+        Determines the highest and lowest prices for the next day based on the price data.
+        """
+        self.high_morning = self.series.highest(0, 13, 0)
+        self.high_afternoon = self.series.highest(13, 24, 0)
+        self.high_tomorrow = self.series.highest(24, 37, 0)
+        self.low_tomorrow = self.series.lowest(24, None, 0)
 
     def get_config(self):
         """
@@ -257,180 +811,243 @@ class Battery:
         with open("config.json") as json_data_file:
             self.cfg = json.load(json_data_file)
 
-    def get_hour_prices(self):
+    def fetch_hour_prices(self, timeout):
         """
-        Fetches electricity prices for today or tomorrow based on the current time.
+        Gets the electricity prices for today (or tomorrow if after 23:00) and the next day from the price
+        store, only the days missing in the store are raced over the price providers.
+
+        Tomorrow's prices are only fetched after they are published (13:00), once they are in the store
+        they are never fetched again.
+
+        Args:
+            timeout (float): The request timeout in seconds.
+
+        Returns:
+            tuple: Prices for the next 24 hours, the next 48 hours and the price curve.
         """
-        # Get prices for today or tomorrow if after 23:00
-        if self.hour_now < 24:
-            now = int(datetime.datetime.now().strftime("%Y%m%d"))
-            now1 = int((datetime.datetime.now() + datetime.timedelta(days=2, hours=0)).strftime("%Y%m%d"))
-        else:
-            now = int((datetime.datetime.now() + datetime.timedelta(days=1, hours=0)).strftime("%Y%m%d"))
-            now1 = int((datetime.datetime.now() + datetime.timedelta(days=2, hours=0)).strftime("%Y%m%d"))
-
-        url = "https://web-api.tp.entsoe.eu/api?documentType=A44&in_Domain=10YNL----------L&out_Domain=10YNL----------L&securityToken=" + self.cfg["entsoe"]["key"] + "&periodStart=" + str(now) + "0000&periodEnd=" + str(now1) + "0000"
-        xml = requests.get(url)
-        soup = bs4.BeautifulSoup(xml.content, 'xml')
-
-        # Check if we received a result
-        if len(soup.find_all('Point')) == 0:
-            self.notify('No result from entsoe')
-            # No result, get forecast from file
-            print("No result from entsoe")
-            with open('entsoe.xml', 'r') as f:
-                xml = f.read()
-            soup = bs4.BeautifulSoup(xml, 'xml')
-        else:
-            # Save forecast to file
-            try:
-                with open("entsoe.xml", 'w+') as file:
-                    file.write(str(xml.content))
-            except (IOError, OSError):
-                print("Error writing to file")
-
-        # Correct index hour 1 = 0:00, 2 = 1:00 etc
-        price_hour = {}
-        p48 = {}
-        x = 24
-        if len(soup.find_all('timeseries')) > 1:
-            x = 48
-
-        # Process each TimeSeries individually
-        series_offset = 0  # Keep track of where the points start (0 or 24)
-        for timeseries in soup.find_all('TimeSeries'):
-            for point in timeseries.find_all('Point'):
-                position = int(point.find('position').text) - 1 + series_offset
-                p48[position] = float(point.find('price.amount').text)
-            series_offset += 24  # Increase offset for the next TimeSeries
-
-        # Fill in any missing values
-        for i in range(x):  # Since there are at most 48 points (2 * 24)
-            if i not in p48:
-                p48[i] = p48[i - 1] if i > 0 else 0  # Use the previous value or 0
-            if i < 24:  # Only the first 24 to price_hour
-                price_hour[i] = p48[i]
-
-        # Sort the p48 dictionary by key
-        p48 = dict(sorted(p48.items()))
-        self.p24 = price_hour
-        self.p48 = p48
-
-    def get_forecast(self):
-        """
-        Fetches solar production forecasts from the forecast.solar API.
-        """
-        config = self.cfg["forecast.solar"]
-        url = 'https://api.forecast.solar/estimate/' + str(config["lat"]) + "/" + str(config["long"]) + "/" + str(config["dec"]) + "/" + str(config["az"]) + "/" + str(config["kwp"])
-        headers = {
-            "content-type": "application/json"
-        }
-        estimate = requests.request("GET", url, headers=headers).json()
-
-        # Check if we received a result
-        if estimate['result'] is None or estimate['result'] == 'Rate limit for API calls reached.':
-            self.notify('No result from forecast.solar')
-            # No result, get forecast from file
-            with open('forecast.json') as f:
-                estimate = json.load(f)
-        else:
-            # Save forecast to file
-            try:
-                with open("forecast.json", 'w+') as file:
-                    file.write(json.dumps(estimate))
-            except (IOError, OSError):
-                print("Error writing to file")
+        day = self.get_prices_day()
+        days = [day]
+        if day > self.now().date() or self.now().hour >= 13:
+            days.append(day + datetime.timedelta(days=1))
+
+        missing = self.store.missing(self.domain, days)
+        self.metrics.count("price_store_hits", len(days) - len(missing))
+        if missing:
+            prices = self.cfg.get("prices", {})
+            start = self.store.day_start(missing[0])
+            end = self.store.day_start(missing[-1] + datetime.timedelta(days=1))
+            # A curve of the first missing day wins, the next day may not be published yet
+            needed = self.store.day_start(missing[0] + datetime.timedelta(days=1))
+            with self.metrics.span("price_race"):
+                curve, provider = race(self.providers, start, end, timeout, prices.get("hedge", 3), prices.get("tolerance", 25), self.metrics.count, needed)
+            if curve is not None:
+                print("Prices from " + provider)
+                self.store.save(self.domain, curve)
+            if len(days) > 1 and self.store.missing(self.domain, days[1:]):
+                print("No prices for tomorrow")
+
+        curve = self.store.load(self.domain, day, 2)
+        if curve is None:
+            raise ValueError("No result from entsoe")
+
+        return self.hour_prices(curve)
+
+    def cached_hour_prices(self):
+        """
+        Loads the electricity prices from the last saved ENTSO-e response.
 
-        now = datetime.datetime.now()
-        tomorrow = (datetime.datetime.now() + datetime.timedelta(days=1, hours=0)).replace(hour=0, minute=0, second=0, microsecond=0)
+        Returns:
+            tuple: Prices for the next 24 hours, the next 48 hours and the price curve.
+        """
+        self.notify('No result from entsoe')
+        print("No result from entsoe")
+        path = self.cfg["entsoe"].get("file", "entsoe.xml")
+        try:
+            with open(path, 'rb') as f:
+                prices = self.parse_hour_prices(f.read())
+        except (IOError, OSError):
+            prices = None
+        if prices is None:
+            raise ValueError("No prices in " + path)
+        return prices
+
+    def parse_hour_prices(self, content):
+        """
+        Parses an ENTSO-e day ahead prices document.
 
-        # Calculate total forecast production for today from now until 24:00
-        production_start = 0
-        to_produce = 0
+        Args:
+            content (bytes): The XML document.
 
-        if "watt_hours_period" in estimate['result']:
-            for hour in estimate['result']['watt_hours_period']:
-                hour_time_obj = datetime.datetime.strptime(hour, '%Y-%m-%d %H:%M:%S')
-                if hour_time_obj > now and hour_time_obj < tomorrow:
-                    if estimate['result']['watt_hours_period'][hour] > 1000 and production_start == 0:
-                        production_start = hour_time_obj.strftime('%-H')
-                    to_produce += estimate['result']['watt_hours_period'][hour] / 1000
+        Returns:
+            tuple: Prices for the next 24 hours, the next 48 hours and the price curve, None if the
+            document has no prices.
+        """
+        curve = parse_a44(content)
+        if curve is None:
+            return None
+        return self.hour_prices(curve)
 
-        self.production_start = int(production_start)
-        self.production_today = 0
+    def hour_prices(self, curve):
+        """
+        Converts a price curve to the hourly prices the planner uses.
 
-    def get_low(self):
+        Args:
+            curve (PriceCurve): The prices at the resolution of ENTSO-e.
+
+        Returns:
+            tuple: Prices for the next 24 hours, the next 48 hours and the price curve at the resolution
+            of ENTSO-e, None if the curve does not cover the first hour.
         """
-        Determines the lowest prices for the next 24 hours and the next day.
+        # Index hour 0 = 0:00 local time of the day the prices start
+        tz = zoneinfo.ZoneInfo(self.cfg["entsoe"]["tz"])
+        origin = datetime.datetime.combine(self.get_prices_day(), datetime.time(), tzinfo=tz)
+        p48 = dict(enumerate(curve.hourly(origin, 48)))
+        if not p48:
+            return None
+        price_hour = {x: p48[x] for x in p48 if x < 24}
+
+        return price_hour, p48, curve
+
+    def fetch_forecast(self, timeout):
         """
-        p24 = self.p24.copy()
-        ranking = []
+        Gets the solar production forecast of every plane concurrently, from disk while it is fresh or the
+        forecast.solar rate limit is reached, from the forecast.solar API otherwise.
 
-        while len(ranking) < 3:
-            low = min(p24, key=p24.get)
-            p24.pop(low)
-            if low < 24:
-                ranking.append(low)
+        Args:
+            timeout (float): The request timeout in seconds.
 
-        self.low = sorted(ranking)
-        self.ranking = ranking
+        Returns:
+            dict: The forecast cache entry of all planes.
+        """
+        start = time.time()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(self.forecast_caches)) as executor:
+            entries = list(executor.map(lambda cache: cache.get(timeout), self.forecast_caches))
+        for entry in entries:
+            self.metrics.count("forecast_cache_hits" if entry["fetched"] < start else "forecast_downloads")
+        return merge_entries(entries)
+
+    def cached_forecast(self):
+        """
+        Loads the last saved solar production forecast of every plane, however old it is.
+
+        Returns:
+            dict: The forecast cache entry of all planes.
+        """
+        self.notify('No result from forecast.solar')
+        return self.load_forecast()
 
-        ranking = []
-        p48 = self.p48.copy()
+    def load_forecast(self):
+        """
+        Loads the saved solar production forecast of every plane.
 
-        if len(p48) > 24:
-            while len(ranking) < 3:
-                low = min(p48, key=p48.get)
-                p48.pop(low)
-                if low > 23:
-                    ranking.append(low)
-            self.lowTomorrow = sorted(ranking)
+        Returns:
+            dict: The forecast cache entry of all planes.
+        """
+        entries = [cache.load() for cache in self.forecast_caches]
+        missing = [cache.path for cache, entry in zip(self.forecast_caches, entries) if entry is None]
+        if missing:
+            raise ValueError("No forecast in " + ", ".join(missing))
+        return merge_entries(entries)
 
-    def selling_first(self, p):
+    def set_forecast(self, forecast):
         """
-        Enables the 'sell first' mode for the battery system.
+        Calculates the production per hour, production start and production today from a forecast.
 
         Args:
-            p (int): The price to set for selling first.
+            forecast (dict): The forecast cache entry.
         """
-        self.notify('Sell first ON')
-        set_points = [0, 100, 200, 300, 400, 500]
-        loads = [p, p, p, p, p, p]
-        load_points = [0, 0, 0, 0, 0, 0]
-        self.write_to_batt(set_points, loads, load_points)
+        self.production = hourly_production(forecast, self.now().date(), 48)
+
+        # Calculate total forecast production for today from now until 24:00
+        production_start = 0
+        to_produce = 0
 
-        # Set selling first
-        self.modbus.write_multiple_holding_registers(register_addr=142, values=[0])
-        exit()
+        for hour in range(self.now().hour, 24):
+            if self.production[hour] > 1000 and production_start == 0:
+                production_start = hour
+            to_produce += self.production[hour] / 1000
 
-    def write_to_batt(self, set_points, loads, load_points):
+        self.production_start = production_start
+        self.production_today = to_produce
+
+    def get_low(self):
         """
-        Writes the set points, loads, and load points to the battery.
+        Determines the lowest prices for the next 24 hours and the next day.
+        """
+        ranking = self.series.cheapest(3, 0, 24)
+        self.low = sorted(ranking)
+        self.ranking = ranking
+
+        self.lowTomorrow = []
+        if len(self.series) > 24:
+            self.lowTomorrow = sorted(self.series.cheapest(3, 24))
+
+    def write_to_batt(self, set_points, loads, load_points, work_mode=1):
+        """
+        Writes the registers of the set points, loads, load points and work mode that differ from the
+        register snapshot to the battery, in as few writes as possible, and verifies them with one read back.
 
         Args:
             set_points (list): List of set points to write.
             loads (list): List of loads to write.
             load_points (list): List of load points to write.
+            work_mode (int): Work mode, 0=selling first, 1=zero export.
+
+        Returns:
+            bool: True if every register was written and confirmed. A failed write undoes the writes
+            before it.
         """
-        # Set time 1
-        self.modbus.write_multiple_holding_registers(register_addr=148, values=set_points)
-        # Set loads
-        self.modbus.write_multiple_holding_registers(register_addr=166, values=loads)
-        # Set load points
-        self.modbus.write_multiple_holding_registers(register_addr=172, values=load_points)
+        # The inverter leg may have been skipped, connect on the first write
+        self.connect(self.cfg.get("timeouts", {}).get("inverter", 20))
+        registers = self.register_map()
+        desired = {}
+        for name, values in (("set_points", set_points), ("loads", loads), ("load_points", load_points), ("work_mode", [work_mode])):
+            address = registers.registers[name][0]
+            for x, value in enumerate(values):
+                desired[address + x] = value
+
+        # The work mode is listed last so it is written after the load table
+        current = self.snapshot.registers
+        try:
+            with self.metrics.span("modbus_write"):
+                writes, failed = registers.apply(self.modbus, current, desired)
+        except WriteError as e:
+            self.writes = e.written
+            self.metrics.count("modbus_write_failures")
+            self.notify('Write failed: ' + str(e) + (', rolled back' if e.rolled_back else ''))
+
+            # Keep the snapshot in line with the registers in the battery
+            values = dict(current)
+            if not e.rolled_back:
+                for address, written in e.written:
+                    values.update((address + x, value) for x, value in enumerate(written))
+            self.snapshot = Snapshot.from_registers(values, registers.registers)
+            return False
+
+        self.writes = writes
+        self.metrics.count("modbus_writes", len(writes))
+        self.metrics.count("modbus_bytes", 2 * sum(len(values) for address, values in writes))
+        if failed:
+            self.metrics.count("modbus_write_failures")
         self.notify(str(set_points) + '\n' + str(load_points) + '\n' + str(loads))
-        self.modbus.write_multiple_holding_registers(register_addr=142, values=[1])
+        if failed:
+            self.notify('Write not confirmed: ' + str(failed))
+
+        # Keep the snapshot in line with the registers in the battery
+        values = dict(current)
+        values.update(desired)
+        values.update(failed)
+        self.snapshot = Snapshot.from_registers(values, registers.registers)
+        return not failed
 
     def calc_load_points(self):
         """
         Calculates the load points needed for today based on battery capacity and price points.
         """
-        # Current capacity (kWh) of the battery
-        bat_load = self.perc * self.batt_capacity / 100
-        # Load needed today until 18:00
-        load_today = (18 - self.hour_now) * self.batt_capacity * self.cfg["kiwatt"]["unload_perc_hour"] / 100
-# Max load capacity of the battery (kWh)
-        maxload = float(self.modbus.read_holding_registers(register_addr=108, quantity=1)[0]) * 50 / 1000
+        # Projected capacity (kWh) of the battery at 18:00 with the forecast production and expected consumption
+        bat_load = self.projected(18) * self.batt_capacity / 100
+        # Max load capacity of the battery (kWh)
+        maxload = self.maxload
 
         # Position of setpoint in time
         count = 0
@@ -448,7 +1065,7 @@ class Battery:
             # Get position of setpoint in ranking (cheapest first)
             rank = ranking.index(setpoint)
             # Calculate kWh needed to load battery to max_percload
-            to_load = self.batt_capacity * self.cfg["kiwatt"]["max_percload"] / 100 - (bat_load + self.production_today - load_today + calc_load)
+            to_load = self.batt_capacity * self.cfg["kiwatt"]["max_percload"] / 100 - (bat_load + calc_load)
             # Calculate hours to correct based on ranking and cheapest price
             correct = 0
             if rank == 1 and prev_rank == 2:
@@ -521,64 +1138,108 @@ class Battery:
                 self.load_points.append(0)
                 self.loads.append(self.cfg["kiwatt"]["min_percload"])
 
-        # Read current setpoints, loads, and loadpoints
-        set_points_now = self.modbus.read_holding_registers(register_addr=148, quantity=6)
-        loads_now = self.modbus.read_holding_registers(register_addr=166, quantity=6)
-        load_points_now = self.modbus.read_holding_registers(register_addr=172, quantity=6)
+    def program_battery(self):
+        """
+        Writes the load table to the battery if it differs from the table in the battery.
+
+        Returns:
+            bool: True if the battery holds the load table, False in a dry run or when the write was not
+            confirmed.
+        """
+        if self.dry_run:
+            return False
+
+        # Current setpoints, loads, and loadpoints from the register snapshot
+        set_points_now = self.snapshot.set_points
+        loads_now = self.snapshot.loads
+        load_points_now = self.snapshot.load_points
 
         # Check if we need to update the battery settings
         if (set_points_now != self.set_points or loads_now != self.loads or load_points_now != self.load_points):
-            self.write_to_batt(self.set_points, self.loads, self.load_points)
+            return self.write_to_batt(self.set_points, self.loads, self.load_points)
+        return True
 
     def notify_ha(self):
         """
-        Notifies Home Assistant about the current battery status and price points.
+        Notifies Home Assistant about the current battery status and price points, if they changed.
         """
-        client = Client(self.cfg["homeassistant"]["url"], self.cfg["homeassistant"]["token"])
-        sensor = client.get_entity(entity_id='sensor.load_now')
+        if self.dry_run:
+            return
+
+        self.publisher.publish(self.ha_attributes())
+
+    def ha_attributes(self):
+        """
+        Builds the attributes of the Home Assistant sensor, the prices of today and tomorrow per hour, or
+        per quarter hour when configured and the ENTSO-e prices have that resolution. Next to the prices
+        the average of both days and the cheapest block of hours from now that charges the battery from
+        min_percload to max_percload, with its dearest hour.
+
+        Returns:
+            dict: Name -> value of the sensor attributes.
+        """
+        tz = zoneinfo.ZoneInfo(self.cfg["entsoe"]["tz"])
+        resolution = self.cfg["homeassistant"].get("resolution", 60)
+        start = self.store.day_start(self.get_prices_day())
+        if resolution < 60 and self.prices and self.prices.resolution <= resolution:
+            slot_prices = self.prices.average(start, resolution, 2880 // resolution)
+        else:
+            resolution = 60
+            slot_prices = self.series
+        per_day = 1440 // resolution
+
         myprices = []
         prices = []
         points = []
 
-        low_today = 99
-        high_today = 0
-        low_tomorrow = 99
+        low_today = round(self.consumer_price(self.series[self.series.lowest(0, 24)]), 3)
+        high_today = round(self.consumer_price(self.series[self.series.highest(0, 24)]), 3)
+        low_tomorrow = 0
         high_tomorrow = 0
-
-        for x in range(0, 48):
-            price = round((self.p48[x] / 1000 + 0.14349) * 1.21, 3) if x in self.p48 else 0
-
-            if x < 24:
-                load = {
-                    "time": datetime.datetime.now().strftime("%Y-%m-%d") + " {:02d}".format(x) + ":30:00+01:00",
-                    "price": '{:.3f}'.format(price)
-                }
-                if price < low_today:
-                    low_today = price
-                if price > high_today:
-                    high_today = price
-                if x in self.low:
-                    points.append(load)
-                else:
-                    myprices.append(load)
-            else:
-                load = {
-                    "time": (datetime.datetime.now() + datetime.timedelta(days=1)).strftime("%Y-%m-%d") + " {:02d}".format(x - 24) + ":30:00+01:00",
-                    "price": '{:.3f}'.format(price)
-                }
-                if price < low_tomorrow:
-                    low_tomorrow = price
-                if price > high_tomorrow:
-                    high_tomorrow = price
+        if len(self.series) > 24:
+            low_tomorrow = round(self.consumer_price(self.series[self.series.lowest(24, 48)]), 3)
+            high_tomorrow = round(self.consumer_price(self.series[self.series.highest(24, 48)]), 3)
+
+        average_today = round(self.consumer_price(self.series.average(0, 24)), 3)
+        average_tomorrow = round(self.consumer_price(self.series.average(24, 48)), 3) if len(self.series) > 24 else 0
+
+        # The cheapest block of hours that charges the battery from min_percload to max_percload
+        kiwatt = self.cfg["kiwatt"]
+        charge_hours = max(1, math.ceil(self.batt_capacity * (kiwatt["max_percload"] - kiwatt["min_percload"]) / 100 / self.maxload)) if self.maxload else 1
+        windows = self.series.cheapest_windows(charge_hours, 1, self.hour_now)
+        charge_start = ''
+        charge_high = 0
+        if windows:
+            charge_start = (start + datetime.timedelta(hours=windows[0])).astimezone(tz).isoformat(sep=' ')
+            charge_high = round(self.consumer_price(self.series.rolling(charge_hours)[1][windows[0]]), 3)
+
+        for x in range(0, 2 * per_day):
+            price = round(self.consumer_price(slot_prices[x]), 3) if x < len(slot_prices) else 0
+
+            # Middle of the slot in local time, with the UTC offset of that moment
+            moment = (start + datetime.timedelta(minutes=x * resolution + resolution / 2)).astimezone(tz)
+            load = {
+                "time": moment.isoformat(sep=' '),
+                "price": '{:.3f}'.format(price)
+            }
+            if x >= per_day:
                 prices.append(load)
-
-        # Update sensor attributes
-        sensor.state.attributes["loads"] = points
-        sensor.state.attributes["myprices"] = myprices
-        sensor.state.attributes["prices"] = prices
-        sensor.state.attributes["low_today"] = low_today
-        sensor.state.attributes["high_today"] = high_today
-        sensor.state.attributes["low_tomorrow"] = low_tomorrow
-        sensor.state.attributes["high_tomorrow"] = high_tomorrow
-
-        client.set_state(sensor.state)
\ No newline at end of file
+            elif x * resolution // 60 in self.low:
+                points.append(load)
+            else:
+                myprices.append(load)
+
+        return {
+            "loads": points,
+            "myprices": myprices,
+            "prices": prices,
+            "low_today": low_today,
+            "high_today": high_today,
+            "low_tomorrow": low_tomorrow,
+            "high_tomorrow": high_tomorrow,
+            "average_today": average_today,
+            "average_tomorrow": average_tomorrow,
+            "charge_start": charge_start,
+            "charge_hours": charge_hours,
+            "charge_high": charge_high,
+        }
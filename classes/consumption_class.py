@@ -0,0 +1,282 @@
+import csv
+import datetime
+import json
+
+# Buckets of the profile: one per hour of every weekday, Monday 0:00 first
+BUCKETS = 7 * 24
+
+
+def local_hour(moment):
+    """
+    Returns the start of the local hour of a moment.
+
+    Args:
+        moment (float): Unix timestamp.
+
+    Returns:
+        datetime: The local hour.
+    """
+    return datetime.datetime.fromtimestamp(moment).replace(minute=0, second=0, microsecond=0)
+
+
+def parse_moment(text):
+    """
+    Parses a unix timestamp or an ISO date and time, as found in CSV files and Home Assistant exports.
+
+    Args:
+        text (str): The moment.
+
+    Returns:
+        float: Unix timestamp.
+    """
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.datetime.fromisoformat(text.strip().replace("Z", "+00:00")).timestamp()
+
+
+def hourly_energy(samples, gap=600):
+    """
+    Integrates power samples into the energy of every local hour. A sample holds until the next sample,
+    a longer time than gap (the recorder did not run) counts as no energy.
+
+    Only hours that ended before the last sample are returned, the hour of the last sample may still get
+    samples.
+
+    Args:
+        samples (iterable): (unix timestamp, W) in time order.
+        gap (float): Max seconds between two samples.
+
+    Returns:
+        iterator: (local hour, kWh, seconds covered) of every hour with samples.
+    """
+    hour = None
+    energy = 0.0
+    covered = 0.0
+    previous = None
+    for moment, watts in samples:
+        if previous is not None and moment > previous[0]:
+            start, power = previous
+            if moment - start <= gap:
+                # Split the step at every hour boundary it crosses
+                while start < moment:
+                    end = min(moment, (local_hour(start) + datetime.timedelta(hours=1)).timestamp())
+                    if local_hour(start) != hour:
+                        if hour is not None:
+                            yield hour, energy / 3600000, covered
+                        hour, energy, covered = local_hour(start), 0.0, 0.0
+                    energy += power * (end - start)
+                    covered += end - start
+                    start = end
+        if hour is not None and local_hour(moment) != hour:
+            yield hour, energy / 3600000, covered
+            hour, energy, covered = None, 0.0, 0.0
+        previous = (moment, watts)
+
+
+class ConsumptionProfile:
+    """
+    Expected consumption (kWh) of every hour of the week, learned from recorded history.
+
+    Every bucket keeps a running mean that is updated with each new hour of history, so learning never
+    goes over the old history again. Once a bucket has window hours the mean weighs the newest hour with
+    1/window, so the profile follows the seasons. Hours up to last are learned, history before it is
+    skipped, so the same export can be learned twice.
+
+    Attributes:
+        path (str): The profile file, None for a profile in memory only.
+        window (int): Number of hours after which a bucket becomes a moving average.
+        min_samples (int): Number of hours a bucket needs before it is used.
+        coverage (float): Part of an hour that must have samples to learn the hour.
+        counts (list): Number of hours learned per bucket.
+        means (list): Mean consumption (kWh) per bucket.
+        last (float): Unix timestamp up to which the history is learned.
+    """
+
+    def __init__(self, path, window=8, min_samples=2, coverage=0.9):
+        """
+        Initializes the profile and loads the profile file.
+
+        Args:
+            path (str): The profile file, None for a profile in memory only.
+            window (int): Number of hours after which a bucket becomes a moving average.
+            min_samples (int): Number of hours a bucket needs before it is used.
+            coverage (float): Part of an hour that must have samples to learn the hour.
+        """
+        self.path = path
+        self.window = window
+        self.min_samples = min_samples
+        self.coverage = coverage
+        self.counts = [0] * BUCKETS
+        self.means = [0.0] * BUCKETS
+        self.last = 0
+        self.load()
+
+    def load(self):
+        """
+        Loads the profile file, an empty profile if there is none.
+        """
+        if self.path is None:
+            return
+        try:
+            with open(self.path) as f:
+                profile = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        if len(profile.get("counts", [])) == BUCKETS and len(profile.get("means", [])) == BUCKETS:
+            self.counts = profile["counts"]
+            self.means = profile["means"]
+            self.last = profile.get("last", 0)
+
+    def save(self):
+        """
+        Saves the profile file.
+        """
+        if self.path is None:
+            return
+        try:
+            with open(self.path, 'w+') as file:
+                file.write(json.dumps({"last": self.last, "counts": self.counts, "means": [round(x, 4) for x in self.means]}))
+        except (IOError, OSError):
+            print("Error writing to file")
+
+    def bucket(self, hour):
+        """
+        Returns the bucket of a local hour.
+
+        Args:
+            hour (datetime): The local hour.
+
+        Returns:
+            int: The bucket.
+        """
+        return hour.weekday() * 24 + hour.hour
+
+    def update(self, hour, kwh):
+        """
+        Adds the consumption of one hour to the running mean of its bucket.
+
+        Args:
+            hour (datetime): The local hour.
+            kwh (float): The consumption of the hour.
+        """
+        bucket = self.bucket(hour)
+        self.counts[bucket] = min(self.counts[bucket] + 1, self.window)
+        self.means[bucket] += (kwh - self.means[bucket]) / self.counts[bucket]
+
+    def expected(self, hour):
+        """
+        Returns the expected consumption of a local hour.
+
+        Args:
+            hour (datetime): The local hour.
+
+        Returns:
+            float: kWh, None if the bucket has too few hours.
+        """
+        bucket = self.bucket(hour)
+        if self.counts[bucket] < self.min_samples:
+            return None
+        return self.means[bucket]
+
+    def hours(self, start, n, default):
+        """
+        Returns the expected consumption of consecutive hours.
+
+        Args:
+            start (datetime): The first local hour.
+            n (int): Number of hours.
+            default (float): kWh of an hour whose bucket has too few hours.
+
+        Returns:
+            list: kWh per hour.
+        """
+        result = []
+        for x in range(n):
+            kwh = self.expected(start + datetime.timedelta(hours=x))
+            result.append(default if kwh is None else kwh)
+        return result
+
+    def learn_power(self, samples, gap=600):
+        """
+        Learns the hours of power samples after last.
+
+        Args:
+            samples (iterable): (unix timestamp, W) in time order.
+            gap (float): Max seconds between two samples.
+
+        Returns:
+            int: Number of hours learned.
+        """
+        learned = 0
+        for hour, kwh, covered in hourly_energy((sample for sample in samples if sample[0] >= self.last), gap):
+            if covered >= self.coverage * 3600:
+                self.update(hour, kwh * 3600 / covered)
+                learned += 1
+            # The hour is done, also when too few samples were recorded
+            self.last = (hour + datetime.timedelta(hours=1)).timestamp()
+        return learned
+
+    def learn_energy(self, rows):
+        """
+        Learns hours of metered consumption after last.
+
+        Args:
+            rows (iterable): (unix timestamp of the start of the hour, kWh) in time order.
+
+        Returns:
+            int: Number of hours learned.
+        """
+        learned = 0
+        for moment, kwh in rows:
+            if moment < self.last:
+                continue
+            hour = local_hour(moment)
+            self.update(hour, kwh)
+            self.last = (hour + datetime.timedelta(hours=1)).timestamp()
+            learned += 1
+        return learned
+
+    def learn_csv(self, path):
+        """
+        Learns a CSV file with a header. A time column (unix timestamp or ISO) and either a kwh column with
+        the consumption of every hour, or a load_power column with power samples (W), like the export of
+        telemetry.py.
+
+        Args:
+            path (str): The CSV file.
+
+        Returns:
+            int: Number of hours learned.
+        """
+        with open(path, newline="") as f:
+            reader = csv.DictReader(f)
+            if "kwh" in reader.fieldnames:
+                rows = ((parse_moment(row["time"]), float(row["kwh"])) for row in reader if row["kwh"])
+                return self.learn_energy(sorted(rows))
+            column = "load_power" if "load_power" in reader.fieldnames else "power"
+            samples = ((parse_moment(row["time"]), float(row[column])) for row in reader if row[column])
+            return self.learn_power(sorted(samples))
+
+    def learn_homeassistant(self, path):
+        """
+        Learns a Home Assistant history export (the JSON of /api/history/period) of a power sensor (W).
+
+        Args:
+            path (str): The JSON file.
+
+        Returns:
+            int: Number of hours learned.
+        """
+        with open(path) as f:
+            history = json.load(f)
+        samples = []
+        for states in history:
+            for state in states:
+                try:
+                    samples.append((parse_moment(state["last_changed"]), float(state["state"])))
+                except (KeyError, ValueError):
+                    # unavailable / unknown
+                    continue
+        # A power sensor only reports changes, a steady load can go without a state for a long time
+        return self.learn_power(sorted(samples), gap=86400)
@@ -0,0 +1,134 @@
+import datetime
+import time
+from classes.battery_class import Battery
+from classes.telemetry_class import RingBuffer, TelemetryPoller
+
+
+class Daemon:
+    """
+    Keeps one Battery resident and plans it on hour or quarter-hour boundaries.
+
+    The Battery keeps its Modbus connection, prices and forecast between runs, so a tick only reads the
+    register snapshot and refreshes what expired.
+
+    Attributes:
+        battery (Battery): The resident battery.
+        interval (int): Minutes between ticks, 60 or 15.
+        lead (int): Seconds before the boundary to wake, the plan must be written before the hour turns.
+        telemetry (TelemetryPoller): Samples the live registers between ticks over the same connection,
+            None when telemetry is not enabled in the config. The load power of the samples is learned
+            into the consumption profile of the battery every tick.
+    """
+
+    def __init__(self, interval=60, lead=60):
+        """
+        Initializes the daemon and loads the configuration.
+
+        Args:
+            interval (int): Minutes between ticks, 60 or 15.
+            lead (int): Seconds before the boundary to wake (max 60, like the xx:59 cronjob).
+        """
+        self.battery = Battery(run=False)
+        self.interval = interval
+        self.lead = lead
+        self.telemetry = None
+        telemetry = self.battery.cfg.get("telemetry", {})
+        if telemetry.get("enabled", False):
+            ring = RingBuffer(telemetry.get("path", "telemetry.bin"), telemetry.get("capacity", 1048576))
+            self.telemetry = TelemetryPoller(ring, telemetry.get("interval", 10), self.battery.cfg["kiwatt"].get("max_read", 125))
+
+    def next_wake(self, now):
+        """
+        Calculates when to wake for the next boundary.
+
+        Args:
+            now (datetime): The current time.
+
+        Returns:
+            datetime: The next wake time.
+        """
+        minute = now.minute - now.minute % self.interval
+        boundary = now.replace(minute=minute, second=0, microsecond=0) + datetime.timedelta(minutes=self.interval)
+        wake = boundary - datetime.timedelta(seconds=self.lead)
+        if wake <= now:
+            wake += datetime.timedelta(minutes=self.interval)
+        return wake
+
+    def tick(self):
+        """
+        Refreshes the expired inputs and plans again if any planning input changed.
+
+        Returns:
+            bool: True if the battery was planned.
+        """
+        battery = self.battery
+        battery.metrics.begin()
+        try:
+            battery.get_hour()
+            battery.acquire()
+            self.learn_consumption()
+
+            if battery.replay():
+                battery.flush()
+                return False
+
+            battery.plan()
+            return True
+        finally:
+            battery.metrics.end(perc=battery.perc)
+
+    def learn_consumption(self):
+        """
+        Learns the consumption profile from the telemetry recorded since the last tick.
+        """
+        if self.telemetry is None:
+            return
+        consumption = self.battery.consumption
+        samples = ((sample[0], sample[4]) for sample in self.telemetry.ring.samples(consumption.last, time.time()))
+        if consumption.learn_power(samples):
+            consumption.save()
+
+    def sleep_until(self, wake):
+        """
+        Sleeps until the wake time, sampling the telemetry when it is due.
+
+        Args:
+            wake (datetime): The wake time.
+        """
+        while True:
+            remaining = (wake - datetime.datetime.now()).total_seconds()
+            if remaining <= 0:
+                return
+            if self.telemetry is None:
+                time.sleep(remaining)
+                return
+
+            if self.telemetry.due():
+                try:
+                    self.telemetry.poll(self.battery.connect(self.battery.cfg.get("timeouts", {}).get("inverter", 20)))
+                except Exception as e:
+                    print("Telemetry failed: " + str(e))
+                    self.disconnect()
+            time.sleep(max(0, min(remaining, self.telemetry.next_poll - time.time())))
+
+    def disconnect(self):
+        """
+        Drops the Modbus connection, the next read connects again. The session keeps its circuit breaker.
+        """
+        if self.battery.modbus:
+            self.battery.modbus.disconnect()
+
+    def run(self):
+        """
+        Ticks on every boundary until interrupted. A failed tick drops the Modbus connection so the next
+        tick connects again.
+        """
+        while True:
+            wake = self.next_wake(datetime.datetime.now())
+            self.sleep_until(wake)
+            try:
+                self.tick()
+            except Exception as e:
+                print("Run failed: " + str(e))
+                self.battery.flush()
+                self.disconnect()
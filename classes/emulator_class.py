@@ -0,0 +1,288 @@
+import random
+import socketserver
+import struct
+import threading
+import time
+
+# Registers of the emulated inverter: address -> value
+DEFAULT_REGISTERS = {
+    102: 400,  # Battery capacity (x 50 Wh)
+    108: 100,  # Max charge (x 50 Wh per hour)
+    142: 1,  # Work mode, 0=selling first, 1=zero export
+    148: 0, 149: 100, 150: 200, 151: 300, 152: 400, 153: 500,  # Set points
+    166: 10, 167: 10, 168: 10, 169: 10, 170: 10, 171: 10,  # Loads
+    172: 0, 173: 0, 174: 0, 175: 0, 176: 0, 177: 0,  # Load points
+    588: 50,  # Battery percentage
+    590: 0,  # Battery power (W, signed, + discharge)
+    625: 0,  # Grid power (W, signed, + import)
+    653: 400,  # Load power (W)
+    672: 0, 673: 0,  # PV1 and PV2 power (W)
+}
+
+# Max number of registers in one Modbus read or write
+MAX_REGISTERS = 125
+
+
+def crc16(data):
+    """
+    Calculates the Modbus RTU CRC.
+
+    Args:
+        data (bytes): The frame without CRC.
+
+    Returns:
+        bytes: The CRC, low byte first.
+    """
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return struct.pack("<H", crc)
+
+
+class InverterEmulator:
+    """
+    A SolarmanV5 logger with a Modbus inverter behind it, for testing and benchmarking without the real
+    stick logger.
+
+    Attributes:
+        serial (int): Serial number of the logger.
+        registers (dict): Holding register address -> value.
+        latency (float): Seconds before every response.
+        jitter (float): Max random seconds added to the latency.
+        drop (float): Probability a request gets no response.
+        drift (float): Battery percentage lost per hour while the battery is not charging from the grid.
+        charge (float): Battery percentage gained per hour while charging from the grid.
+        stats (dict): Counters of requests, round trips, dropped frames, bytes, reads and writes.
+    """
+
+    def __init__(self, serial, registers=None, latency=0.0, jitter=0.0, drop=0.0, drift=0.0, charge=25.0, seed=None):
+        """
+        Initializes the emulator.
+
+        Args:
+            serial (int): Serial number of the logger.
+            registers (dict): Holding register address -> value, defaults to DEFAULT_REGISTERS.
+            latency (float): Seconds before every response.
+            jitter (float): Max random seconds added to the latency.
+            drop (float): Probability a request gets no response.
+            drift (float): Battery percentage lost per hour while the battery is not charging from the grid.
+            charge (float): Battery percentage gained per hour while charging from the grid.
+            seed (int): Seed of the random faults.
+        """
+        self.serial = serial
+        self.registers = dict(DEFAULT_REGISTERS if registers is None else registers)
+        self.latency = latency
+        self.jitter = jitter
+        self.drop = drop
+        self.drift = drift
+        self.charge = charge
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.soc = float(self.registers.get(588, 50))
+        self.updated = time.monotonic()
+        self.stats = dict.fromkeys(("requests", "round_trips", "dropped", "errors", "bytes_in", "bytes_out", "reads", "writes", "registers_read", "registers_written"), 0)
+
+    def count(self, name, value=1):
+        """
+        Adds to a counter.
+
+        Args:
+            name (str): The counter.
+            value (int): The amount.
+        """
+        with self.lock:
+            self.stats[name] += value
+
+    def snapshot_stats(self):
+        """
+        Returns a copy of the counters.
+        """
+        with self.lock:
+            return dict(self.stats)
+
+    def update_soc(self):
+        """
+        Moves the battery percentage for the time since the last update, up while the active time slot
+        charges from the grid to its load, down otherwise.
+        """
+        now = time.monotonic()
+        hours = (now - self.updated) / 3600
+        self.updated = now
+
+        clock = time.localtime()
+        minute = clock.tm_hour * 100 + clock.tm_min
+        slots = sorted((self.registers.get(148 + x, 0), x) for x in range(6))
+        active = slots[-1][1]
+        for set_point, x in slots:
+            if set_point <= minute:
+                active = x
+
+        target = self.registers.get(166 + active, 0)
+        if self.registers.get(172 + active, 0) and self.soc < target:
+            self.soc = min(target, self.soc + self.charge * hours)
+        else:
+            self.soc = max(0.0, self.soc - self.drift * hours)
+        self.registers[588] = int(round(self.soc))
+
+    def handle(self, frame):
+        """
+        Handles one SolarmanV5 request frame.
+
+        Args:
+            frame (bytes): The request frame.
+
+        Returns:
+            bytes: The response frame, None when the frame is dropped or invalid.
+        """
+        self.count("requests")
+        self.count("bytes_in", len(frame))
+
+        if len(frame) < 28 or frame[0] != 0xA5 or frame[-1] != 0x15 or frame[3:5] != struct.pack("<H", 0x4510):
+            self.count("errors")
+            return None
+        if frame[-2] != sum(frame[1:-2]) & 0xFF:
+            self.count("errors")
+            return None
+
+        if self.random.random() < self.drop:
+            self.count("dropped")
+            return None
+
+        with self.lock:
+            pdu = self.modbus(frame[26:-2])
+        if pdu is None:
+            self.count("errors")
+            return None
+
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        payload = bytes([0x02, 0x01]) + bytes(12) + pdu
+        response = bytearray(b"\xA5" + struct.pack("<H", len(payload)) + struct.pack("<H", 0x1510) + frame[5:7] + frame[7:11] + payload + b"\x00\x15")
+        response[-2] = sum(response[1:-2]) & 0xFF
+        self.count("round_trips")
+        self.count("bytes_out", len(response))
+        return bytes(response)
+
+    def modbus(self, request):
+        """
+        Handles one Modbus RTU request: read holding/input registers (3, 4), write single register (6)
+        and write multiple registers (16).
+
+        Args:
+            request (bytes): The Modbus RTU frame.
+
+        Returns:
+            bytes: The Modbus RTU response, None when the CRC is wrong.
+        """
+        if len(request) < 4 or crc16(request[:-2]) != request[-2:]:
+            return None
+
+        slave, function = request[0], request[1]
+        self.update_soc()
+
+        if function in (3, 4):
+            address, quantity = struct.unpack(">HH", request[2:6])
+            if not 1 <= quantity <= MAX_REGISTERS:
+                return self.exception(slave, function, 3)
+            values = [self.registers.get(address + x, 0) for x in range(quantity)]
+            self.stats["reads"] += 1
+            self.stats["registers_read"] += quantity
+            response = bytes([slave, function, quantity * 2]) + struct.pack(">%dH" % quantity, *values)
+        elif function == 6:
+            address, value = struct.unpack(">HH", request[2:6])
+            self.write(address, [value])
+            response = request[:6]
+        elif function == 16:
+            address, quantity, count = struct.unpack(">HHB", request[2:7])
+            if not 1 <= quantity <= MAX_REGISTERS or count != quantity * 2:
+                return self.exception(slave, function, 3)
+            self.write(address, struct.unpack(">%dH" % quantity, request[7:7 + count]))
+            response = request[:6]
+        else:
+            return self.exception(slave, function, 1)
+
+        return response + crc16(response)
+
+    def write(self, address, values):
+        """
+        Writes holding registers, a write to register 588 sets the battery percentage.
+
+        Args:
+            address (int): The first register.
+            values (list): The values.
+        """
+        for offset, value in enumerate(values):
+            self.registers[address + offset] = value
+            if address + offset == 588:
+                self.soc = float(value)
+        self.stats["writes"] += 1
+        self.stats["registers_written"] += len(values)
+
+    def exception(self, slave, function, code):
+        """
+        Builds a Modbus exception response.
+
+        Args:
+            slave (int): The slave id.
+            function (int): The function code.
+            code (int): The exception code.
+
+        Returns:
+            bytes: The Modbus RTU response.
+        """
+        response = bytes([slave, function | 0x80, code])
+        return response + crc16(response)
+
+
+class EmulatorHandler(socketserver.BaseRequestHandler):
+    """
+    Reads SolarmanV5 frames from one TCP connection and answers them.
+    """
+
+    def handle(self):
+        emulator = self.server.emulator
+        buffer = b""
+        while True:
+            data = self.request.recv(1024)
+            if not data:
+                return
+            buffer += data
+            # A frame is 13 bytes plus the payload length in bytes 1-2
+            while len(buffer) >= 3:
+                if buffer[0] != 0xA5:
+                    buffer = buffer[1:]
+                    continue
+                length = 13 + struct.unpack("<H", buffer[1:3])[0]
+                if len(buffer) < length:
+                    break
+                frame, buffer = buffer[:length], buffer[length:]
+                response = emulator.handle(frame)
+                if response is not None:
+                    self.request.sendall(response)
+
+
+class EmulatorServer(socketserver.ThreadingTCPServer):
+    """
+    TCP server of the emulated logger, one thread per connection.
+
+    Attributes:
+        emulator (InverterEmulator): The emulated logger and inverter.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, emulator):
+        """
+        Initializes the server.
+
+        Args:
+            address (tuple): Host and port to listen on.
+            emulator (InverterEmulator): The emulated logger and inverter.
+        """
+        super().__init__(address, EmulatorHandler)
+        self.emulator = emulator
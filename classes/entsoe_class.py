@@ -0,0 +1,194 @@
+import array
+import datetime
+import io
+import math
+import re
+import xml.etree.ElementTree as ET
+
+
+class PriceCurve:
+    """
+    Day ahead prices on a fixed time grid.
+
+    Attributes:
+        start (datetime): Start of slot 0 (UTC).
+        resolution (int): Minutes per slot.
+        prices (array): Price (EUR/MWh) per slot.
+    """
+
+    def __init__(self, start, resolution, prices):
+        """
+        Initializes the price curve.
+
+        Args:
+            start (datetime): Start of slot 0 (UTC).
+            resolution (int): Minutes per slot.
+            prices (array): Price (EUR/MWh) per slot.
+        """
+        self.start = start
+        self.resolution = resolution
+        self.prices = prices
+
+    def __len__(self):
+        return len(self.prices)
+
+    @property
+    def end(self):
+        """
+        Returns the end of the last slot (UTC).
+        """
+        return self.start + datetime.timedelta(minutes=self.resolution * len(self.prices))
+
+    def slot(self, moment):
+        """
+        Returns the slot index of a moment.
+
+        Args:
+            moment (datetime): Timezone aware moment.
+
+        Returns:
+            int: The slot index, may be out of range.
+        """
+        return math.floor((moment - self.start).total_seconds() / 60 / self.resolution)
+
+    def hourly(self, origin=None, hours=48):
+        """
+        Averages the slots per hour.
+
+        Args:
+            origin (datetime): Start of hour 0, defaults to the start of the curve.
+            hours (int): Max number of hours.
+
+        Returns:
+            list: Average price per hour, up to the first hour the curve does not cover.
+        """
+        return self.average(origin, 60, hours)
+
+    def average(self, origin=None, minutes=60, count=48):
+        """
+        Averages the slots per period of a coarser or equal resolution.
+
+        Args:
+            origin (datetime): Start of period 0, defaults to the start of the curve.
+            minutes (int): Minutes per period, a multiple of the resolution.
+            count (int): Max number of periods.
+
+        Returns:
+            list: Average price per period, up to the first period the curve does not cover.
+        """
+        origin = self.start if origin is None else origin
+        per_period = max(1, minutes // self.resolution)
+        first = self.slot(origin)
+        result = []
+        for period in range(count):
+            begin = first + period * per_period
+            if begin < 0 or begin + per_period > len(self.prices):
+                break
+            result.append(sum(self.prices[begin:begin + per_period]) / per_period)
+        return result
+
+
+def parse_duration(text):
+    """
+    Parses an ISO 8601 resolution like PT15M or PT60M.
+
+    Args:
+        text (str): The resolution.
+
+    Returns:
+        int: Minutes.
+    """
+    match = re.fullmatch(r"P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?)?", text.strip())
+    if match is None:
+        raise ValueError("Unsupported resolution: " + text)
+    days, hours, minutes = (int(x) if x else 0 for x in match.groups())
+    return days * 1440 + hours * 60 + minutes
+
+
+def parse_time(text):
+    """
+    Parses an ENTSO-e timestamp like 2023-02-22T23:00Z.
+
+    Args:
+        text (str): The timestamp.
+
+    Returns:
+        datetime: Timezone aware moment.
+    """
+    return datetime.datetime.fromisoformat(text.strip().replace("Z", "+00:00"))
+
+
+def parse_a44(content):
+    """
+    Parses an ENTSO-e A44 (day ahead prices) document in a single streaming pass.
+
+    Every Period brings its own timeInterval, resolution and the curveType of its TimeSeries. Positions
+    left out of an A03 curve repeat the previous position. Periods of different resolutions are put on
+    the finest grid, finer periods win where periods overlap. Slots no period covers repeat the previous
+    slot.
+
+    Args:
+        content (bytes): The XML document.
+
+    Returns:
+        PriceCurve: The prices, None if the document has no prices.
+    """
+    periods = []
+    curve_type = "A01"
+    start = end = resolution = position = None
+    points = []
+
+    for _, elem in ET.iterparse(io.BytesIO(content), events=("end",)):
+        tag = elem.tag.rpartition("}")[2]
+        if tag == "position":
+            position = int(elem.text)
+        elif tag == "price.amount":
+            points.append((position, float(elem.text)))
+        elif tag == "resolution":
+            resolution = parse_duration(elem.text)
+        elif tag == "start":
+            start = parse_time(elem.text)
+        elif tag == "end":
+            end = parse_time(elem.text)
+        elif tag == "curveType":
+            curve_type = elem.text.strip()
+        elif tag == "Period":
+            if points:
+                periods.append((start, end, resolution, curve_type, points))
+            points = []
+            elem.clear()
+        elif tag == "TimeSeries":
+            curve_type = "A01"
+            elem.clear()
+
+    if not periods:
+        return None
+
+    step = min(period[2] for period in periods)
+    origin = min(period[0] for period in periods)
+    length = max(int((period[1] - origin).total_seconds() // 60 // step) for period in periods)
+    prices = array.array("d", bytes(8 * length))
+    filled = bytearray(length)
+
+    # Coarse periods first so finer periods overwrite them
+    for start, end, resolution, curve_type, points in sorted(periods, key=lambda period: -period[2]):
+        factor = resolution // step
+        offset = int((start - origin).total_seconds() // 60 // step)
+        count = int((end - start).total_seconds() // 60 // resolution)
+        values = dict(points)
+        value = None
+        for position in range(1, count + 1):
+            if position in values:
+                value = values[position]
+            elif curve_type != "A03" or value is None:
+                continue
+            first = offset + (position - 1) * factor
+            prices[first:first + factor] = array.array("d", [value]) * factor
+            filled[first:first + factor] = b"\x01" * factor
+
+    # Fill in any missing slots with the previous value
+    for i in range(length):
+        if not filled[i]:
+            prices[i] = prices[i - 1] if i > 0 else 0
+
+    return PriceCurve(origin, step, prices)
@@ -0,0 +1,189 @@
+import concurrent.futures
+import copy
+import time
+from classes.battery_class import Battery
+
+# Files of a site that must not be shared with other sites: (section, key, default)
+SITE_FILES = (
+    ("forecast.solar", "cache", "forecast.json"),
+    ("telegram", "state", "notified.json"),
+    ("homeassistant", "state", "homeassistant.json"),
+    ("consumption", "path", "consumption.json"),
+    ("journal", "path", "journal.db"),
+    ("telemetry", "path", "telemetry.bin"),
+    ("metrics", "trace", "trace.jsonl"),
+    ("metrics", "prometheus", "kiwatt.prom"),
+)
+
+
+def site_configs(cfg):
+    """
+    Builds the configuration of every site of the fleet.
+
+    Every entry of cfg["sites"] has a name and the sections that differ from the shared configuration,
+    a section of a site is merged into the shared section, so a site usually only sets the ip and sn of
+    its kiwatt section. Files of a site get the name of the site unless the site sets them.
+
+    Args:
+        cfg (dict): Configuration settings with a sites list.
+
+    Returns:
+        list: (name, configuration) of every site.
+    """
+    shared = {key: value for key, value in cfg.items() if key not in ("sites", "fleet")}
+    result = []
+    for site in cfg["sites"]:
+        name = site["name"]
+        site_cfg = copy.deepcopy(shared)
+        for section, value in site.items():
+            if section == "name":
+                continue
+            if isinstance(value, dict):
+                site_cfg.setdefault(section, {}).update(value)
+            else:
+                site_cfg[section] = value
+
+        for section, key, default in SITE_FILES:
+            if key not in site.get(section, {}):
+                files = site_cfg.setdefault(section, {})
+                stem, dot, extension = files.get(key, default).rpartition(".")
+                files[key] = stem + "-" + name + dot + extension if dot else extension + "-" + name
+        result.append((name, site_cfg))
+    return result
+
+
+class Fleet:
+    """
+    Plans and programs many inverters from one process.
+
+    The prices are fetched once per bidding zone and shared by the sites in that zone, then every site
+    reads its inverter, plans and writes its load table in a thread pool. The pool size bounds the number
+    of open Modbus connections, a site disconnects when it is done.
+
+    Attributes:
+        sites (list): (name, Battery) of every site.
+        connections (int): Max number of sites, and Modbus connections, at the same time.
+    """
+
+    def __init__(self, cfg):
+        """
+        Initializes the fleet.
+
+        Args:
+            cfg (dict): Configuration settings with a sites list and optional fleet settings.
+        """
+        self.sites = [(name, Battery(run=False, cfg=site_cfg)) for name, site_cfg in site_configs(cfg)]
+        self.connections = cfg.get("fleet", {}).get("connections", 8)
+
+    def zones(self):
+        """
+        Groups the sites by bidding zone.
+
+        Returns:
+            dict: Zone -> list of Battery.
+        """
+        zones = {}
+        for name, battery in self.sites:
+            entsoe = battery.cfg["entsoe"]
+            zone = (entsoe.get("country"), entsoe["tz"], entsoe.get("store", "prices.db"))
+            zones.setdefault(zone, []).append(battery)
+        return zones
+
+    def share_prices(self, batteries):
+        """
+        Fetches the prices of a zone once, with the first site, and hands them to every site of the zone.
+
+        Args:
+            batteries (list): The sites of the zone.
+        """
+        first = batteries[0]
+        for battery in batteries:
+            battery.get_hour()
+        if not first.prices_expired():
+            return
+
+        timeout = first.cfg.get("timeouts", {}).get("prices", 20)
+        try:
+            first.set_prices(first.fetch_hour_prices(timeout))
+        except Exception as e:
+            print("Prices failed (" + (str(e) or type(e).__name__) + "), using cache")
+            first.set_prices(first.cached_hour_prices(), True)
+
+        for battery in batteries[1:]:
+            battery.p24, battery.p48, battery.prices = first.p24, first.p48, first.prices
+            battery.prices_day = first.prices_day
+            battery.prices_expire = first.prices_expire
+
+    def run_site(self, name, battery):
+        """
+        Reads, plans and programs one site, the prices are already acquired.
+
+        Args:
+            name (str): The site.
+            battery (Battery): The site.
+
+        Returns:
+            dict: Result of the site.
+        """
+        started = time.monotonic()
+        result = {"site": name, "ok": False, "perc": None, "writes": 0, "error": None}
+        battery.metrics.begin()
+        try:
+            battery.get_hour()
+            battery.acquire()
+            if not battery.replay():
+                battery.plan()
+            result["ok"] = True
+            result["perc"] = battery.perc
+            result["writes"] = len(battery.writes)
+            result["expected_cost"] = battery.expected_cost.get(battery.cfg.get("planner", "heuristic"))
+        except Exception as e:
+            result["error"] = str(e) or type(e).__name__
+        finally:
+            battery.flush()
+            battery.metrics.end(perc=battery.perc)
+            if battery.modbus:
+                battery.modbus.disconnect()
+        result["seconds"] = round(time.monotonic() - started, 3)
+        return result
+
+    def run(self):
+        """
+        Shares the prices per zone, then runs every site.
+
+        Returns:
+            list: Result of every site.
+        """
+        zones = self.zones()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(zones))) as executor:
+            for future in [executor.submit(self.share_prices, batteries) for batteries in zones.values()]:
+                try:
+                    future.result()
+                except Exception as e:
+                    # The sites of this zone fall back to the cached prices in their own acquire
+                    print("Zone failed: " + str(e))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.connections) as executor:
+            return list(executor.map(lambda site: self.run_site(*site), self.sites))
+
+
+def summarize(results):
+    """
+    Formats the results of the fleet.
+
+    Args:
+        results (list): Result of every site.
+
+    Returns:
+        str: One line per site and a total line.
+    """
+    lines = []
+    for result in results:
+        if result["ok"]:
+            lines.append("%-16s %3s%%  writes: %d  %.2fs" % (result["site"], result["perc"], result["writes"], result["seconds"]))
+        else:
+            lines.append("%-16s failed: %s  %.2fs" % (result["site"], result["error"], result["seconds"]))
+    ok = sum(1 for result in results if result["ok"])
+    lines.append("%d/%d sites planned, %d written, slowest %.2fs" % (
+        ok, len(results), sum(1 for result in results if result["writes"]), max((result["seconds"] for result in results), default=0)))
+    return "\n".join(lines)
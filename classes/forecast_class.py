@@ -0,0 +1,296 @@
+import datetime
+import json
+import time
+
+
+class ForecastCache:
+    """
+    Disk cache of the forecast.solar estimate that respects the rate limit of the API.
+
+    The cache file holds the raw estimate together with the production per slot (Wh), calculated once
+    when the estimate is fetched. The estimate is served from disk while it is fresh, and while the API
+    asks to wait because the rate limit is reached.
+
+    Attributes:
+        path (str): The cache file.
+        url (str): The forecast.solar estimate url.
+        ttl (int): Seconds an estimate stays fresh.
+        resolution (int): Minutes per production slot, 60 or 15.
+    """
+
+    def __init__(self, path, url, ttl=3600, resolution=60):
+        """
+        Initializes the cache.
+
+        Args:
+            path (str): The cache file.
+            url (str): The forecast.solar estimate url.
+            ttl (int): Seconds an estimate stays fresh.
+            resolution (int): Minutes per production slot, 60 or 15.
+        """
+        self.path = path
+        self.url = url
+        self.ttl = ttl
+        self.resolution = resolution
+
+    def load(self):
+        """
+        Loads the cache file.
+
+        Returns:
+            dict: The cache entry, None if there is no cache file.
+        """
+        try:
+            with open(self.path) as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+        # A raw estimate as saved by older versions
+        if "result" in entry:
+            entry = self.entry(entry, 0)
+        return entry
+
+    def save(self, entry):
+        """
+        Saves a cache entry.
+
+        Args:
+            entry (dict): The cache entry.
+        """
+        try:
+            with open(self.path, 'w+') as file:
+                file.write(json.dumps(entry))
+        except (IOError, OSError):
+            print("Error writing to file")
+
+    def get(self, timeout):
+        """
+        Returns the estimate from disk when it is fresh or the rate limit is reached, fetches it otherwise.
+
+        Args:
+            timeout (float): The request timeout in seconds.
+
+        Returns:
+            dict: The cache entry.
+        """
+        entry = self.load()
+        now = time.time()
+        if entry is not None and (now < entry["expires"] or now < entry["retry_at"]):
+            return entry
+        return self.fetch(timeout, entry)
+
+    def fetch(self, timeout, cached=None):
+        """
+        Fetches the estimate from forecast.solar and saves it.
+
+        Args:
+            timeout (float): The request timeout in seconds.
+            cached (dict): The current cache entry, keeps the rate limit when the API refuses the call.
+
+        Returns:
+            dict: The cache entry.
+        """
+        import requests
+
+        headers = {
+            "content-type": "application/json"
+        }
+        response = requests.request("GET", self.url, headers=headers, timeout=timeout)
+        estimate = response.json()
+        retry_at = self.retry_at(response, estimate)
+
+        # Check if we received a result
+        if response.status_code == 429 or estimate.get('result') is None or estimate['result'] == 'Rate limit for API calls reached.':
+            if cached is not None:
+                cached["retry_at"] = retry_at or time.time() + self.ttl
+                self.save(cached)
+            raise ValueError("No result from forecast.solar")
+
+        entry = self.entry(estimate, time.time(), retry_at)
+        self.save(entry)
+        return entry
+
+    def retry_at(self, response, estimate):
+        """
+        Reads the rate limit from the response headers, or from the message of the estimate.
+
+        Args:
+            response (Response): The forecast.solar response.
+            estimate (dict): The forecast.solar estimate.
+
+        Returns:
+            float: Unix timestamp before which the API must not be called, 0 if there is no limit.
+        """
+        if "X-Ratelimit-Retry-At" in response.headers:
+            try:
+                return datetime.datetime.fromisoformat(response.headers["X-Ratelimit-Retry-At"]).timestamp()
+            except ValueError:
+                pass
+
+        ratelimit = (estimate.get("message") or {}).get("ratelimit") or {}
+        remaining = response.headers.get("X-Ratelimit-Remaining", ratelimit.get("remaining"))
+        period = response.headers.get("X-Ratelimit-Period", ratelimit.get("period", 3600))
+        if remaining is not None and int(remaining) <= 0:
+            return time.time() + int(period)
+        return 0
+
+    def entry(self, estimate, fetched, retry_at=0):
+        """
+        Builds a cache entry with the production per slot.
+
+        Args:
+            estimate (dict): The forecast.solar estimate.
+            fetched (float): Unix timestamp of the fetch, 0 if unknown.
+            retry_at (float): Unix timestamp before which the API must not be called.
+
+        Returns:
+            dict: The cache entry.
+        """
+        start, production = production_vector((estimate.get('result') or {}).get("watt_hours_period", {}), self.resolution)
+        return {
+            "fetched": fetched,
+            "expires": fetched + self.ttl if fetched else 0,
+            "retry_at": retry_at,
+            "start": start,
+            "resolution": self.resolution,
+            "production": production,
+            "estimate": estimate,
+        }
+
+
+def production_vector(watt_hours_period, resolution):
+    """
+    Spreads the forecast.solar watt_hours_period over fixed slots.
+
+    Every value is the energy of the period since the previous timestamp of the same day, it is spread
+    evenly over the slots of that period.
+
+    Args:
+        watt_hours_period (dict): Local timestamp (YYYY-MM-DD HH:MM:SS) -> Wh.
+        resolution (int): Minutes per slot.
+
+    Returns:
+        tuple: Local date of slot 0 (ISO) and the Wh per slot from 0:00 that day.
+    """
+    periods = sorted((datetime.datetime.fromisoformat(moment), wh) for moment, wh in watt_hours_period.items())
+    if not periods:
+        return datetime.date.today().isoformat(), []
+
+    origin = datetime.datetime.combine(periods[0][0].date(), datetime.time())
+    slots_per_day = 1440 // resolution
+    production = [0.0] * ((periods[-1][0].date() - origin.date()).days + 1) * slots_per_day
+    previous = None
+
+    for moment, wh in periods:
+        begin = previous if previous is not None and previous.date() == moment.date() else moment
+        previous = moment
+        if wh <= 0:
+            continue
+        if begin == moment:
+            # No period, the energy belongs to the slot before the timestamp
+            production[max(0, int((moment - origin).total_seconds() // 60 - 1) // resolution)] += wh
+            continue
+        minutes = (moment - begin).total_seconds() / 60
+        position = (begin - origin).total_seconds() / 60
+        end = (moment - origin).total_seconds() / 60
+        while position < end:
+            slot = int(position // resolution)
+            step = min(end, (slot + 1) * resolution) - position
+            production[slot] += wh * step / minutes
+            position += step
+
+    return origin.date().isoformat(), production
+
+
+def hourly_production(entry, day, hours=48):
+    """
+    Sums the production per slot of a cache entry per hour.
+
+    Args:
+        entry (dict): The cache entry.
+        day (date): The day of hour 0.
+        hours (int): Number of hours.
+
+    Returns:
+        list: Wh per hour from 0:00 of the day, 0 for hours without a forecast.
+    """
+    per_hour = 60 // entry["resolution"]
+    first = (day - datetime.date.fromisoformat(entry["start"])).days * 24 * per_hour
+    production = entry["production"]
+    result = []
+    for hour in range(hours):
+        begin = first + hour * per_hour
+        result.append(sum(production[max(0, begin):max(0, begin + per_hour)]))
+    return result
+
+
+def plane_caches(config, ttl=3600):
+    """
+    Builds a forecast cache for every plane of the forecast.solar configuration.
+
+    A configuration without planes is one plane. Every entry of config["planes"] is a plane with its own
+    dec, az and kwp, lat and long are taken from the configuration when the plane does not set them. The
+    cache file of a plane gets the name of the plane, or its number when it has no name.
+
+    Args:
+        config (dict): The forecast.solar configuration.
+        ttl (int): Seconds an estimate stays fresh.
+
+    Returns:
+        list: ForecastCache of every plane.
+    """
+    path = config.get("cache", "forecast.json")
+    planes = config.get("planes")
+    if not planes:
+        planes = [config]
+        paths = [path]
+    else:
+        stem, dot, extension = path.rpartition(".")
+        paths = []
+        for x, plane in enumerate(planes):
+            name = str(plane.get("name", x + 1))
+            paths.append(plane.get("cache", stem + "-" + name + dot + extension if dot else extension + "-" + name))
+
+    caches = []
+    for plane, cache in zip(planes, paths):
+        values = [plane.get(key, config.get(key)) for key in ("lat", "long", "dec", "az", "kwp")]
+        url = 'https://api.forecast.solar/estimate/' + "/".join(str(value) for value in values)
+        caches.append(ForecastCache(cache, url, ttl, config.get("resolution", 60)))
+    return caches
+
+
+def merge_entries(entries):
+    """
+    Adds up the production per slot of the cache entries of several planes.
+
+    The merged entry expires when the first plane must be fetched again.
+
+    Args:
+        entries (list): The cache entries, all of the same resolution.
+
+    Returns:
+        dict: The merged cache entry, without the raw estimates.
+    """
+    if len(entries) == 1:
+        return entries[0]
+
+    resolution = entries[0]["resolution"]
+    per_day = 1440 // resolution
+    origin = min(datetime.date.fromisoformat(entry["start"]) for entry in entries)
+    production = []
+    for entry in entries:
+        offset = (datetime.date.fromisoformat(entry["start"]) - origin).days * per_day
+        if len(production) < offset + len(entry["production"]):
+            production.extend([0.0] * (offset + len(entry["production"]) - len(production)))
+        for slot, wh in enumerate(entry["production"]):
+            production[offset + slot] += wh
+
+    return {
+        "fetched": min(entry["fetched"] for entry in entries),
+        "expires": min(entry["expires"] for entry in entries),
+        "retry_at": min(max(entry["expires"], entry["retry_at"]) for entry in entries),
+        "start": origin.isoformat(),
+        "resolution": resolution,
+        "production": production,
+    }
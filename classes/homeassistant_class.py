@@ -0,0 +1,117 @@
+import json
+import time
+
+
+class HomeAssistantPublisher:
+    """
+    Publishes the attributes of a Home Assistant sensor with one client and only when they changed.
+
+    Every state update is written to the recorder of Home Assistant, so the last published attributes
+    are kept locally, also across runs when a state file is given, and an update is skipped when
+    nothing changed. The attributes are republished after the refresh period, in case Home Assistant
+    restarted and lost them.
+
+    Attributes:
+        url (str): The API URL of Home Assistant.
+        token (str): The long-lived access token.
+        entity_id (str): The sensor to publish.
+        refresh (float): Seconds after which unchanged attributes are published again.
+        path (str): File with the last published attributes, None to keep them in memory only.
+        client (Client): The Home Assistant client, created on the first publish.
+        state (State): The sensor state, fetched on the first publish.
+        published (dict): The last published attributes.
+        published_at (float): Unix timestamp of the last publish.
+    """
+
+    def __init__(self, url, token, entity_id='sensor.load_now', refresh=86400, path=None):
+        """
+        Initializes the publisher.
+
+        Args:
+            url (str): The API URL of Home Assistant.
+            token (str): The long-lived access token.
+            entity_id (str): The sensor to publish.
+            refresh (float): Seconds after which unchanged attributes are published again.
+            path (str): File with the last published attributes, None to keep them in memory only.
+        """
+        self.url = url
+        self.token = token
+        self.entity_id = entity_id
+        self.refresh = refresh
+        self.path = path
+        self.client = None
+        self.state = None
+        self.published = {}
+        self.published_at = 0
+        self.load()
+
+    def load(self):
+        """
+        Loads the last published attributes from the state file.
+        """
+        if self.path is None:
+            return
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+            if saved.get("entity_id") == self.entity_id:
+                self.published = saved["attributes"]
+                self.published_at = saved["published_at"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def save(self):
+        """
+        Saves the last published attributes to the state file.
+        """
+        if self.path is None:
+            return
+        try:
+            with open(self.path, 'w') as f:
+                json.dump({"entity_id": self.entity_id, "published_at": self.published_at, "attributes": self.published}, f)
+        except OSError as e:
+            print("Home Assistant state not saved: " + str(e))
+
+    def changed(self, attributes):
+        """
+        Returns the attributes that differ from the last published attributes.
+
+        Args:
+            attributes (dict): The attributes to publish.
+
+        Returns:
+            dict: Name -> value of the changed attributes.
+        """
+        # Compare as JSON, the saved attributes went through a JSON round trip
+        attributes = json.loads(json.dumps(attributes))
+        return {name: value for name, value in attributes.items() if self.published.get(name) != value}
+
+    def publish(self, attributes):
+        """
+        Publishes the attributes if any of them changed.
+
+        Args:
+            attributes (dict): Name -> value of the attributes to publish.
+
+        Returns:
+            bool: True if the sensor was updated.
+        """
+        changed = self.changed(attributes)
+        if not changed and time.time() - self.published_at < self.refresh:
+            return False
+
+        if self.client is None:
+            from homeassistant_api import Client
+
+            self.client = Client(self.url, self.token)
+        if self.state is None:
+            self.state = self.client.get_entity(entity_id=self.entity_id).state
+
+        # The state API replaces all attributes, so attributes not published here are kept
+        self.state.attributes.update(attributes)
+        self.client.set_state(self.state)
+
+        self.published.update(json.loads(json.dumps(attributes)))
+        self.published_at = time.time()
+        self.save()
+        return True
@@ -0,0 +1,128 @@
+import contextlib
+import hashlib
+import json
+import sqlite3
+import time
+
+
+def fingerprint(*inputs):
+    """
+    Hashes the inputs of a plan, equal inputs give an equal plan.
+
+    Args:
+        *inputs: JSON serializable planning inputs.
+
+    Returns:
+        str: The SHA-256 of the inputs as hex.
+    """
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class RunJournal:
+    """
+    Append-only journal of the runs, one row per run with the fingerprint of the planning inputs, the plan,
+    the registers written and the registers of the inverter after the run.
+
+    Runs are indexed on time, so what was programmed at any moment is one index lookup.
+
+    Attributes:
+        path (str): The SQLite database file.
+    """
+
+    def __init__(self, path):
+        """
+        Initializes the journal and creates the table if needed.
+
+        Args:
+            path (str): The SQLite database file.
+        """
+        self.path = path
+        with self.connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, time REAL NOT NULL, fingerprint TEXT NOT NULL, "
+                "read INTEGER NOT NULL, confirmed INTEGER NOT NULL, memoized INTEGER NOT NULL, plan TEXT NOT NULL, "
+                "writes TEXT NOT NULL, registers TEXT NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS runs_time ON runs (time)")
+
+    @contextlib.contextmanager
+    def connect(self):
+        """
+        Opens a connection for one operation, so the journal can be used from any thread.
+        """
+        db = sqlite3.connect(self.path)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def record(self, inputs, plan, writes, registers, read, confirmed, memoized=False, moment=None):
+        """
+        Appends a run.
+
+        Args:
+            inputs (str): Fingerprint of the planning inputs.
+            plan (dict): The work mode, set points, loads and load points planned.
+            writes (list): The writes to the battery as (address, values).
+            registers (dict): Register address -> value of the inverter after the run.
+            read (bool): The registers were read from the inverter in this run, not taken from the journal.
+            confirmed (bool): The inverter holds the planned load table, the write of it was confirmed.
+            memoized (bool): The plan was taken from an earlier run with the same inputs.
+            moment (float): Unix timestamp of the run, None for now.
+        """
+        with self.connect() as db:
+            db.execute(
+                "INSERT INTO runs (time, fingerprint, read, confirmed, memoized, plan, writes, registers) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time() if moment is None else moment, inputs, int(read), int(confirmed), int(memoized), json.dumps(plan), json.dumps(writes), json.dumps(registers)),
+            )
+
+    def last(self, read=False):
+        """
+        Returns the last run.
+
+        Args:
+            read (bool): Only runs that read the registers from the inverter.
+
+        Returns:
+            dict: The run, None if there is none.
+        """
+        return self.query("SELECT * FROM runs" + (" WHERE read = 1" if read else "") + " ORDER BY id DESC LIMIT 1")
+
+    def at(self, moment):
+        """
+        Returns the run whose plan was in the battery at a moment, the last run at or before it.
+
+        Args:
+            moment (float): Unix timestamp.
+
+        Returns:
+            dict: The run, None if there is none before the moment.
+        """
+        return self.query("SELECT * FROM runs WHERE time <= ? ORDER BY time DESC LIMIT 1", (moment,))
+
+    def query(self, sql, parameters=()):
+        """
+        Runs a query for one run.
+
+        Args:
+            sql (str): The query.
+            parameters (tuple): The query parameters.
+
+        Returns:
+            dict: The run, None if the query has no result.
+        """
+        with self.connect() as db:
+            db.row_factory = sqlite3.Row
+            row = db.execute(sql, parameters).fetchone()
+        if row is None:
+            return None
+        run = dict(row)
+        run["read"] = bool(run["read"])
+        run["confirmed"] = bool(run["confirmed"])
+        run["memoized"] = bool(run["memoized"])
+        run["plan"] = json.loads(run["plan"])
+        run["writes"] = json.loads(run["writes"])
+        run["registers"] = {int(address): value for address, value in json.loads(run["registers"]).items()}
+        return run
@@ -0,0 +1,209 @@
+import contextlib
+import datetime
+import json
+import os
+import threading
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Returned by span() when the metrics are disabled
+NO_SPAN = contextlib.nullcontext()
+
+
+class Metrics:
+    """
+    Times the phases of a run and counts events, writes every run as one JSON line and keeps a
+    Prometheus textfile collector file with latency histograms and counters.
+
+    When disabled span() returns a shared empty context manager and count() returns right away, so the
+    instrumentation costs a function call per phase.
+
+    Attributes:
+        enabled (bool): Record spans and counters.
+        trace (str): JSON lines file with one line per run, None for no trace.
+        prometheus (str): Prometheus textfile collector file, None for no export.
+        started (float): Unix timestamp of the start of the current run.
+        spans (list): (name, start, seconds) of every span of the current run.
+        counters (dict): Event -> count of the current run.
+        histograms (dict): Phase -> [bucket counts, sum, count] of all runs.
+        totals (dict): Event -> count of all runs.
+    """
+
+    def __init__(self, enabled=False, trace=None, prometheus=None):
+        """
+        Initializes the metrics, the totals of earlier runs are loaded from the state next to the
+        Prometheus file.
+
+        Args:
+            enabled (bool): Record spans and counters.
+            trace (str): JSON lines file with one line per run, None for no trace.
+            prometheus (str): Prometheus textfile collector file, None for no export.
+        """
+        self.enabled = enabled
+        self.trace = trace
+        self.prometheus = prometheus
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.origin = time.monotonic()
+        self.spans = []
+        self.counters = {}
+        self.histograms = {}
+        self.totals = {}
+        if enabled:
+            self.load()
+
+    def load(self):
+        """
+        Loads the histograms and counters of earlier runs, Prometheus counters never go down.
+        """
+        if self.prometheus is None:
+            return
+        try:
+            with open(self.prometheus + ".json") as f:
+                state = json.load(f)
+            self.histograms = state["histograms"]
+            self.totals = state["totals"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def begin(self):
+        """
+        Starts a new run.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            self.started = time.time()
+            self.origin = time.monotonic()
+            self.spans = []
+            self.counters = {}
+
+    def span(self, name):
+        """
+        Times a phase of the run.
+
+        Args:
+            name (str): The phase.
+
+        Returns:
+            A context manager around the phase.
+        """
+        if not self.enabled:
+            return NO_SPAN
+        return self.timed(name)
+
+    @contextlib.contextmanager
+    def timed(self, name):
+        """
+        Records the duration of the block as a span.
+
+        Args:
+            name (str): The phase.
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, start, time.monotonic() - start)
+
+    def observe(self, name, start, seconds):
+        """
+        Records the duration of a phase.
+
+        Args:
+            name (str): The phase.
+            start (float): Monotonic start time of the phase.
+            seconds (float): Duration of the phase.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            self.spans.append((name, start - self.origin, seconds))
+            histogram = self.histograms.setdefault(name, [[0] * len(BUCKETS), 0.0, 0])
+            for x, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram[0][x] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def count(self, name, value=1):
+        """
+        Counts an event, also from other threads.
+
+        Args:
+            name (str): The event.
+            value (int): The amount.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            self.totals[name] = self.totals.get(name, 0) + value
+
+    def end(self, **fields):
+        """
+        Ends the run, appends its trace and writes the Prometheus file.
+
+        Args:
+            fields: Extra values of the run for the trace.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            record = {
+                "start": datetime.datetime.fromtimestamp(self.started).isoformat(),
+                "seconds": round(time.monotonic() - self.origin, 6),
+                "spans": [{"name": name, "start": round(start, 6), "seconds": round(seconds, 6)} for name, start, seconds in self.spans],
+                "counters": dict(self.counters),
+            }
+            record.update(fields)
+            try:
+                if self.trace is not None:
+                    with open(self.trace, 'a') as f:
+                        f.write(json.dumps(record, default=str) + '\n')
+                if self.prometheus is not None:
+                    self.write(self.prometheus, self.exposition())
+                    self.write(self.prometheus + ".json", json.dumps({"histograms": self.histograms, "totals": self.totals}))
+            except OSError as e:
+                print("Metrics not written: " + str(e))
+
+    def exposition(self):
+        """
+        Formats the histograms and counters of all runs in the Prometheus text format.
+
+        Returns:
+            str: The Prometheus text.
+        """
+        lines = [
+            "# HELP kiwatt_phase_seconds Duration of the phases of a run.",
+            "# TYPE kiwatt_phase_seconds histogram",
+        ]
+        for name in sorted(self.histograms):
+            buckets, total, count = self.histograms[name]
+            for bound, value in zip(BUCKETS, buckets):
+                lines.append('kiwatt_phase_seconds_bucket{phase="%s",le="%s"} %d' % (name, bound, value))
+            lines.append('kiwatt_phase_seconds_bucket{phase="%s",le="+Inf"} %d' % (name, count))
+            lines.append('kiwatt_phase_seconds_sum{phase="%s"} %f' % (name, total))
+            lines.append('kiwatt_phase_seconds_count{phase="%s"} %d' % (name, count))
+        lines.append("# HELP kiwatt_events_total Events of all runs: retries, cache hits, bytes transferred.")
+        lines.append("# TYPE kiwatt_events_total counter")
+        for name in sorted(self.totals):
+            lines.append('kiwatt_events_total{event="%s"} %d' % (name, self.totals[name]))
+        lines.append("# HELP kiwatt_last_run_timestamp_seconds Start of the last run.")
+        lines.append("# TYPE kiwatt_last_run_timestamp_seconds gauge")
+        lines.append("kiwatt_last_run_timestamp_seconds %f" % self.started)
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path, text):
+        """
+        Replaces a file at once, so the collector never reads half a file.
+
+        Args:
+            path (str): The file.
+            text (str): The content.
+        """
+        with open(path + ".tmp", 'w') as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)
@@ -0,0 +1,176 @@
+import random
+import time
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised without contacting the logger while the circuit breaker is open.
+    """
+
+
+class ModbusSession:
+    """
+    A PySolarmanV5 connection that reconnects by itself, retries failed requests and stops trying when
+    the stick logger stays unreachable.
+
+    Reads and writes of fixed values are idempotent, so a failed request is sent again on a new socket,
+    after a jittered backoff, until it succeeds, the retries are used up or the next attempt would
+    start after the deadline. After failures failed requests in a row the circuit breaker opens: every
+    request raises CircuitOpenError right away until cooldown seconds have passed, then one request
+    may try again. A closed session never connects again, a request still running on it fails at once.
+
+    Attributes:
+        ip (str): IP address of the stick logger.
+        sn (int): Serial number of the stick logger.
+        port (int): TCP port of the stick logger.
+        timeout (float): Socket timeout in seconds.
+        retries (int): Number of retries of a failed request.
+        backoff (float): Seconds before the first retry, doubled on every retry.
+        deadline (float): Max seconds of one request with its retries.
+        failures (int): Number of failed requests in a row that opens the circuit breaker.
+        cooldown (float): Seconds the circuit breaker stays open.
+        count (callable): Called with the name of an event (modbus_retries, modbus_circuit_open), None
+            to not count.
+        client (PySolarmanV5): The connection, None when not connected.
+        failed (int): Number of failed requests in a row.
+        open_until (float): Unix timestamp until which the circuit breaker is open.
+        closed (bool): The session was closed by close().
+    """
+
+    def __init__(self, ip, sn, port=8899, timeout=20, retries=3, backoff=0.5, deadline=60, failures=3, cooldown=300, count=None):
+        """
+        Initializes the session, the logger is connected on the first request.
+
+        Args:
+            ip (str): IP address of the stick logger.
+            sn (int): Serial number of the stick logger.
+            port (int): TCP port of the stick logger.
+            timeout (float): Socket timeout in seconds.
+            retries (int): Number of retries of a failed request.
+            backoff (float): Seconds before the first retry, doubled on every retry.
+            deadline (float): Max seconds of one request with its retries.
+            failures (int): Number of failed requests in a row that opens the circuit breaker.
+            cooldown (float): Seconds the circuit breaker stays open.
+            count (callable): Called with the name of an event, None to not count.
+        """
+        self.ip = ip
+        self.sn = sn
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.deadline = deadline
+        self.failures = failures
+        self.cooldown = cooldown
+        self.count = count
+        self.client = None
+        self.failed = 0
+        self.open_until = 0
+        self.closed = False
+
+    def event(self, name):
+        """
+        Counts an event.
+
+        Args:
+            name (str): The event.
+        """
+        if self.count is not None:
+            self.count("modbus_" + name)
+
+    def connect(self):
+        """
+        Opens the socket to the logger if it is not open.
+
+        Returns:
+            PySolarmanV5: The connection.
+        """
+        if self.closed:
+            raise ConnectionError("Session closed")
+        if self.client is None:
+            from pysolarmanv5 import PySolarmanV5
+
+            self.client = PySolarmanV5(self.ip, self.sn, port=self.port, mb_slave_id=1, verbose=0, socket_timeout=self.timeout)
+        return self.client
+
+    def disconnect(self):
+        """
+        Closes the socket, the next request connects again. The circuit breaker keeps its state.
+        """
+        client, self.client = self.client, None
+        if client is not None:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+
+    def close(self):
+        """
+        Closes the session for good, from any thread. A request running on it fails instead of retrying.
+        """
+        self.closed = True
+        self.disconnect()
+
+    def call(self, name, **kwargs):
+        """
+        Sends a request, retried on a new socket until it succeeds or the retries or deadline are used up.
+
+        Args:
+            name (str): The PySolarmanV5 method.
+            **kwargs: The arguments of the method.
+
+        Returns:
+            The result of the method.
+        """
+        now = time.time()
+        if now < self.open_until:
+            raise CircuitOpenError("Logger unreachable, retry after " + time.strftime("%H:%M:%S", time.localtime(self.open_until)))
+
+        end = now + self.deadline
+        for attempt in range(self.retries + 1):
+            try:
+                result = getattr(self.connect(), name)(**kwargs)
+                self.failed = 0
+                return result
+            except Exception as e:
+                # A frame may be lost halfway, never read the rest of it as the next answer
+                self.disconnect()
+                if self.closed:
+                    raise
+                delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+                if attempt < self.retries and time.time() + delay < end:
+                    print("Modbus " + name + " failed (" + (str(e) or type(e).__name__) + "), retrying")
+                    self.event("retries")
+                    time.sleep(delay)
+                    continue
+                self.failed += 1
+                if self.failed >= self.failures:
+                    self.open_until = time.time() + self.cooldown
+                    self.event("circuit_open")
+                raise
+
+    def read_holding_registers(self, register_addr, quantity):
+        """
+        Reads holding registers.
+
+        Args:
+            register_addr (int): The first register.
+            quantity (int): Number of registers.
+
+        Returns:
+            list: The values.
+        """
+        return self.call("read_holding_registers", register_addr=register_addr, quantity=quantity)
+
+    def write_multiple_holding_registers(self, register_addr, values):
+        """
+        Writes holding registers.
+
+        Args:
+            register_addr (int): The first register.
+            values (list): The values.
+
+        Returns:
+            The answer of the logger.
+        """
+        return self.call("write_multiple_holding_registers", register_addr=register_addr, values=values)
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import random
+import threading
+import time
+
+
+class Notifier:
+    """
+    Sends Telegram messages from a background thread, so a slow or unreachable Telegram API never delays
+    the battery.
+
+    Messages queued while a message is being sent are merged into the next message. A message equal to
+    one sent within the dedupe period, or to one still pending, is dropped, also across runs when a state
+    file is given. A message only counts as sent once Telegram accepted it.
+
+    Attributes:
+        url (str): The sendMessage URL of the bot.
+        chat_id (str): The chat to send to.
+        retries (int): Number of retries of a failed message.
+        backoff (float): Seconds before the first retry, doubled on every retry.
+        timeout (float): Seconds before a request times out.
+        dedupe (float): Seconds a sent message is not sent again.
+        path (str): File with the messages sent in the dedupe period, None to dedupe in memory only.
+        session (Session): Pooled HTTP connection to the Telegram API, opened on the first message.
+        pending (list): Messages not sent yet as (digest, text).
+        sent (dict): Digest -> Unix timestamp of the messages sent in the dedupe period.
+        thread (Thread): The sending thread, None when idle.
+    """
+
+    def __init__(self, bot_id, chat_id, retries=3, backoff=2.0, timeout=10, dedupe=3600, path=None):
+        """
+        Initializes the notifier.
+
+        Args:
+            bot_id (str): The bot token.
+            chat_id (str): The chat to send to.
+            retries (int): Number of retries of a failed message.
+            backoff (float): Seconds before the first retry, doubled on every retry.
+            timeout (float): Seconds before a request times out.
+            dedupe (float): Seconds a sent message is not sent again.
+            path (str): File with the messages sent in the dedupe period, None to dedupe in memory only.
+        """
+        self.url = f'https://api.telegram.org/bot{bot_id}/sendMessage'
+        self.chat_id = chat_id
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.dedupe = dedupe
+        self.path = path
+        self.session = None
+        self.pending = []
+        self.sent = self.load()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        """
+        Loads the messages sent in the dedupe period from the state file.
+
+        Returns:
+            dict: Digest -> Unix timestamp.
+        """
+        if self.path is None:
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        """
+        Saves the messages sent in the dedupe period to the state file.
+        """
+        if self.path is None:
+            return
+        try:
+            with open(self.path, 'w') as f:
+                json.dump(self.sent, f)
+        except OSError as e:
+            print("Notification state not saved: " + str(e))
+
+    def send(self, messages):
+        """
+        Queues the messages of a run as one message and starts sending it in the background.
+
+        Args:
+            messages (list): The messages, repeated lines are sent once.
+
+        Returns:
+            bool: True if the message was queued, False if it was empty, pending or sent in the dedupe
+            period.
+        """
+        text = '\n'.join(dict.fromkeys(str(x) for x in messages))
+        if not text:
+            return False
+
+        digest = hashlib.sha1(text.encode()).hexdigest()
+        now = time.time()
+        with self.lock:
+            self.sent = {key: sent for key, sent in self.sent.items() if now - sent < self.dedupe}
+            if digest in self.sent or any(digest == key for key, pending in self.pending):
+                return False
+
+            self.pending.append((digest, text))
+            if self.thread is None:
+                # Not a daemon thread, a single run waits for its message before the process exits
+                self.thread = threading.Thread(target=self.worker, name="notifier")
+                self.thread.start()
+        return True
+
+    def worker(self):
+        """
+        Sends the pending messages until none are left.
+        """
+        while True:
+            with self.lock:
+                if not self.pending:
+                    self.thread = None
+                    return
+                pending, self.pending = self.pending, []
+            if self.post('\n\n'.join(text for digest, text in pending)):
+                with self.lock:
+                    now = time.time()
+                    self.sent.update((digest, now) for digest, text in pending)
+                    self.save()
+
+    def post(self, text):
+        """
+        Sends one message, retried with exponential backoff and jitter.
+
+        Args:
+            text (str): The message.
+
+        Returns:
+            bool: True if Telegram accepted the message.
+        """
+        import requests
+
+        if self.session is None:
+            self.session = requests.Session()
+        for attempt in range(self.retries + 1):
+            delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            try:
+                response = self.session.post(self.url, data={"chat_id": self.chat_id, "text": text}, timeout=self.timeout)
+                if response.status_code < 400:
+                    return True
+                if response.status_code == 429:
+                    # Telegram tells how long to wait
+                    delay = max(delay, response.json().get("parameters", {}).get("retry_after", 0))
+                elif response.status_code < 500:
+                    print("Notification rejected: " + str(response.status_code))
+                    return False
+            except (requests.RequestException, OSError, ValueError) as e:
+                print("Notification failed: " + str(e))
+            if attempt < self.retries:
+                time.sleep(delay)
+        return False
+
+    def wait(self, timeout=None):
+        """
+        Waits until the pending messages are sent.
+
+        Args:
+            timeout (float): Max seconds to wait, None to wait until sent.
+        """
+        thread = self.thread
+        if thread is not None:
+            thread.join(timeout)
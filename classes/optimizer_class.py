@@ -0,0 +1,270 @@
+import math
+
+# Number of time slots in the load table of the inverter (registers 148-153, 166-171, 172-177)
+TABLE_SLOTS = 6
+
+
+class Optimizer:
+    """
+    Finds the cheapest grid charge schedule over the whole price horizon with dynamic programming over
+    the battery percentage.
+
+    Every slot the battery is either off (it supplies the house down to min_percload, below that the
+    house runs on the grid) or on (grid charge up to a target percentage at max maxload per hour, the
+    house runs on the grid). The load table of the inverter has six time slots: a charge window takes one
+    entry to start it and one to end it, every other target in a window one more, so every schedule the
+    dynamic programming finds converts exactly into the load table of the next 24 hours. Energy left in
+    the battery at the end of the horizon is valued at the average price of the horizon.
+
+    Attributes:
+        capacity (float): Capacity of the battery in kWh.
+        min_perc (int): Lowest battery percentage.
+        max_perc (int): Highest battery percentage to charge to from the grid.
+        maxload (float): Max load of the battery per hour in kWh.
+        slot_minutes (int): Minutes per slot.
+        step (int): Percentage per battery level of the dynamic programming.
+        slots (int): Number of entries in the load table.
+    """
+
+    def __init__(self, capacity, min_perc, max_perc, maxload, slot_minutes=60, step=1, slots=TABLE_SLOTS):
+        """
+        Initializes the optimizer.
+
+        Args:
+            capacity (float): Capacity of the battery in kWh.
+            min_perc (int): Lowest battery percentage.
+            max_perc (int): Highest battery percentage to charge to from the grid.
+            maxload (float): Max load of the battery per hour in kWh.
+            slot_minutes (int): Minutes per slot.
+            step (int): Percentage per battery level of the dynamic programming.
+            slots (int): Number of entries in the load table.
+        """
+        self.capacity = capacity
+        self.min_perc = min_perc
+        self.max_perc = max_perc
+        self.maxload = maxload
+        self.slot_minutes = slot_minutes
+        self.step = step
+        self.slots = slots
+
+    def optimize(self, prices, drain, pv, perc):
+        """
+        Finds the cheapest schedule.
+
+        Args:
+            prices (list): Price (EUR/kWh) per slot.
+            drain (list): Consumption (kWh) per slot.
+            pv (list): Production (kWh) per slot.
+            perc (int): Current battery percentage.
+
+        Returns:
+            list: Per slot None (off) or the target percentage (on).
+        """
+        n = len(prices)
+        step_kwh = self.capacity * self.step / 100
+        levels = 100 // self.step + 1
+        low = math.ceil(self.min_perc / self.step)
+        high = max(low, self.max_perc // self.step)
+        rate = max(0, int(self.maxload * self.slot_minutes / 60 / step_kwh))
+        table_end = 1440 // self.slot_minutes
+        value = self.end_value(prices)
+
+        # State: (level, table entries used, target of the previous slot, None when off) -> cost
+        start = min(levels - 1, int(round(perc / self.step)))
+        costs = {(start, 0, None): 0.0}
+        history = []
+
+        for t in range(n):
+            price = prices[t]
+            load = drain[t] if t < len(drain) else 0
+            sun = pv[t] if t < len(pv) else 0
+            counted = t < table_end
+            new_costs = {}
+            back = {}
+
+            def add(key, total, state, action):
+                # After the table the entries and the previous target no longer matter
+                if t + 1 >= table_end:
+                    key = (key[0], 0, None)
+                if total < new_costs.get(key, math.inf):
+                    new_costs[key] = total
+                    back[key] = (state, action)
+
+            # Off and a new target cost the same from every previous target, only the cheapest state of
+            # a level, entries used and on or off takes them
+            cheapest = {}
+            for state, cost in costs.items():
+                level, used, previous = state
+                group = (level, used, previous is not None)
+                if cost < cheapest.get(group, (math.inf,))[0]:
+                    cheapest[group] = (cost, state)
+
+                # On with the target of the previous slot is free. The battery charges toward it at max
+                # rate, when the sun lifted the battery above it nothing is charged
+                if previous is not None and counted:
+                    reached = min(max(previous, level), level + rate)
+                    next_level = min(levels - 1, int(round((reached * step_kwh + sun) / step_kwh)))
+                    add((next_level, used, previous), cost + price * ((reached - level) * step_kwh + load), state, previous * self.step)
+
+            for (level, used, charging), (cost, state) in cheapest.items():
+                # Off: the battery supplies the house down to min_percload
+                energy = level * step_kwh + sun - load
+                floor = min(low, level) * step_kwh
+                deficit = max(0.0, floor - energy)
+                next_level = min(levels - 1, int(round(max(energy, floor) / step_kwh)))
+                add((next_level, used, None), cost + price * deficit, state, None)
+
+                # On: grid charge to a new target, the house runs on the grid
+                new_used = used + ((1 if charging else 2) if counted else 0)
+                if new_used > self.slots:
+                    continue
+                for target in range(level, max(level, min(high, level + rate)) + 1):
+                    next_level = min(levels - 1, int(round((target * step_kwh + sun) / step_kwh)))
+                    add((next_level, new_used, target), cost + price * ((target - level) * step_kwh + load), state, target * self.step)
+
+            costs = new_costs
+            history.append(back)
+
+        # Value the energy left at the end of the horizon
+        best = min(costs, key=lambda key: costs[key] - value * max(0, key[0] - low) * step_kwh)
+
+        schedule = []
+        key = best
+        for back in reversed(history):
+            key, action = back[key]
+            schedule.append(action)
+        schedule.reverse()
+        return schedule
+
+    def end_value(self, prices):
+        """
+        Returns the value of the energy left in the battery at the end of the horizon.
+
+        Args:
+            prices (list): Price (EUR/kWh) per slot.
+
+        Returns:
+            float: EUR/kWh.
+        """
+        return sum(prices) / len(prices) if prices else 0
+
+    def simulate(self, schedule, prices, drain, pv, perc, value_end=True):
+        """
+        Calculates the cost of a schedule.
+
+        Args:
+            schedule (list): Per slot None (off) or the target percentage (on).
+            prices (list): Price (EUR/kWh) per slot.
+            drain (list): Consumption (kWh) per slot.
+            pv (list): Production (kWh) per slot.
+            perc (float): Current battery percentage.
+            value_end (bool): Subtract the value of the energy left at the end of the horizon.
+
+        Returns:
+            tuple: Cost (EUR), the battery percentage per slot and the kWh bought from the grid.
+        """
+        energy = self.capacity * perc / 100
+        rate = self.maxload * self.slot_minutes / 60
+        full = self.capacity
+        floor = self.capacity * self.min_perc / 100
+        cost = 0.0
+        bought = 0.0
+        trajectory = []
+
+        for t, target in enumerate(schedule):
+            load = drain[t] if t < len(drain) else 0
+            sun = pv[t] if t < len(pv) else 0
+            if target is None:
+                low = min(floor, energy)
+                after = energy + sun - load
+                grid = max(0.0, low - after)
+                energy = min(full, max(after, low))
+            else:
+                charge = min(rate, max(0.0, self.capacity * target / 100 - energy))
+                grid = charge + load
+                energy = min(full, energy + charge + sun)
+            cost += prices[t] * grid
+            bought += grid
+            trajectory.append(energy / self.capacity * 100)
+
+        if value_end:
+            cost -= self.end_value(prices) * max(0.0, energy - floor)
+        return cost, trajectory, bought
+
+    def to_table(self, schedule, start_minute):
+        """
+        Converts a schedule into the load table of the inverter, only the charge windows in the first 24
+        hours are kept. Every start of a window and every change of target is an on entry, every end of a
+        window an off entry. The table is filled up to six entries with copies of the entry that is active
+        at that time anyway.
+
+        Args:
+            schedule (list): Per slot None (off) or the target percentage (on).
+            start_minute (int): Minute of the day slot 0 starts.
+
+        Returns:
+            tuple: Set points (hour*100 + minute), loads (percentage) and load points (0=off, 1=on).
+        """
+        per_day = 1440 // self.slot_minutes
+        n = min(len(schedule), per_day)
+        entries = {}
+        for t in range(n + 1):
+            target = schedule[t] if t < n else None
+            previous = schedule[t - 1] if t > 0 else None
+            if target is not None and target != previous:
+                entries[self.clock(start_minute, t)] = (target, 1)
+            elif target is None and previous is not None:
+                entries.setdefault(self.clock(start_minute, t), (self.min_perc, 0))
+        if not entries:
+            entries[self.clock(start_minute, 0)] = (self.min_perc, 0)
+
+        # The entry before the first time of the day is active until it, the table wraps around
+        for t in range(per_day):
+            if len(entries) >= TABLE_SLOTS:
+                break
+            time = self.clock(start_minute, t)
+            if time not in entries:
+                earlier = [x for x in entries if x < time]
+                entries[time] = entries[max(earlier) if earlier else max(entries)]
+
+        set_points = sorted(entries)[:TABLE_SLOTS]
+        return set_points, [entries[x][0] for x in set_points], [entries[x][1] for x in set_points]
+
+    def from_table(self, set_points, loads, load_points, start_minute, n):
+        """
+        Converts a load table into a schedule.
+
+        Args:
+            set_points (list): Set points (hour*100 + minute).
+            loads (list): Loads (percentage).
+            load_points (list): Load points (0=off, 1=on).
+            start_minute (int): Minute of the day slot 0 starts.
+            n (int): Number of slots.
+
+        Returns:
+            list: Per slot None (off) or the target percentage (on).
+        """
+        entries = sorted((x // 100 * 60 + x % 100, load, on) for x, load, on in zip(set_points, loads, load_points))
+        schedule = []
+        for t in range(n):
+            minute = (start_minute + t * self.slot_minutes) % 1440
+            active = entries[-1]
+            for entry in entries:
+                if entry[0] <= minute:
+                    active = entry
+            schedule.append(active[1] if active[2] else None)
+        return schedule
+
+    def clock(self, start_minute, t):
+        """
+        Returns the set point of a slot.
+
+        Args:
+            start_minute (int): Minute of the day slot 0 starts.
+            t (int): The slot.
+
+        Returns:
+            int: Hour*100 + minute.
+        """
+        minute = (start_minute + t * self.slot_minutes) % 1440
+        return minute // 60 * 100 + minute % 60
@@ -0,0 +1,374 @@
+import array
+import concurrent.futures
+import datetime
+import math
+import time
+from classes.entsoe_class import PriceCurve, parse_a44
+
+# ENTSO-e bidding zone (EIC code) of a country, or of a part of a country with more than one zone
+BIDDING_ZONES = {
+    "AT": "10YAT-APG------L",
+    "BE": "10YBE----------2",
+    "CH": "10YCH-SWISSGRIDZ",
+    "DE": "10Y1001A1001A82H",
+    "DK1": "10YDK-1--------W",
+    "DK2": "10YDK-2--------M",
+    "ES": "10YES-REE------0",
+    "FI": "10YFI-1--------U",
+    "FR": "10YFR-RTE------C",
+    "NL": "10YNL----------L",
+    "NO1": "10YNO-1--------2",
+    "PL": "10YPL-AREA-----S",
+    "PT": "10YPT-REN------W",
+    "SE3": "10Y1001A1001A46L",
+    "SE4": "10Y1001A1001A47J",
+}
+
+# Harmonised min and max clearing price of the day ahead market (EUR/MWh)
+MIN_PRICE = -500
+MAX_PRICE = 4000
+
+
+def bidding_zone(country):
+    """
+    Returns the ENTSO-e bidding zone of a country.
+
+    Args:
+        country (str): Country code (NL, BE, DK1, ...) or an EIC code.
+
+    Returns:
+        str: The EIC code of the bidding zone.
+    """
+    country = (country or "NL").upper()
+    if country in BIDDING_ZONES:
+        return BIDDING_ZONES[country]
+    if country.startswith("10Y"):
+        return country
+    raise ValueError("Unknown bidding zone: " + country)
+
+
+class PriceProvider:
+    """
+    A source of day ahead prices.
+
+    Attributes:
+        name (str): Name of the provider in logs and metrics.
+    """
+
+    name = "provider"
+
+    def fetch(self, start, end, timeout):
+        """
+        Gets the prices of a period.
+
+        Args:
+            start (datetime): Start of the period (UTC).
+            end (datetime): End of the period (UTC).
+            timeout (float): The request timeout in seconds.
+
+        Returns:
+            PriceCurve: The prices, None if the provider has no prices (yet).
+        """
+        raise NotImplementedError
+
+
+class EntsoeProvider(PriceProvider):
+    """
+    Downloads the A44 document of a bidding zone from the ENTSO-e transparency platform.
+
+    Attributes:
+        key (str): The security token.
+        domain (str): The bidding zone.
+        path (str): File the last document with prices is saved to, None to not save it.
+        metrics (Metrics): Times the download and the parse.
+    """
+
+    name = "entsoe"
+
+    def __init__(self, key, domain, metrics, path="entsoe.xml"):
+        """
+        Initializes the provider.
+
+        Args:
+            key (str): The security token.
+            domain (str): The bidding zone.
+            metrics (Metrics): Times the download and the parse.
+            path (str): File the last document with prices is saved to, None to not save it.
+        """
+        self.key = key
+        self.domain = domain
+        self.path = path
+        self.metrics = metrics
+
+    def fetch(self, start, end, timeout):
+        import requests
+
+        url = (
+            "https://web-api.tp.entsoe.eu/api?documentType=A44&in_Domain=" + self.domain + "&out_Domain=" + self.domain
+            + "&securityToken=" + self.key + "&periodStart=" + start.strftime("%Y%m%d%H%M") + "&periodEnd=" + end.strftime("%Y%m%d%H%M")
+        )
+        with self.metrics.span("entsoe_download"):
+            xml = requests.get(url, timeout=timeout)
+        self.metrics.count("entsoe_bytes", len(xml.content))
+        with self.metrics.span("entsoe_parse"):
+            curve = parse_a44(xml.content)
+
+        if curve is not None and self.path is not None:
+            # Save prices to file
+            try:
+                with open(self.path, 'wb') as file:
+                    file.write(xml.content)
+            except (IOError, OSError):
+                print("Error writing to file")
+
+        return curve
+
+
+class FileProvider(PriceProvider):
+    """
+    Reads the last saved ENTSO-e document.
+
+    Attributes:
+        path (str): The XML document.
+    """
+
+    name = "file"
+
+    def __init__(self, path="entsoe.xml"):
+        """
+        Initializes the provider.
+
+        Args:
+            path (str): The XML document.
+        """
+        self.path = path
+
+    def fetch(self, start, end, timeout):
+        with open(self.path, 'rb') as f:
+            return parse_a44(f.read())
+
+
+class FeedProvider(PriceProvider):
+    """
+    Downloads prices from a JSON feed, like the EnergyZero API.
+
+    The url gets the period as {start} and {end} (ISO, UTC). The response holds a list of items, every
+    item has a start time and a price, the price times scale is the price in EUR/MWh.
+
+    Attributes:
+        name (str): Name of the feed.
+        url (str): The url template.
+        items (str): Key of the list of items in the response, None if the response is the list.
+        time (str): Key of the start time of an item.
+        price (str): Key of the price of an item.
+        scale (float): Factor from the price of the feed to EUR/MWh.
+        resolution (int): Minutes per item.
+    """
+
+    def __init__(self, name, url, items=None, time="time", price="price", scale=1, resolution=60):
+        """
+        Initializes the provider.
+
+        Args:
+            name (str): Name of the feed.
+            url (str): The url template.
+            items (str): Key of the list of items in the response, None if the response is the list.
+            time (str): Key of the start time of an item.
+            price (str): Key of the price of an item.
+            scale (float): Factor from the price of the feed to EUR/MWh.
+            resolution (int): Minutes per item.
+        """
+        self.name = name
+        self.url = url
+        self.items = items
+        self.time = time
+        self.price = price
+        self.scale = scale
+        self.resolution = resolution
+
+    def fetch(self, start, end, timeout):
+        import requests
+
+        iso = "%Y-%m-%dT%H:%M:%S.000Z"
+        response = requests.get(self.url.format(start=start.strftime(iso), end=end.strftime(iso)), timeout=timeout)
+        response.raise_for_status()
+        return self.parse(response.json(), start)
+
+    def parse(self, data, start):
+        """
+        Converts the items of a response into a price curve from start, a missing item repeats the price
+        before it.
+
+        Args:
+            data (dict): The response.
+            start (datetime): Start of the period (UTC).
+
+        Returns:
+            PriceCurve: The prices, None if the response has no items.
+        """
+        items = data if self.items is None else data.get(self.items) or []
+        prices = {}
+        for item in items:
+            moment = datetime.datetime.fromisoformat(str(item[self.time]).replace("Z", "+00:00"))
+            slot = math.floor((moment - start).total_seconds() / 60 / self.resolution)
+            if slot >= 0:
+                prices[slot] = float(item[self.price]) * self.scale
+        if 0 not in prices:
+            return None
+
+        curve = array.array("d")
+        for slot in range(max(prices) + 1):
+            curve.append(prices.get(slot, curve[-1] if curve else 0))
+        return PriceCurve(start, self.resolution, curve)
+
+
+def valid(curve, start, end, needed=None):
+    """
+    Checks if a curve covers a period, or at least its first part, with prices the market can clear at.
+
+    Args:
+        curve (PriceCurve): The prices.
+        start (datetime): Start of the period (UTC).
+        end (datetime): End of the period (UTC).
+        needed (datetime): End of the part the curve must cover (UTC), None for the whole period.
+
+    Returns:
+        bool: True if the curve is complete and valid.
+    """
+    needed = end if needed is None else needed
+    if curve is None or curve.slot(start) < 0 or curve.slot(needed) > len(curve):
+        return False
+    return all(MIN_PRICE <= x <= MAX_PRICE for x in curve.prices[curve.slot(start):min(len(curve), curve.slot(end))])
+
+
+def difference(curve, other, start, end):
+    """
+    Returns the mean absolute difference of the hourly prices of two curves over a period.
+
+    Args:
+        curve (PriceCurve): The prices.
+        other (PriceCurve): The prices to compare with.
+        start (datetime): Start of the period (UTC).
+        end (datetime): End of the period (UTC).
+
+    Returns:
+        float: EUR/MWh, None if the curves have no hour in common.
+    """
+    hours = int((end - start).total_seconds() // 3600)
+    pairs = list(zip(curve.hourly(start, hours), other.hourly(start, hours)))
+    if not pairs:
+        return None
+    return sum(abs(a - b) for a, b in pairs) / len(pairs)
+
+
+def race(providers, start, end, timeout, hedge=3, tolerance=25, count=None, needed=None):
+    """
+    Gets the prices of a period from the first provider that returns a complete and valid curve. With
+    needed a curve only has to cover the period up to needed, so the prices of today win when the
+    prices of tomorrow are not published yet.
+
+    The first provider is asked right away. The next provider is asked when no valid curve arrived
+    within hedge seconds, or right away when a provider failed, so a hanging request never delays the
+    run for more than hedge seconds per provider. A provider still running when the race is won is
+    left to finish in the background. Every other valid curve is compared with the winning curve, also
+    when it comes in after the race: that check runs on the thread of the provider, after race()
+    returned, so count must be thread safe. A late disagreement is only counted in daemon mode, in the
+    run that is going when it comes in; a single run has written its metrics by then and only logs it.
+
+    Args:
+        providers (list): PriceProvider in order of preference.
+        start (datetime): Start of the period (UTC).
+        end (datetime): End of the period (UTC).
+        timeout (float): Max seconds of the race, also the request timeout.
+        hedge (float): Seconds to wait for a provider before the next one is asked.
+        tolerance (float): Mean absolute difference (EUR/MWh) above which curves disagree.
+        count (callable): Called with the name of an event and a value from any thread, None to not
+            count.
+        needed (datetime): End of the part of the period a curve must cover (UTC), None for the whole
+            period.
+
+    Returns:
+        tuple: The winning curve and provider name, (None, None) if no provider had a valid curve.
+    """
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(providers)))
+    deadline = time.monotonic() + timeout
+    pending = {}
+    curves = {}
+    waiting = list(providers)
+    winner = None
+    next_hedge = 0
+
+    try:
+        while winner is None and (waiting or pending):
+            if waiting and (not pending or time.monotonic() >= next_hedge):
+                provider = waiting.pop(0)
+                pending[executor.submit(provider.fetch, start, end, timeout)] = provider.name
+                next_hedge = time.monotonic() + hedge
+                if count is not None and len(pending) > 1:
+                    count("price_hedges", 1)
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            wait = min(remaining, max(0, next_hedge - time.monotonic())) if waiting else remaining
+            done, not_done = concurrent.futures.wait(pending, timeout=wait, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                curve = result(name, future, start, end, needed)
+                if curve is not None:
+                    curves[name] = curve
+                    if winner is None:
+                        winner = name
+    finally:
+        # Never wait for a provider that is still running
+        executor.shutdown(wait=False)
+
+    if winner is None:
+        return None, None
+
+    def check(name, curve):
+        mean = difference(curves[winner], curve, start, end)
+        if mean is not None and mean > tolerance:
+            print("Prices of " + winner + " and " + name + " differ by " + "{:.1f}".format(mean) + " EUR/MWh on average")
+            if count is not None:
+                count("price_disagreements", 1)
+
+    for name, curve in curves.items():
+        if name != winner:
+            check(name, curve)
+
+    def late(future, name):
+        curve = result(name, future, start, end, needed)
+        if curve is not None:
+            check(name, curve)
+
+    for future, name in pending.items():
+        future.add_done_callback(lambda future, name=name: late(future, name))
+    if count is not None:
+        count("price_winner_" + winner, 1)
+    return curves[winner], winner
+
+
+def result(name, future, start, end, needed=None):
+    """
+    Returns the curve of a finished provider if it is complete and valid.
+
+    Args:
+        name (str): The provider.
+        future (Future): The finished fetch.
+        start (datetime): Start of the period (UTC).
+        end (datetime): End of the period (UTC).
+        needed (datetime): End of the part the curve must cover (UTC), None for the whole period.
+
+    Returns:
+        PriceCurve: The prices, None if the provider failed or the curve is not valid.
+    """
+    try:
+        curve = future.result()
+    except Exception as e:
+        print("Prices from " + name + " failed: " + (str(e) or type(e).__name__))
+        return None
+    if not valid(curve, start, end, needed):
+        print("Prices from " + name + " incomplete or invalid")
+        return None
+    return curve
@@ -0,0 +1,195 @@
+import array
+import collections
+import itertools
+
+
+class PriceSeries:
+    """
+    Prices per slot with a sorted rank, built once per run so the planner never scans the prices again.
+
+    Ties are ranked by slot, the earliest slot first.
+
+    Attributes:
+        prices (array): Price per slot.
+        order (array): Slots from cheapest to dearest.
+        rank (array): Position of every slot in order.
+        prefix (array): Sum of the prices before every slot, one more than the slots.
+        windows (dict): Window size -> minimum and maximum price of every window, see rolling().
+    """
+
+    def __init__(self, prices):
+        """
+        Initializes the series and ranks the slots.
+
+        Args:
+            prices (iterable): Price per slot.
+        """
+        self.prices = array.array("d", prices)
+        self.order = array.array("i", sorted(range(len(self.prices)), key=self.prices.__getitem__))
+        self.rank = array.array("i", bytes(4 * len(self.prices)))
+        for position, slot in enumerate(self.order):
+            self.rank[slot] = position
+        self.prefix = array.array("d", itertools.accumulate(self.prices, initial=0))
+        self.windows = {}
+
+    def __len__(self):
+        return len(self.prices)
+
+    def __getitem__(self, slot):
+        return self.prices[slot]
+
+    def bounds(self, first, last):
+        """
+        Clamps a slot range to the series.
+
+        Args:
+            first (int): First slot.
+            last (int): Slot after the last slot, None for the end of the series.
+
+        Returns:
+            tuple: The clamped first and last slot.
+        """
+        last = len(self.prices) if last is None else min(last, len(self.prices))
+        return max(0, first), last
+
+    def cheapest(self, k, first=0, last=None):
+        """
+        Returns the k cheapest slots of a range.
+
+        Args:
+            k (int): Number of slots.
+            first (int): First slot.
+            last (int): Slot after the last slot, None for the end of the series.
+
+        Returns:
+            list: Slots from cheapest to dearest.
+        """
+        first, last = self.bounds(first, last)
+        return list(itertools.islice((slot for slot in self.order if first <= slot < last), k))
+
+    def dearest(self, k, first=0, last=None):
+        """
+        Returns the k dearest slots of a range.
+
+        Args:
+            k (int): Number of slots.
+            first (int): First slot.
+            last (int): Slot after the last slot, None for the end of the series.
+
+        Returns:
+            list: Slots from dearest to cheapest, ties earliest slot first.
+        """
+        first, last = self.bounds(first, last)
+        slots = []
+        # Walk the ranking backwards, a group of equal prices is kept in slot order
+        position = len(self.order) - 1
+        while position >= 0 and len(slots) < k:
+            start = position
+            while start > 0 and self.prices[self.order[start - 1]] == self.prices[self.order[position]]:
+                start -= 1
+            for slot in self.order[start:position + 1]:
+                if first <= slot < last and len(slots) < k:
+                    slots.append(slot)
+            position = start - 1
+        return slots
+
+    def lowest(self, first=0, last=None, default=None):
+        """
+        Returns the cheapest slot of a range.
+
+        Args:
+            first (int): First slot.
+            last (int): Slot after the last slot, None for the end of the series.
+            default (int): Returned when the range is empty.
+
+        Returns:
+            int: The slot.
+        """
+        slots = self.cheapest(1, first, last)
+        return slots[0] if slots else default
+
+    def highest(self, first=0, last=None, default=None):
+        """
+        Returns the dearest slot of a range.
+
+        Args:
+            first (int): First slot.
+            last (int): Slot after the last slot, None for the end of the series.
+            default (int): Returned when the range is empty.
+
+        Returns:
+            int: The slot.
+        """
+        slots = self.dearest(1, first, last)
+        return slots[0] if slots else default
+
+    def rolling(self, window):
+        """
+        Returns the minimum and maximum price of every window of slots, calculated once per window size.
+
+        Args:
+            window (int): Slots per window.
+
+        Returns:
+            tuple: Arrays with the minimum and maximum price of the window starting at every slot.
+        """
+        if window not in self.windows:
+            lows = array.array("d")
+            highs = array.array("d")
+            low = collections.deque()
+            high = collections.deque()
+            for slot in range(len(self.prices) - 1, -1, -1):
+                price = self.prices[slot]
+                while low and self.prices[low[-1]] >= price:
+                    low.pop()
+                while high and self.prices[high[-1]] <= price:
+                    high.pop()
+                low.append(slot)
+                high.append(slot)
+                if low[0] >= slot + window:
+                    low.popleft()
+                if high[0] >= slot + window:
+                    high.popleft()
+                lows.append(self.prices[low[0]])
+                highs.append(self.prices[high[0]])
+            lows.reverse()
+            highs.reverse()
+            self.windows[window] = (lows, highs)
+        return self.windows[window]
+
+    def average(self, first, last):
+        """
+        Returns the average price of a range.
+
+        Args:
+            first (int): First slot.
+            last (int): Slot after the last slot.
+
+        Returns:
+            float: The average price.
+        """
+        first, last = self.bounds(first, last)
+        return (self.prefix[last] - self.prefix[first]) / (last - first) if last > first else 0
+
+    def cheapest_windows(self, length, k=1, first=0, last=None):
+        """
+        Returns the k cheapest contiguous windows of a range that do not overlap.
+
+        Args:
+            length (int): Slots per window.
+            k (int): Number of windows.
+            first (int): First slot.
+            last (int): Slot after the last slot, None for the end of the series.
+
+        Returns:
+            list: First slot of every window, from cheapest to dearest.
+        """
+        first, last = self.bounds(first, last)
+        starts = sorted(range(first, last - length + 1), key=lambda start: self.prefix[start + length] - self.prefix[start])
+        windows = []
+        for start in starts:
+            if len(windows) >= k:
+                break
+            if all(start + length <= other or other + length <= start for other in windows):
+                windows.append(start)
+        return windows
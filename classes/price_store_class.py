@@ -0,0 +1,143 @@
+import array
+import contextlib
+import datetime
+import sqlite3
+import time
+from classes.entsoe_class import PriceCurve
+
+
+class PriceStore:
+    """
+    Persistent store of day ahead prices, one row per delivery day and bidding zone.
+
+    Prices are stored as a packed array of doubles, so loading a day is one primary key lookup and no
+    XML parsing.
+
+    Attributes:
+        path (str): The SQLite database file.
+        tz (ZoneInfo): Timezone of the delivery days.
+    """
+
+    def __init__(self, path, tz):
+        """
+        Initializes the store and creates the table if needed.
+
+        Args:
+            path (str): The SQLite database file.
+            tz (ZoneInfo): Timezone of the delivery days.
+        """
+        self.path = path
+        self.tz = tz
+        with self.connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS prices ("
+                "zone TEXT NOT NULL, day TEXT NOT NULL, start TEXT NOT NULL, resolution INTEGER NOT NULL, "
+                "prices BLOB NOT NULL, fetched REAL NOT NULL, PRIMARY KEY (zone, day))"
+            )
+
+    @contextlib.contextmanager
+    def connect(self):
+        """
+        Opens a connection for one operation, so the store can be used from any thread.
+        """
+        db = sqlite3.connect(self.path)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def day_start(self, day):
+        """
+        Returns the start of a delivery day.
+
+        Args:
+            day (date): The delivery day.
+
+        Returns:
+            datetime: Local midnight of the day as UTC.
+        """
+        return datetime.datetime.combine(day, datetime.time(), tzinfo=self.tz).astimezone(datetime.timezone.utc)
+
+    def missing(self, zone, days):
+        """
+        Returns the days that are not in the store.
+
+        Args:
+            zone (str): The bidding zone.
+            days (list): Delivery days.
+
+        Returns:
+            list: The days without prices.
+        """
+        with self.connect() as db:
+            stored = {row[0] for row in db.execute("SELECT day FROM prices WHERE zone = ?", (zone,))}
+        return [day for day in days if day.isoformat() not in stored]
+
+    def save(self, zone, curve):
+        """
+        Stores every delivery day the curve fully covers.
+
+        Args:
+            zone (str): The bidding zone.
+            curve (PriceCurve): The prices.
+
+        Returns:
+            list: The days stored.
+        """
+        saved = []
+        day = curve.start.astimezone(self.tz).date()
+        with self.connect() as db:
+            while True:
+                first = curve.slot(self.day_start(day))
+                last = curve.slot(self.day_start(day + datetime.timedelta(days=1)))
+                if last > len(curve):
+                    break
+                if first >= 0:
+                    db.execute(
+                        "INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?, ?)",
+                        (zone, day.isoformat(), self.day_start(day).isoformat(), curve.resolution, curve.prices[first:last].tobytes(), time.time()),
+                    )
+                    saved.append(day)
+                day += datetime.timedelta(days=1)
+        return saved
+
+    def load(self, zone, day, days=1):
+        """
+        Loads consecutive delivery days as one curve, up to the first day that is not in the store.
+
+        Args:
+            zone (str): The bidding zone.
+            day (date): The first delivery day.
+            days (int): Max number of days.
+
+        Returns:
+            PriceCurve: The prices, None if the first day is not in the store.
+        """
+        rows = []
+        with self.connect() as db:
+            for x in range(days):
+                row = db.execute(
+                    "SELECT resolution, prices FROM prices WHERE zone = ? AND day = ?",
+                    (zone, (day + datetime.timedelta(days=x)).isoformat()),
+                ).fetchone()
+                if row is None:
+                    break
+                rows.append(row)
+
+        if not rows:
+            return None
+
+        # Days of a coarser resolution are repeated on the finest grid
+        step = min(row[0] for row in rows)
+        prices = array.array("d")
+        for resolution, blob in rows:
+            values = array.array("d")
+            values.frombytes(blob)
+            if resolution == step:
+                prices.extend(values)
+            else:
+                for value in values:
+                    prices.extend([value] * (resolution // step))
+
+        return PriceCurve(self.day_start(day), step, prices)
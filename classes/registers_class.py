@@ -0,0 +1,266 @@
+import dataclasses
+
+# Holding registers used by the planner: name -> (address, quantity)
+REGISTERS = {
+    "batt_capacity": (102, 1),
+    "max_charge": (108, 1),
+    "work_mode": (142, 1),
+    "set_points": (148, 6),
+    "loads": (166, 6),
+    "load_points": (172, 6),
+    "soc": (588, 1),
+}
+
+# Max number of registers in one Modbus read (function code 3)
+MAX_READ = 125
+
+# Max number of registers in one Modbus write (function code 16)
+MAX_WRITE = 123
+
+
+class WriteError(Exception):
+    """
+    Raised when a group of writes did not complete.
+
+    Attributes:
+        written (list): The writes that were acknowledged as (address, values).
+        rolled_back (bool): The written registers got their previous values back.
+    """
+
+    def __init__(self, message, written, rolled_back):
+        super().__init__(message)
+        self.written = written
+        self.rolled_back = rolled_back
+
+
+class RegisterMap:
+    """
+    Declares the registers the planner needs and reads them with as few block reads as possible.
+
+    Attributes:
+        registers (dict): Register name -> (address, quantity).
+        max_read (int): Max number of registers in one block read.
+        max_gap (int): Max number of unused registers read to merge two blocks, None for no limit.
+    """
+
+    def __init__(self, registers=None, max_read=MAX_READ, max_gap=None):
+        """
+        Initializes the register map.
+
+        Args:
+            registers (dict): Register name -> (address, quantity), defaults to REGISTERS.
+            max_read (int): Max number of registers in one block read.
+            max_gap (int): Max number of unused registers read to merge two blocks, None for no limit.
+        """
+        self.registers = dict(REGISTERS if registers is None else registers)
+        self.max_read = max_read
+        self.max_gap = max_gap
+
+    def blocks(self):
+        """
+        Merges the declared registers into block reads.
+
+        Returns:
+            list: (address, quantity) of every block read, in address order.
+        """
+        blocks = []
+        for address, quantity in sorted(self.registers.values()):
+            if blocks:
+                start, length = blocks[-1]
+                gap = address - (start + length)
+                if address + quantity - start <= self.max_read and (self.max_gap is None or gap <= self.max_gap):
+                    blocks[-1] = (start, max(length, address + quantity - start))
+                    continue
+            blocks.append((address, quantity))
+        return blocks
+
+    def read(self, modbus):
+        """
+        Reads all declared registers.
+
+        Args:
+            modbus (PySolarmanV5): Connection to the battery.
+
+        Returns:
+            dict: Register address -> value for every register in the block reads.
+        """
+        values = {}
+        for address, quantity in self.blocks():
+            for offset, value in enumerate(modbus.read_holding_registers(register_addr=address, quantity=quantity)):
+                values[address + offset] = value
+        return values
+
+    def read_back(self, modbus, addresses):
+        """
+        Reads the registers of a set of addresses with as few block reads as possible.
+
+        Args:
+            modbus (PySolarmanV5): Connection to the battery.
+            addresses (iterable): Register addresses.
+
+        Returns:
+            dict: Register address -> value for every register in the block reads.
+        """
+        registers = RegisterMap({address: (address, 1) for address in addresses}, self.max_read, self.max_gap)
+        return registers.read(modbus)
+
+    def apply(self, modbus, current, desired, max_gap=0):
+        """
+        Writes only the registers that differ from the current state and verifies them with one read back.
+
+        The writes are one group: when a write fails, the writes before it are undone by writing the
+        current values back, and WriteError is raised. A failed read back raises WriteError as well, the
+        writes are then kept.
+
+        Args:
+            modbus (PySolarmanV5): Connection to the battery.
+            current (dict): Register address -> last known value.
+            desired (dict): Register address -> value to write, in the order the writes must happen.
+            max_gap (int): Max number of unchanged registers written back to merge two writes.
+
+        Returns:
+            tuple: The writes as (address, values) and the registers that do not hold the desired value
+            after the writes as address -> value read back.
+        """
+        writes = plan_writes(current, desired, max_gap)
+        done = []
+        for address, values in writes:
+            try:
+                modbus.write_multiple_holding_registers(register_addr=address, values=values)
+            except Exception as e:
+                raise WriteError("Write of register " + str(address) + " failed: " + (str(e) or type(e).__name__), done, self.rollback(modbus, current, done)) from e
+            done.append((address, values))
+
+        if not writes:
+            return writes, {}
+
+        written = [address + x for address, values in writes for x in range(len(values))]
+        try:
+            values = self.read_back(modbus, written)
+        except Exception as e:
+            raise WriteError("Read back failed: " + (str(e) or type(e).__name__), writes, False) from e
+        return writes, {address: values[address] for address in written if values[address] != desired.get(address, current.get(address))}
+
+    def rollback(self, modbus, current, writes):
+        """
+        Writes the current values back to the registers of writes, last write first.
+
+        Args:
+            modbus (PySolarmanV5): Connection to the battery.
+            current (dict): Register address -> last known value.
+            writes (list): The writes to undo as (address, values).
+
+        Returns:
+            bool: True if every register got its current value back.
+        """
+        for address, values in reversed(writes):
+            if any(address + x not in current for x in range(len(values))):
+                return False
+            try:
+                modbus.write_multiple_holding_registers(register_addr=address, values=[current[address + x] for x in range(len(values))])
+            except Exception as e:
+                print("Rollback of register " + str(address) + " failed: " + (str(e) or type(e).__name__))
+                return False
+        return True
+
+    def snapshot(self, modbus):
+        """
+        Reads all declared registers into a snapshot.
+
+        Args:
+            modbus (PySolarmanV5): Connection to the battery.
+
+        Returns:
+            Snapshot: The register state of this run.
+        """
+        return Snapshot.from_registers(self.read(modbus), self.registers)
+
+
+def plan_writes(current, desired, max_gap=0, max_write=MAX_WRITE):
+    """
+    Merges the registers that change into as few contiguous writes as possible.
+
+    Registers whose desired value equals the current value are left out. Changed registers at adjacent
+    addresses are written in one block, gaps of at most max_gap known registers are bridged by writing
+    their current value back. The writes keep the order of the first changed register in desired, so a
+    mode register listed last is written last.
+
+    Args:
+        current (dict): Register address -> last known value.
+        desired (dict): Register address -> value to write.
+        max_gap (int): Max number of unchanged registers written back to merge two writes.
+        max_write (int): Max number of registers in one write.
+
+    Returns:
+        list: The writes as (address, values).
+    """
+    changed = [address for address in desired if current.get(address) != desired[address]]
+    order = {address: position for position, address in enumerate(changed)}
+
+    blocks = []
+    for address in sorted(changed):
+        if blocks:
+            start, end = blocks[-1]
+            gap = range(end + 1, address)
+            if address - start < max_write and len(gap) <= max_gap and all(x in desired or x in current for x in gap):
+                blocks[-1] = (start, address)
+                continue
+        blocks.append((address, address))
+
+    writes = []
+    for start, end in sorted(blocks, key=lambda block: min(order[x] for x in range(block[0], block[1] + 1) if x in order)):
+        writes.append((start, [desired[x] if x in desired else current[x] for x in range(start, end + 1)]))
+    return writes
+
+
+@dataclasses.dataclass
+class Snapshot:
+    """
+    The register state of the inverter, read once per run.
+
+    Attributes:
+        batt_capacity (float): Capacity of the battery in kWh (register 102).
+        maxload (float): Max load of the battery per hour in kWh (register 108).
+        work_mode (int): Work mode, 0=selling first, 1=zero export (register 142).
+        set_points (list): Set points (hour*100 + minute) of the six time slots (registers 148-153).
+        loads (list): Load percentage of the six time slots (registers 166-171).
+        load_points (list): Grid charge of the six time slots, 0=off, 1=on (registers 172-177).
+        perc (int): Current percentage of battery charge (register 588).
+        registers (dict): Register address -> value of every register read.
+    """
+
+    batt_capacity: float
+    maxload: float
+    work_mode: int
+    set_points: list
+    loads: list
+    load_points: list
+    perc: int
+    registers: dict
+
+    @classmethod
+    def from_registers(cls, values, registers=REGISTERS):
+        """
+        Builds a snapshot from raw register values.
+
+        Args:
+            values (dict): Register address -> value.
+            registers (dict): Register name -> (address, quantity).
+
+        Returns:
+            Snapshot: The register state.
+        """
+        def get(name):
+            address, quantity = registers[name]
+            return [values[address + x] for x in range(quantity)]
+
+        return cls(
+            batt_capacity=get("batt_capacity")[0] * 50 / 1000,
+            maxload=float(get("max_charge")[0]) * 50 / 1000,
+            work_mode=get("work_mode")[0],
+            set_points=get("set_points"),
+            loads=get("loads"),
+            load_points=get("load_points"),
+            perc=get("soc")[0],
+            registers=dict(values),
+        )
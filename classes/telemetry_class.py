@@ -0,0 +1,270 @@
+import mmap
+import os
+import struct
+import time
+from classes.registers_class import RegisterMap
+
+# Live registers of the inverter: name -> (address, signed)
+TELEMETRY = {
+    "soc": (588, False),
+    "battery_power": (590, True),
+    "grid_power": (625, True),
+    "load_power": (653, False),
+    "pv1_power": (672, False),
+    "pv2_power": (673, False),
+}
+
+# One sample: timestamp (s), soc (%), battery (W, + discharge), grid (W, + import), load (W), pv1 (W), pv2 (W)
+RECORD = struct.Struct("<IHhhHHH")
+FIELDS = ("time", "soc", "battery_power", "grid_power", "load_power", "pv1_power", "pv2_power")
+
+# File header: magic, version, record size, capacity, records written, padding
+HEADER = struct.Struct("<4sHHIQ12x")
+MAGIC = b"KWTL"
+VERSION = 1
+
+
+class RingBuffer:
+    """
+    A fixed-size file of telemetry samples, memory mapped. When the file is full the oldest sample is
+    overwritten, so the file never grows.
+
+    Samples are appended in time order, a time window is found with a binary search and returned as
+    memoryviews on the mapped file, without copying.
+
+    Attributes:
+        path (str): The file.
+        capacity (int): Max number of samples.
+        written (int): Number of samples ever appended, the next sample goes to slot written % capacity.
+    """
+
+    def __init__(self, path, capacity=1048576):
+        """
+        Opens the file, or creates it with room for capacity samples. An existing file keeps its capacity.
+
+        Args:
+            path (str): The file.
+            capacity (int): Max number of samples of a new file.
+        """
+        self.path = path
+        if not os.path.exists(path) or os.path.getsize(path) < HEADER.size:
+            with open(path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, capacity, 0))
+                f.truncate(HEADER.size + capacity * RECORD.size)
+
+        self.file = open(path, 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        magic, version, size, self.capacity, self.written = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION or size != RECORD.size:
+            self.close()
+            raise ValueError(path + " is not a telemetry file")
+        self.view = memoryview(self.map)[HEADER.size:HEADER.size + self.capacity * RECORD.size]
+
+    def close(self):
+        """
+        Flushes and closes the file.
+        """
+        if getattr(self, "view", None) is not None:
+            self.view.release()
+            self.view = None
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+    def __len__(self):
+        return min(self.written, self.capacity)
+
+    def append(self, sample):
+        """
+        Appends a sample, overwriting the oldest sample when the file is full.
+
+        Args:
+            sample (tuple): The values in FIELDS order.
+        """
+        RECORD.pack_into(self.view, (self.written % self.capacity) * RECORD.size, *sample)
+        self.written += 1
+        # The counter is written after the record, a crash never exposes half a record
+        HEADER.pack_into(self.map, 0, MAGIC, VERSION, RECORD.size, self.capacity, self.written)
+
+    def slot(self, index):
+        """
+        Returns the file slot of a sample, 0 is the oldest sample.
+
+        Args:
+            index (int): The sample.
+
+        Returns:
+            int: The slot.
+        """
+        return (self.written - len(self) + index) % self.capacity
+
+    def timestamp(self, index):
+        """
+        Returns the timestamp of a sample, 0 is the oldest sample.
+
+        Args:
+            index (int): The sample.
+
+        Returns:
+            int: Unix timestamp.
+        """
+        return struct.unpack_from("<I", self.view, self.slot(index) * RECORD.size)[0]
+
+    def bisect(self, moment):
+        """
+        Finds the first sample at or after a moment.
+
+        Args:
+            moment (float): Unix timestamp.
+
+        Returns:
+            int: The sample, len(self) if all samples are older.
+        """
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamp(middle) < moment:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def window(self, start, end):
+        """
+        Returns the samples from start up to end, without copying.
+
+        Args:
+            start (float): Unix timestamp of the first sample.
+            end (float): Unix timestamp after the last sample.
+
+        Returns:
+            list: Memoryviews of the records, two when the window wraps around the end of the file.
+        """
+        first = self.bisect(start)
+        last = self.bisect(end)
+        if last <= first:
+            return []
+        begin = self.slot(first)
+        stop = begin + last - first
+        if stop <= self.capacity:
+            return [self.view[begin * RECORD.size:stop * RECORD.size]]
+        return [self.view[begin * RECORD.size:], self.view[:(stop - self.capacity) * RECORD.size]]
+
+    def samples(self, start, end):
+        """
+        Iterates over the samples from start up to end.
+
+        Args:
+            start (float): Unix timestamp of the first sample.
+            end (float): Unix timestamp after the last sample.
+
+        Returns:
+            iterator: The samples as tuples in FIELDS order.
+        """
+        for view in self.window(start, end):
+            yield from RECORD.iter_unpack(view)
+
+    def summary(self, start, end, gap=600):
+        """
+        Summarizes the samples from start up to end. Energy is the power of a sample times the time to
+        the next sample, a longer time than gap (the poller did not run) counts as no energy.
+
+        Args:
+            start (float): Unix timestamp of the first sample.
+            end (float): Unix timestamp after the last sample.
+            gap (float): Max seconds between two samples.
+
+        Returns:
+            dict: Number of samples, first and last soc, min and max soc, average power (W) and energy
+            (kWh) of pv, load, charge, discharge, grid import and grid export. None if there are no
+            samples.
+        """
+        energy = dict.fromkeys(("pv", "load", "charge", "discharge", "import", "export"), 0.0)
+        count = 0
+        first = previous = None
+        low = 100
+        high = 0
+        seconds = 0
+        for sample in self.samples(start, end):
+            if previous is not None and sample[0] - previous[0] <= gap:
+                seconds += sample[0] - previous[0]
+                hours = (sample[0] - previous[0]) / 3600
+                energy["pv"] += (previous[5] + previous[6]) * hours
+                energy["load"] += previous[4] * hours
+                energy["discharge"] += max(0, previous[2]) * hours
+                energy["charge"] += max(0, -previous[2]) * hours
+                energy["import"] += max(0, previous[3]) * hours
+                energy["export"] += max(0, -previous[3]) * hours
+            if first is None:
+                first = sample
+            low = min(low, sample[1])
+            high = max(high, sample[1])
+            count += 1
+            previous = sample
+
+        if previous is None:
+            return None
+        result = {"samples": count, "first_soc": first[1], "last_soc": previous[1], "min_soc": low, "max_soc": high}
+        for name, wh in energy.items():
+            result[name + "_kwh"] = round(wh / 1000, 3)
+            result[name + "_w"] = round(wh * 3600 / seconds) if seconds else 0
+        return result
+
+
+class TelemetryPoller:
+    """
+    Reads the live registers of the inverter into a ring buffer, in one block read per sample.
+
+    Attributes:
+        ring (RingBuffer): The samples.
+        interval (float): Seconds between samples.
+        registers (RegisterMap): The live registers.
+        next_poll (float): Unix timestamp of the next sample.
+    """
+
+    def __init__(self, ring, interval=10, max_read=125):
+        """
+        Initializes the poller.
+
+        Args:
+            ring (RingBuffer): The samples.
+            interval (float): Seconds between samples.
+            max_read (int): Max number of registers in one block read.
+        """
+        self.ring = ring
+        self.interval = interval
+        self.registers = RegisterMap({name: (address, 1) for name, (address, signed) in TELEMETRY.items()}, max_read)
+        self.next_poll = 0
+
+    def poll(self, modbus):
+        """
+        Reads one sample and appends it.
+
+        Args:
+            modbus (PySolarmanV5): Connection to the battery.
+
+        Returns:
+            tuple: The sample in FIELDS order.
+        """
+        values = self.registers.read(modbus)
+        sample = [int(time.time())]
+        for name in FIELDS[1:]:
+            address, signed = TELEMETRY[name]
+            value = values[address]
+            sample.append(value - 65536 if signed and value >= 32768 else value)
+        self.ring.append(sample)
+        return tuple(sample)
+
+    def due(self):
+        """
+        Checks if the next sample is due, and if so schedules the one after it.
+
+        Returns:
+            bool: True if a sample must be read now.
+        """
+        now = time.time()
+        if now < self.next_poll:
+            return False
+        # Stay on the grid of the interval, also after a slow read
+        self.next_poll = (now // self.interval + 1) * self.interval
+        return True
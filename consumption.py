@@ -0,0 +1,52 @@
+import argparse
+import datetime
+import json
+import time
+from classes.consumption_class import ConsumptionProfile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Learn the consumption per hour of the week from recorded history.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    learn = subparsers.add_parser("learn", help="learn the hours after the last learned hour")
+    learn.add_argument("--csv", action="append", default=[], help="CSV file with time and kwh (per hour) or load_power (W) columns")
+    learn.add_argument("--homeassistant", action="append", default=[], help="Home Assistant history export (JSON) of a power sensor (W)")
+    learn.add_argument("--telemetry", action="store_true", help="learn the load power in the telemetry file")
+    subparsers.add_parser("show", help="expected kWh per hour of every weekday")
+    args = parser.parse_args()
+
+    with open("config.json") as json_data_file:
+        cfg = json.load(json_data_file)
+    consumption = cfg.get("consumption", {})
+    profile = ConsumptionProfile(consumption.get("path", "consumption.json"), consumption.get("window", 8), consumption.get("min_samples", 2))
+
+    if args.command == "learn":
+        learned = 0
+        for path in args.csv:
+            learned += profile.learn_csv(path)
+        for path in args.homeassistant:
+            learned += profile.learn_homeassistant(path)
+        if args.telemetry:
+            from classes.telemetry_class import RingBuffer
+
+            telemetry = cfg.get("telemetry", {})
+            ring = RingBuffer(telemetry.get("path", "telemetry.bin"), telemetry.get("capacity", 1048576))
+            learned += profile.learn_power((sample[0], sample[4]) for sample in ring.samples(profile.last, time.time()))
+            ring.close()
+        profile.save()
+        print("Learned " + str(learned) + " hours, up to " + (datetime.datetime.fromtimestamp(profile.last).isoformat(sep=' ') if profile.last else "-"))
+        return
+
+    # Monday 0:00 of any week
+    monday = datetime.datetime(2024, 1, 1)
+    print("hour " + " ".join("{:>6}".format(day) for day in ("mon", "tue", "wed", "thu", "fri", "sat", "sun")))
+    for hour in range(24):
+        row = []
+        for day in range(7):
+            kwh = profile.expected(monday + datetime.timedelta(days=day, hours=hour))
+            row.append("{:>6}".format("-" if kwh is None else "{:.2f}".format(kwh)))
+        print("{:>4} ".format(hour) + " ".join(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import argparse
+from classes.emulator_class import EmulatorServer, InverterEmulator
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emulate the SolarmanV5 stick logger and the inverter registers.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8899, help="port to listen on")
+    parser.add_argument("--serial", type=int, default=2713000000, help="serial number of the logger")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="max random seconds added to the latency")
+    parser.add_argument("--drop", type=float, default=0.0, help="probability a request gets no response")
+    parser.add_argument("--drift", type=float, default=4.0, help="battery percentage lost per hour")
+    parser.add_argument("--soc", type=int, default=50, help="battery percentage at the start")
+    parser.add_argument("--seed", type=int, help="seed of the random faults")
+    args = parser.parse_args()
+
+    emulator = InverterEmulator(args.serial, latency=args.latency, jitter=args.jitter, drop=args.drop, drift=args.drift, seed=args.seed)
+    emulator.write(588, [args.soc])
+
+    with EmulatorServer((args.host, args.port), emulator) as server:
+        print("Emulating logger " + str(args.serial) + " on " + args.host + ":" + str(args.port))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    print(emulator.snapshot_stats())
+
+
+if __name__ == "__main__":
+    main()
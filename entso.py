@@ -1,3 +1,195 @@
-from classes.battery_class import Battery
+import argparse
+import json
 
-Battery = Battery()
\ No newline at end of file
+
+def load_config():
+    """
+    Loads the configuration settings from config.json.
+    """
+    with open("config.json") as json_data_file:
+        return json.load(json_data_file)
+
+
+def print_plan(battery):
+    """
+    Prints the load table and the notifications of a dry run.
+
+    Args:
+        battery (Battery): The planned battery.
+    """
+    print("\n".join(str(x) for x in battery.messages))
+    print("set points:  " + str(battery.set_points))
+    print("loads:       " + str(battery.loads))
+    print("load points: " + str(battery.load_points))
+    if battery.expected_cost:
+        print("expected cost: " + ", ".join(name + " " + "{:.2f}".format(cost) for name, cost in battery.expected_cost.items()))
+
+
+def last_perc(cfg):
+    """
+    Returns the battery percentage of the last telemetry sample of the past day.
+
+    Args:
+        cfg (dict): Configuration settings.
+
+    Returns:
+        int: The percentage, None if there is no sample.
+    """
+    import os
+    import time
+    from classes.telemetry_class import RingBuffer
+
+    telemetry = cfg.get("telemetry", {})
+    path = telemetry.get("path", "telemetry.bin")
+    if not os.path.exists(path):
+        return None
+    ring = RingBuffer(path)
+    samples = list(ring.samples(time.time() - 86400, time.time() + 1))
+    ring.close()
+    return samples[-1][1] if samples else None
+
+
+def run(battery):
+    """
+    Runs the battery, missing prices and an unreachable inverter end the process with a one line message
+    and a non-zero exit code. The run has sent its notifications by then.
+
+    Args:
+        battery (Battery): The battery.
+    """
+    from classes.modbus_class import CircuitOpenError
+
+    try:
+        battery.run()
+    except ValueError as e:
+        raise SystemExit(str(e))
+    except (OSError, CircuitOpenError) as e:
+        raise SystemExit("Inverter unreachable: " + (str(e) or type(e).__name__))
+
+
+def apply(args):
+    """
+    Fetches, plans and writes the load table to the battery, what a cronjob runs.
+    """
+    from classes.battery_class import Battery
+
+    run(Battery(run=False))
+
+
+def dry_run(args):
+    """
+    Fetches and plans like apply, without writes and notifications, and prints the plan.
+    """
+    from classes.battery_class import Battery
+
+    battery = Battery(run=False)
+    battery.dry_run = True
+    run(battery)
+    print_plan(battery)
+
+
+def plan(args):
+    """
+    Plans from the price store and forecast cache files only and prints the plan, nothing is fetched.
+    """
+    from classes.battery_class import Battery
+
+    cfg = load_config()
+    perc = args.perc if args.perc is not None else last_perc(cfg)
+    if perc is None:
+        raise SystemExit("No telemetry, set the battery percentage with --perc")
+    battery = Battery(run=False, cfg=cfg)
+    try:
+        battery.run_offline(perc, args.capacity, args.maxload)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print_plan(battery)
+
+
+def status(args):
+    """
+    Reads the register snapshot of the inverter and prints it, without prices or forecast.
+    """
+    from classes.battery_class import Battery
+
+    battery = Battery(run=False)
+    snapshot = battery.fetch_inverter(battery.cfg.get("timeouts", {}).get("inverter", 20))
+    print("battery:     " + str(snapshot.perc) + "% of " + str(snapshot.batt_capacity) + " kWh, max load " + str(snapshot.maxload) + " kWh per hour")
+    print("work mode:   " + ("selling first" if snapshot.work_mode == 0 else "zero export"))
+    print("set points:  " + str(snapshot.set_points))
+    print("loads:       " + str(snapshot.loads))
+    print("load points: " + str(snapshot.load_points))
+
+
+def journal(args):
+    """
+    Prints the run whose load table was in the battery at a moment, from the journal only.
+    """
+    import datetime
+    import time
+    from classes.journal_class import RunJournal
+
+    cfg = load_config()
+    moment = datetime.datetime.fromisoformat(args.moment).timestamp() if args.moment else time.time()
+    run = RunJournal(cfg.get("journal", {}).get("path", "journal.db")).at(moment)
+    if run is None:
+        raise SystemExit("No run before " + time.strftime("%Y-%m-%d %H:%M", time.localtime(moment)))
+    print("run:         " + time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(run["time"])) + (", plan kept from the run before" if run["memoized"] else ""))
+    print("set points:  " + str(run["plan"]["set_points"]))
+    print("loads:       " + str(run["plan"]["loads"]))
+    print("load points: " + str(run["plan"]["load_points"]))
+    print("writes:      " + (", ".join(str(address) + ": " + str(values) for address, values in run["writes"]) or "none"))
+
+
+def daemon(args):
+    """
+    Keeps the battery resident and plans on every boundary.
+    """
+    from classes.daemon_class import Daemon
+
+    Daemon(interval=args.interval).run()
+
+
+def fleet(args):
+    """
+    Plans every site of the fleet once.
+    """
+    from classes.fleet_class import Fleet, summarize
+
+    print(summarize(Fleet(load_config()).run()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan the Kiwatt battery on the ENTSO-e day ahead prices.")
+    parser.add_argument("--daemon", action="store_true", help="keep running and plan on every hour or quarter-hour boundary")
+    parser.add_argument("--interval", type=int, choices=[15, 60], default=60, help="minutes between plans in daemon mode")
+    parser.add_argument("--fleet", action="store_true", help="plan every site in the sites list of config.json")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("apply", help="fetch, plan and write the load table to the battery (default)").set_defaults(func=apply)
+    subparsers.add_parser("dry-run", help="fetch and plan, without writing or notifying").set_defaults(func=dry_run)
+    offline = subparsers.add_parser("plan", help="plan from the price store and forecast cache only, no network")
+    offline.add_argument("--perc", type=float, help="battery percentage, default the last telemetry sample")
+    offline.add_argument("--capacity", type=float, default=20, help="battery capacity (kWh)")
+    offline.add_argument("--maxload", type=float, default=5, help="max load per hour (kWh)")
+    offline.set_defaults(func=plan)
+    subparsers.add_parser("status", help="read the battery percentage and load table from the inverter").set_defaults(func=status)
+    history = subparsers.add_parser("journal", help="show the load table programmed at a moment")
+    history.add_argument("moment", nargs="?", help="local date and time (YYYY-MM-DDTHH:MM), default now")
+    history.set_defaults(func=journal)
+    args = parser.parse_args()
+
+    if args.fleet and args.daemon:
+        parser.error("--fleet runs once, schedule it with a cronjob")
+    if (args.fleet or args.daemon) and args.command:
+        parser.error("--daemon and --fleet take no command")
+
+    if args.daemon:
+        daemon(args)
+    elif args.fleet:
+        fleet(args)
+    else:
+        getattr(args, "func", apply)(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import argparse
+import datetime
+import json
+import time
+from classes.telemetry_class import FIELDS, RingBuffer, TelemetryPoller
+
+
+def moment(text):
+    """
+    Parses a local date and time (YYYY-MM-DD or YYYY-MM-DDTHH:MM) into a unix timestamp.
+    """
+    return datetime.datetime.fromisoformat(text).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and query the live registers of the inverter.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("poll", help="sample the inverter until interrupted (the daemon samples by itself when telemetry is enabled)")
+    for name, text in (("summary", "energy and battery percentage of a time window"), ("export", "samples of a time window as CSV")):
+        subparser = subparsers.add_parser(name, help=text)
+        subparser.add_argument("--start", type=moment, help="start (YYYY-MM-DDTHH:MM), default --hours before the end")
+        subparser.add_argument("--end", type=moment, help="end (YYYY-MM-DDTHH:MM), default now")
+        subparser.add_argument("--hours", type=float, default=24, help="length of the window")
+    args = parser.parse_args()
+
+    with open("config.json") as json_data_file:
+        cfg = json.load(json_data_file)
+    telemetry = cfg.get("telemetry", {})
+    ring = RingBuffer(telemetry.get("path", "telemetry.bin"), telemetry.get("capacity", 1048576))
+
+    if args.command == "poll":
+        from classes.battery_class import Battery
+
+        battery = Battery(run=False, cfg=cfg)
+        poller = TelemetryPoller(ring, telemetry.get("interval", 10), cfg["kiwatt"].get("max_read", 125))
+        try:
+            while True:
+                if poller.due():
+                    try:
+                        print(dict(zip(FIELDS, poller.poll(battery.connect(cfg.get("timeouts", {}).get("inverter", 20))))))
+                    except Exception as e:
+                        print("Telemetry failed: " + str(e))
+                        battery.modbus.disconnect()
+                time.sleep(max(0, poller.next_poll - time.time()))
+        except KeyboardInterrupt:
+            pass
+        ring.close()
+        return
+
+    end = args.end or time.time()
+    start = args.start or end - args.hours * 3600
+    if args.command == "summary":
+        print(json.dumps(ring.summary(start, end), indent=2))
+    else:
+        print(",".join(FIELDS))
+        for sample in ring.samples(start, end):
+            print(",".join(str(x) for x in sample))
+
+
+if __name__ == "__main__":
+    main()
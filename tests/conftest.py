@@ -0,0 +1,79 @@
+import array
+import datetime
+import json
+import os
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from classes.battery_class import Battery  # noqa: E402
+from classes.entsoe_class import PriceCurve  # noqa: E402
+
+# The day and hour of the planning runs of the tests
+DAY = datetime.date(2025, 1, 6)
+
+
+class FakeModbus:
+    """
+    A ModbusSession on a register dict, with writes to chosen registers failing.
+
+    Attributes:
+        registers (dict): Register address -> value.
+        fail (set): Addresses of the writes that raise, every write starting at one of them fails.
+        reads (int): Number of reads.
+        writes (int): Number of acknowledged writes.
+    """
+
+    def __init__(self):
+        self.registers = {x: 0 for x in range(100, 600)}
+        self.registers[102] = 400
+        self.registers[108] = 100
+        self.registers[142] = 1
+        self.registers[588] = 40
+        self.fail = set()
+        self.reads = 0
+        self.writes = 0
+
+    def read_holding_registers(self, register_addr, quantity):
+        self.reads += 1
+        return [self.registers[register_addr + x] for x in range(quantity)]
+
+    def write_multiple_holding_registers(self, register_addr, values):
+        if register_addr in self.fail:
+            raise OSError("no answer")
+        self.writes += 1
+        for x, value in enumerate(values):
+            self.registers[register_addr + x] = value
+
+    def disconnect(self):
+        pass
+
+
+@pytest.fixture
+def make_battery(tmp_path, monkeypatch):
+    """
+    Builds batteries on a scratch configuration in tmp_path, with prices in the store, no production, a
+    shared FakeModbus and the network left out. The clock is 03:00 on DAY.
+    """
+    monkeypatch.chdir(tmp_path)
+    with open(os.path.join(ROOT, "config copy.json")) as f:
+        cfg = json.load(f)
+    modbus = FakeModbus()
+
+    def make(hour=3):
+        battery = Battery(run=False, cfg=cfg)
+        battery.modbus = modbus
+        battery.clock = lambda: datetime.datetime.combine(DAY, datetime.time(hour, 0, 30))
+        prices = array.array("d", (50 + (x * 37) % 90 for x in range(48)))
+        battery.store.save(battery.domain, PriceCurve(battery.store.day_start(DAY), 60, prices))
+        battery.fetch_forecast = lambda timeout: {"start": DAY.isoformat(), "resolution": 60, "production": [], "expires": time.time() + 3600, "retry_at": 0}
+        battery.publisher.publish = lambda attributes: None
+        battery.notifier.send = lambda messages: True
+        return battery
+
+    make.modbus = modbus
+    return make
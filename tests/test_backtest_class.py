@@ -0,0 +1,43 @@
+import json
+
+from classes.backtest_class import run_day, strategies, valid_table
+from classes.consumption_class import BUCKETS
+from conftest import DAY
+
+
+def job(cfg, unload):
+    return {
+        "cfg": cfg, "strategy": "unload=" + str(unload), "settings": {"unload_perc_hour": unload}, "day": DAY,
+        "perc": 50, "capacity": 20, "maxload": 5, "drain": None, "pv": None,
+    }
+
+
+def test_strategies_ignore_the_learned_profile(make_battery):
+    cfg = make_battery().cfg
+    with open("consumption.json", "w") as f:
+        json.dump({"last": 0, "counts": [8] * BUCKETS, "means": [0.5] * BUCKETS}, f)
+
+    low = run_day(job(cfg, 2))
+    high = run_day(job(cfg, 20))
+    assert low["errors"] == high["errors"] == 0
+    assert low["cost"] != high["cost"]
+
+    # The profile of the live battery is left alone
+    with open("consumption.json") as f:
+        assert json.load(f)["means"] == [0.5] * BUCKETS
+
+
+def test_strategies_are_every_combination():
+    assert strategies({"planner": ["heuristic", "optimal"], "max_percload": [80, 90]}) == [
+        ("max_percload=80 planner=heuristic", {"max_percload": 80, "planner": "heuristic"}),
+        ("max_percload=80 planner=optimal", {"max_percload": 80, "planner": "optimal"}),
+        ("max_percload=90 planner=heuristic", {"max_percload": 90, "planner": "heuristic"}),
+        ("max_percload=90 planner=optimal", {"max_percload": 90, "planner": "optimal"}),
+    ]
+
+
+def test_valid_table():
+    assert valid_table([0, 100, 200, 300, 400, 500], [10] * 6, [0] * 6)
+    assert not valid_table([0, 100, 200, 300, 400, 400], [10] * 6, [0] * 6)
+    assert not valid_table([0, 100, 200, 300, 400, 2400], [10] * 6, [0] * 6)
+    assert not valid_table([0, 100, 200, 300, 400], [10] * 5, [0] * 5)
@@ -0,0 +1,126 @@
+import array
+import concurrent.futures
+import datetime
+import time
+
+import pytest
+
+from classes.entsoe_class import PriceCurve
+from classes.modbus_class import ModbusSession
+from classes.price_provider_class import PriceProvider
+from conftest import DAY
+
+
+class SlowClient:
+    """
+    A PySolarmanV5 that answers after the timeout of the inverter leg.
+    """
+
+    def read_holding_registers(self, register_addr, quantity):
+        time.sleep(0.5)
+        return [0] * quantity
+
+    def disconnect(self):
+        pass
+
+
+def test_failed_prices_without_cache_raise_value_error(make_battery):
+    battery = make_battery()
+
+    def fail(timeout):
+        raise OSError("no answer")
+
+    battery.fetch_hour_prices = fail
+    with pytest.raises(ValueError, match="No prices in entsoe.xml"):
+        battery.acquire()
+
+
+def test_late_inverter_read_gets_its_session_closed(make_battery):
+    battery = make_battery()
+    battery.cfg["timeouts"] = {"inverter": 0.1}
+    session = ModbusSession("127.0.0.1", 1, timeout=0.1)
+    session.client = SlowClient()
+    battery.modbus = session
+
+    with pytest.raises(concurrent.futures.TimeoutError):
+        battery.acquire()
+    assert session.closed
+    assert battery.modbus is False
+
+
+class DroppedFrameClient:
+    """
+    A PySolarmanV5 on the registers of a FakeModbus whose first read gets no answer within the socket
+    timeout.
+    """
+
+    def __init__(self, modbus, timeout):
+        self.modbus = modbus
+        self.timeout = timeout
+        self.dropped = False
+
+    def read_holding_registers(self, register_addr, quantity):
+        if not self.dropped:
+            self.dropped = True
+            time.sleep(self.timeout)
+            raise TimeoutError("timed out")
+        return self.modbus.read_holding_registers(register_addr, quantity)
+
+    def disconnect(self):
+        pass
+
+
+def test_dropped_frame_is_retried_within_the_inverter_leg(make_battery, monkeypatch):
+    battery = make_battery()
+    battery.cfg["timeouts"] = {"inverter": 2}
+    battery.cfg["modbus"] = {"retries": 3, "backoff": 0}
+    battery.modbus = False
+    clients = []
+
+    def connect(session):
+        if not clients:
+            clients.append(DroppedFrameClient(make_battery.modbus, session.timeout))
+        return clients[0]
+
+    monkeypatch.setattr(ModbusSession, "connect", connect)
+    battery.get_hour()
+    battery.acquire()
+    assert battery.modbus.timeout == 0.5
+    assert clients[0].dropped
+    assert battery.inverter_read
+    assert battery.perc == 40
+
+
+def test_prices_of_today_are_kept_before_tomorrow_is_published(make_battery):
+    battery = make_battery()
+    day = DAY + datetime.timedelta(days=7)
+    battery.clock = lambda: datetime.datetime.combine(day, datetime.time(14, 0, 30))
+    battery.get_hour()
+
+    class TodayProvider(PriceProvider):
+        name = "today"
+
+        def fetch(self, start, end, timeout):
+            return PriceCurve(start, 60, array.array("d", [50] * 24))
+
+    battery.providers = [TodayProvider()]
+    p24, p48, prices = battery.fetch_hour_prices(1)
+    assert battery.store.missing(battery.domain, [day, day + datetime.timedelta(days=1)]) == [day + datetime.timedelta(days=1)]
+    assert list(p48.values())[:10] == [50] * 10
+
+
+def test_ha_attributes_show_the_cheapest_charge_block(make_battery):
+    battery = make_battery()
+    battery.dry_run = True
+    battery.run()
+    attributes = battery.ha_attributes()
+
+    kiwatt = battery.cfg["kiwatt"]
+    hours = attributes["charge_hours"]
+    assert hours == -(-20 * (kiwatt["max_percload"] - kiwatt["min_percload"]) // 500)
+    sums = {x: sum(battery.series[x:x + hours]) for x in range(battery.hour_now, len(battery.series) - hours + 1)}
+    first = min(sums, key=sums.get)
+    moment = datetime.datetime.combine(DAY, datetime.time()) + datetime.timedelta(hours=first)
+    assert attributes["charge_start"].startswith(moment.isoformat(sep=' '))
+    assert attributes["charge_high"] == round(battery.consumer_price(max(battery.series[first:first + hours])), 3)
+    assert attributes["average_today"] == round(battery.consumer_price(sum(battery.series[:24]) / 24), 3)
@@ -0,0 +1,54 @@
+import datetime
+import json
+
+import pytest
+
+from classes.daemon_class import Daemon
+
+
+@pytest.fixture
+def daemon(make_battery):
+    battery = make_battery()
+    with open("config.json", "w") as f:
+        json.dump(battery.cfg, f)
+    daemon = Daemon()
+    daemon.battery = battery
+    return daemon
+
+
+@pytest.mark.parametrize("interval, now, wake", [
+    (60, "2025-01-06 10:20:00", "2025-01-06 10:59:00"),
+    (60, "2025-01-06 10:59:30", "2025-01-06 11:59:00"),
+    (15, "2025-01-06 10:20:00", "2025-01-06 10:29:00"),
+    (15, "2025-01-06 23:50:00", "2025-01-06 23:59:00"),
+    (15, "2025-01-06 23:59:00", "2025-01-07 00:14:00"),
+])
+def test_next_wake_is_before_the_boundary(daemon, interval, now, wake):
+    daemon.interval = interval
+    assert daemon.next_wake(datetime.datetime.fromisoformat(now)) == datetime.datetime.fromisoformat(wake)
+
+
+def test_second_tick_keeps_the_plan_and_the_connection(daemon, make_battery):
+    assert daemon.tick()
+    modbus = daemon.battery.modbus
+    writes = make_battery.modbus.writes
+
+    assert not daemon.tick()
+    assert daemon.battery.modbus is modbus
+    assert make_battery.modbus.writes == writes
+
+
+def test_failed_tick_does_not_stop_the_daemon(daemon):
+    ticks = []
+
+    def tick():
+        ticks.append(1)
+        if len(ticks) == 1:
+            raise OSError("no answer")
+        raise KeyboardInterrupt
+
+    daemon.tick = tick
+    daemon.sleep_until = lambda wake: None
+    with pytest.raises(KeyboardInterrupt):
+        daemon.run()
+    assert len(ticks) == 2
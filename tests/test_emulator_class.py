@@ -0,0 +1,115 @@
+import socket
+import struct
+import threading
+
+import pytest
+
+from classes.emulator_class import EmulatorServer, InverterEmulator, crc16
+
+SERIAL = 2713000000
+
+
+def request(modbus, serial=SERIAL, sequence=1):
+    """
+    Builds a SolarmanV5 request frame around a Modbus RTU request without CRC.
+    """
+    modbus += crc16(modbus)
+    payload = bytes([0x02]) + bytes(14) + modbus
+    frame = bytearray(b"\xA5" + struct.pack("<HHH", len(payload), 0x4510, sequence) + struct.pack("<I", serial) + payload + b"\x00\x15")
+    frame[-2] = sum(frame[1:-2]) & 0xFF
+    return bytes(frame)
+
+
+def answer(frame):
+    """
+    Returns the Modbus RTU response of a SolarmanV5 response frame, after checking its CRC.
+    """
+    modbus = frame[25:-2]
+    assert crc16(modbus[:-2]) == modbus[-2:]
+    return modbus[:-2]
+
+
+def read(address, quantity):
+    return request(struct.pack(">BBHH", 1, 3, address, quantity))
+
+
+def test_read_holding_registers():
+    emulator = InverterEmulator(SERIAL)
+    response = answer(emulator.handle(read(148, 6)))
+    assert response[:3] == bytes([1, 3, 12])
+    assert struct.unpack(">6H", response[3:]) == (0, 100, 200, 300, 400, 500)
+    assert emulator.snapshot_stats()["registers_read"] == 6
+
+
+def test_write_multiple_registers():
+    emulator = InverterEmulator(SERIAL)
+    values = [10, 20, 30]
+    response = answer(emulator.handle(request(struct.pack(">BBHHB3H", 1, 16, 166, 3, 6, *values))))
+    assert response == struct.pack(">BBHH", 1, 16, 166, 3)
+    assert [emulator.registers[166 + x] for x in range(3)] == values
+    assert emulator.snapshot_stats()["writes"] == 1
+
+
+def test_bad_frames_are_not_answered():
+    emulator = InverterEmulator(SERIAL)
+    frame = bytearray(read(148, 6))
+    frame[-2] ^= 0xFF
+    assert emulator.handle(bytes(frame)) is None
+
+    # A wrong Modbus CRC with a correct frame checksum
+    frame = bytearray(read(148, 6))
+    frame[-4] ^= 0xFF
+    frame[-2] = sum(frame[1:-2]) & 0xFF
+    assert emulator.handle(bytes(frame)) is None
+    assert emulator.snapshot_stats()["errors"] == 2
+
+
+def test_unsupported_function_and_quantity_are_exceptions():
+    emulator = InverterEmulator(SERIAL)
+    assert answer(emulator.handle(request(struct.pack(">BBHH", 1, 5, 148, 1)))) == bytes([1, 0x85, 1])
+    assert answer(emulator.handle(read(148, 126))) == bytes([1, 0x83, 3])
+
+
+def test_dropped_frames_follow_the_seed():
+    first = InverterEmulator(SERIAL, drop=0.5, seed=7)
+    second = InverterEmulator(SERIAL, drop=0.5, seed=7)
+    answers = [first.handle(read(588, 1)) is None for x in range(20)]
+    assert answers == [second.handle(read(588, 1)) is None for x in range(20)]
+    assert 0 < first.snapshot_stats()["dropped"] < 20
+
+
+def test_battery_drifts_down_without_grid_charge(monkeypatch):
+    emulator = InverterEmulator(SERIAL, drift=10)
+    clock = [1000.0]
+    monkeypatch.setattr("time.monotonic", lambda: clock[0])
+    emulator.updated = clock[0]
+    clock[0] += 1800
+    emulator.update_soc()
+    assert emulator.registers[588] == 45
+
+
+def test_server_answers_over_tcp():
+    emulator = InverterEmulator(SERIAL)
+    with EmulatorServer(("127.0.0.1", 0), emulator) as server:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            with socket.create_connection(server.server_address, timeout=5) as client:
+                # Two frames in one packet are answered in order
+                client.sendall(read(588, 1) + read(102, 1))
+                data = b""
+                while len(data) < 2 * 34:
+                    data += client.recv(1024)
+        finally:
+            server.shutdown()
+    assert struct.unpack(">H", answer(data[:34])[3:])[0] == 50
+    assert struct.unpack(">H", answer(data[34:])[3:])[0] == 400
+    assert emulator.snapshot_stats()["round_trips"] == 2
+
+
+@pytest.mark.parametrize("serial", [1, SERIAL])
+def test_response_echoes_the_serial_and_sequence(serial):
+    emulator = InverterEmulator(serial)
+    response = emulator.handle(request(struct.pack(">BBHH", 1, 3, 588, 1), serial, 42))
+    assert struct.unpack("<H", response[5:7])[0] == 42
+    assert struct.unpack("<I", response[7:11])[0] == serial
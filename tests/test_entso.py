@@ -0,0 +1,85 @@
+import array
+import datetime
+import json
+import os
+import subprocess
+import sys
+import zoneinfo
+
+import pytest
+
+import entso
+from classes.entsoe_class import PriceCurve
+from classes.modbus_class import CircuitOpenError
+from classes.price_provider_class import bidding_zone
+from classes.price_store_class import PriceStore
+from conftest import ROOT
+
+
+@pytest.mark.parametrize("error", [TimeoutError("timed out"), OSError("no route to host"), CircuitOpenError("Logger unreachable")])
+def test_unreachable_inverter_is_notified_and_exits(make_battery, error):
+    battery = make_battery()
+    sent = []
+    battery.notifier.send = lambda messages: sent.append(list(messages)) or True
+
+    def fail(timeout):
+        raise error
+
+    battery.fetch_inverter = fail
+    with pytest.raises(SystemExit) as exit:
+        entso.run(battery)
+    assert str(exit.value) == "Inverter unreachable: " + str(error)
+    assert sent == [["Inverter unreachable: " + str(error)]]
+
+
+def test_missing_prices_exit_with_the_reason(make_battery):
+    battery = make_battery()
+
+    def fail(timeout):
+        raise OSError("no answer")
+
+    battery.fetch_hour_prices = fail
+    with pytest.raises(SystemExit, match="No prices in entsoe.xml"):
+        entso.run(battery)
+
+
+# Fails every import of the network dependencies
+BLOCK = """
+import sys
+class Block:
+    def find_spec(self, name, path=None, target=None):
+        if name.split(".")[0] in ("requests", "pysolarmanv5", "homeassistant_api"):
+            raise ImportError("blocked " + name)
+sys.meta_path.insert(0, Block())
+"""
+
+
+def python(code, cwd=ROOT):
+    return subprocess.run([sys.executable, "-c", BLOCK + code], cwd=cwd, capture_output=True, text=True)
+
+
+def test_battery_imports_without_network_dependencies():
+    result = python("import entso, classes.battery_class, classes.daemon_class, classes.fleet_class")
+    assert result.returncode == 0, result.stderr
+
+
+def test_plan_runs_offline(tmp_path):
+    with open(os.path.join(ROOT, "config copy.json")) as f:
+        cfg = json.load(f)
+    (tmp_path / "config.json").write_text(json.dumps(cfg))
+    store = PriceStore(str(tmp_path / "prices.db"), zoneinfo.ZoneInfo(cfg["entsoe"]["tz"]))
+    today = datetime.date.today()
+    store.save(bidding_zone(cfg["entsoe"].get("country")), PriceCurve(store.day_start(today), 60, array.array("d", (50 + (x * 37) % 90 for x in range(72)))))
+
+    result = python("import sys; sys.argv = ['entso.py', 'plan', '--perc', '55']; sys.path.insert(0, %r); import entso; entso.main()" % ROOT, cwd=tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert "set points:" in result.stdout
+    assert "expected cost:" in result.stdout
+
+
+def test_plan_without_prices_exits_with_the_reason(tmp_path):
+    with open(os.path.join(ROOT, "config copy.json")) as f:
+        (tmp_path / "config.json").write_text(f.read())
+    result = python("import sys; sys.argv = ['entso.py', 'plan', '--perc', '55']; sys.path.insert(0, %r); import entso; entso.main()" % ROOT, cwd=tmp_path)
+    assert result.returncode == 1
+    assert result.stderr.strip() == "No prices in prices.db"
@@ -0,0 +1,56 @@
+import datetime
+import zoneinfo
+
+from classes.entsoe_class import parse_a44
+from classes.price_store_class import PriceStore
+
+
+def document(*series):
+    """
+    Returns an A44 document of TimeSeries given as (curveType, start, end, resolution, {position: price}).
+    """
+    text = ['<Publication_MarketDocument xmlns="urn:iec62325.351:tc57wg16:451-3:publicationdocument:7:3">']
+    for curve_type, start, end, resolution, points in series:
+        text.append(f'<TimeSeries><curveType>{curve_type}</curveType><Period>')
+        text.append(f'<timeInterval><start>{start}</start><end>{end}</end></timeInterval><resolution>{resolution}</resolution>')
+        for position, price in points.items():
+            text.append(f'<Point><position>{position}</position><price.amount>{price}</price.amount></Point>')
+        text.append('</Period></TimeSeries>')
+    text.append('</Publication_MarketDocument>')
+    return ''.join(text).encode()
+
+
+def test_a03_repeats_the_previous_position():
+    curve = parse_a44(document(("A03", "2025-01-05T23:00Z", "2025-01-06T05:00Z", "PT60M", {1: 10, 2: 20, 5: 50})))
+    assert curve.resolution == 60
+    assert list(curve.prices) == [10, 20, 20, 20, 50, 50]
+
+
+def test_a01_gaps_repeat_the_previous_slot():
+    curve = parse_a44(document(("A01", "2025-01-05T23:00Z", "2025-01-06T03:00Z", "PT60M", {1: 10, 3: 30})))
+    assert list(curve.prices) == [10, 10, 30, 30]
+
+
+def test_quarter_hours_win_over_hours():
+    curve = parse_a44(document(
+        ("A01", "2025-01-05T23:00Z", "2025-01-06T01:00Z", "PT60M", {1: 40, 2: 80}),
+        ("A03", "2025-01-05T23:00Z", "2025-01-06T00:00Z", "PT15M", {1: 10, 3: 30}),
+    ))
+    assert curve.resolution == 15
+    assert curve.start == datetime.datetime(2025, 1, 5, 23, tzinfo=datetime.timezone.utc)
+    assert list(curve.prices) == [10, 10, 30, 30] + [80] * 4
+    assert curve.hourly() == [20, 80]
+
+
+def test_short_dst_day_has_23_hours(tmp_path):
+    # The clocks go forward on 2025-03-30 in Amsterdam
+    curve = parse_a44(document(("A01", "2025-03-29T23:00Z", "2025-03-30T22:00Z", "PT60M", {x: x for x in range(1, 24)})))
+    assert len(curve) == 23
+
+    store = PriceStore(str(tmp_path / "prices.db"), zoneinfo.ZoneInfo("Europe/Amsterdam"))
+    assert store.save("NL", curve) == [datetime.date(2025, 3, 30)]
+    assert list(store.load("NL", datetime.date(2025, 3, 30)).prices) == list(range(1, 24))
+
+
+def test_no_prices():
+    assert parse_a44(document()) is None
@@ -0,0 +1,17 @@
+from classes.fleet_class import SITE_FILES, site_configs
+
+
+def test_sites_get_their_own_files():
+    cfg = {"kiwatt": {"ip": "", "sn": 0}, "telemetry": {"path": "telemetry.bin"}, "sites": [
+        {"name": "home", "kiwatt": {"ip": "10.0.0.1"}},
+        {"name": "barn", "kiwatt": {"ip": "10.0.0.2"}, "journal": {"path": "barn.db"}},
+    ]}
+    sites = dict(site_configs(cfg))
+
+    assert sites["home"]["kiwatt"] == {"ip": "10.0.0.1", "sn": 0}
+    assert sites["home"]["telemetry"]["path"] == "telemetry-home.bin"
+    assert sites["barn"]["telemetry"]["path"] == "telemetry-barn.bin"
+    assert sites["home"]["journal"]["path"] == "journal-home.db"
+    assert sites["barn"]["journal"]["path"] == "barn.db"
+    for section, key, default in SITE_FILES:
+        assert sites["home"][section][key] != sites["barn"][section][key]
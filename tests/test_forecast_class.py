@@ -0,0 +1,124 @@
+import datetime
+import json
+import time
+
+import pytest
+
+from classes.forecast_class import ForecastCache, hourly_production, merge_entries, plane_caches, production_vector
+
+ESTIMATE = {"result": {"watt_hours_period": {"2025-01-06 08:00:00": 0, "2025-01-06 09:00:00": 400, "2025-01-06 09:30:00": 300}}}
+
+
+class Response:
+    """
+    A requests response with headers only.
+    """
+
+    def __init__(self, headers):
+        self.headers = headers
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ForecastCache(str(tmp_path / "forecast.json"), "https://api.forecast.solar/estimate/1/2/3/4/5")
+    cache.fetches = []
+
+    def fetch(timeout, cached=None):
+        cache.fetches.append(cached)
+        entry = cache.entry(ESTIMATE, time.time())
+        cache.save(entry)
+        return entry
+
+    cache.fetch = fetch
+    return cache
+
+
+def test_fresh_estimate_comes_from_disk(cache):
+    entry = cache.get(5)
+    assert cache.get(5) == entry
+    assert cache.fetches == [None]
+
+
+def test_expired_estimate_is_fetched_again(cache):
+    entry = cache.get(5)
+    entry["expires"] = time.time() - 1
+    cache.save(entry)
+    cache.get(5)
+    assert len(cache.fetches) == 2
+    assert cache.fetches[1]["production"] == entry["production"]
+
+
+def test_rate_limit_keeps_the_expired_estimate(cache):
+    entry = cache.get(5)
+    entry["expires"] = time.time() - 1
+    entry["retry_at"] = time.time() + 600
+    cache.save(entry)
+    assert cache.get(5) == entry
+    assert len(cache.fetches) == 1
+
+
+def test_retry_at_from_the_headers(cache):
+    assert cache.retry_at(Response({"X-Ratelimit-Retry-At": "2025-01-06T10:00:00+00:00"}), {}) == 1736157600
+    assert cache.retry_at(Response({"X-Ratelimit-Remaining": "0", "X-Ratelimit-Period": "600"}), {}) == pytest.approx(time.time() + 600, abs=5)
+    assert cache.retry_at(Response({"X-Ratelimit-Remaining": "3"}), {}) == 0
+
+
+def test_retry_at_from_the_message(cache):
+    estimate = {"message": {"ratelimit": {"remaining": 0, "period": 1800}}}
+    assert cache.retry_at(Response({}), estimate) == pytest.approx(time.time() + 1800, abs=5)
+    assert cache.retry_at(Response({}), {"message": None}) == 0
+
+
+def test_older_cache_file_with_the_raw_estimate(cache):
+    with open(cache.path, "w") as f:
+        json.dump(ESTIMATE, f)
+    entry = cache.load()
+    assert entry["expires"] == 0
+    assert entry["production"][8] == 400
+
+
+def test_production_is_spread_over_the_slots_of_its_period():
+    start, production = production_vector(ESTIMATE["result"]["watt_hours_period"], 15)
+    assert start == "2025-01-06"
+    assert len(production) == 96
+    assert production[32:38] == [100, 100, 100, 100, 150, 150]
+    assert sum(production) == 700
+
+    start, production = production_vector(ESTIMATE["result"]["watt_hours_period"], 60)
+    assert production[8:10] == [400, 300]
+
+
+def test_one_cache_per_plane():
+    config = {"lat": 52, "long": 5, "dec": 30, "az": 0, "kwp": 4, "planes": [{"name": "east", "az": -90, "kwp": 2}, {"az": 90, "dec": 40}]}
+    caches = plane_caches(config, 600)
+    assert [cache.path for cache in caches] == ["forecast-east.json", "forecast-2.json"]
+    assert [cache.url for cache in caches] == [
+        "https://api.forecast.solar/estimate/52/5/30/-90/2",
+        "https://api.forecast.solar/estimate/52/5/40/90/4",
+    ]
+    assert caches[0].ttl == 600
+
+
+def test_configuration_without_planes_is_one_plane():
+    caches = plane_caches({"lat": 52, "long": 5, "dec": 30, "az": 0, "kwp": 4})
+    assert [cache.path for cache in caches] == ["forecast.json"]
+
+
+def test_planes_are_added_up_per_slot():
+    today = {"fetched": 100, "expires": 3700, "retry_at": 0, "start": "2025-01-06", "resolution": 60, "production": [0] * 8 + [100, 200]}
+    tomorrow = {"fetched": 200, "expires": 1800, "retry_at": 5000, "start": "2025-01-07", "resolution": 60, "production": [0] * 8 + [50]}
+    merged = merge_entries([today, tomorrow])
+    assert merged["start"] == "2025-01-06"
+    assert len(merged["production"]) == 33
+    assert merged["production"][8:10] == [100, 200]
+    assert merged["production"][32] == 50
+    assert merged["expires"] == 1800
+    assert merged["retry_at"] == 3700
+    assert merge_entries([today]) is today
+
+
+def test_hourly_production_of_quarter_hours():
+    entry = {"start": "2025-01-06", "resolution": 15, "production": [10] * 96}
+    assert hourly_production(entry, datetime.date(2025, 1, 6), 2) == [40, 40]
+    assert hourly_production(entry, datetime.date(2025, 1, 5), 26)[22:26] == [0, 0, 40, 40]
+    assert hourly_production(entry, datetime.date(2025, 1, 7), 1) == [0]
@@ -0,0 +1,65 @@
+import time
+
+from classes.homeassistant_class import HomeAssistantPublisher
+
+
+class State:
+    def __init__(self):
+        self.attributes = {"friendly_name": "Load now"}
+
+
+class Client:
+    """
+    A Home Assistant client that records the states it was sent.
+    """
+
+    def __init__(self):
+        self.states = []
+
+    def set_state(self, state):
+        self.states.append(dict(state.attributes))
+
+
+def publisher(path):
+    publisher = HomeAssistantPublisher("http://localhost:8123/api", "token", refresh=3600, path=path)
+    publisher.client = Client()
+    publisher.state = State()
+    return publisher
+
+
+def test_unchanged_attributes_are_not_published(tmp_path):
+    ha = publisher(str(tmp_path / "homeassistant.json"))
+    assert ha.publish({"low_today": 0.2, "loads": [{"time": "03:30", "price": "0.200"}]})
+    assert not ha.publish({"low_today": 0.2, "loads": [{"time": "03:30", "price": "0.200"}]})
+    assert ha.publish({"low_today": 0.3, "loads": [{"time": "03:30", "price": "0.200"}]})
+    assert len(ha.client.states) == 2
+
+
+def test_other_attributes_of_the_sensor_are_kept():
+    ha = publisher(None)
+    ha.publish({"low_today": 0.2})
+    assert ha.client.states == [{"friendly_name": "Load now", "low_today": 0.2}]
+
+
+def test_state_file_dedupes_across_runs(tmp_path):
+    path = str(tmp_path / "homeassistant.json")
+    publisher(path).publish({"low_today": 0.2, "points": (1, 2)})
+
+    ha = publisher(path)
+    assert not ha.publish({"low_today": 0.2, "points": (1, 2)})
+    assert ha.client.states == []
+
+
+def test_unchanged_attributes_are_refreshed():
+    ha = publisher(None)
+    ha.publish({"low_today": 0.2})
+    ha.published_at = time.time() - 3601
+    assert ha.publish({"low_today": 0.2})
+
+
+def test_state_file_of_another_sensor_is_ignored(tmp_path):
+    path = str(tmp_path / "homeassistant.json")
+    publisher(path).publish({"low_today": 0.2})
+
+    other = HomeAssistantPublisher("http://localhost:8123/api", "token", "sensor.other", path=path)
+    assert other.published == {}
@@ -0,0 +1,64 @@
+from classes.journal_class import RunJournal, fingerprint
+
+
+def test_rerun_keeps_a_confirmed_plan(make_battery):
+    battery = make_battery()
+    battery.run()
+    planned = battery.set_points
+    writes = make_battery.modbus.writes
+    assert writes > 0
+
+    battery = make_battery()
+    battery.run()
+    assert battery.set_points == planned
+    assert battery.writes == []
+    assert make_battery.modbus.writes == writes
+    assert battery.journal.last()["memoized"]
+
+
+def test_rerun_after_a_failed_write_writes_again(make_battery):
+    modbus = make_battery.modbus
+    modbus.fail = {166}
+    battery = make_battery()
+    battery.run()
+    planned = battery.set_points
+    assert not battery.journal.last()["confirmed"]
+    # The set points were written and rolled back
+    assert [modbus.registers[148 + x] for x in range(6)] == [0] * 6
+
+    modbus.fail = set()
+    battery = make_battery()
+    battery.run()
+    assert not battery.journal.last()["memoized"]
+    assert battery.journal.last()["confirmed"]
+    assert [modbus.registers[148 + x] for x in range(6)] == planned
+
+
+def test_rerun_with_a_changed_table_writes_again(make_battery):
+    make_battery().run()
+    modbus = make_battery.modbus
+    planned = [modbus.registers[166 + x] for x in range(6)]
+    modbus.registers[166] = 55
+
+    battery = make_battery()
+    battery.run()
+    assert not battery.journal.last()["memoized"]
+    assert [modbus.registers[166 + x] for x in range(6)] == planned
+
+
+def test_at_returns_the_run_in_effect(tmp_path):
+    journal = RunJournal(str(tmp_path / "journal.db"))
+    for moment, set_points in ((1000, [100]), (2000, [200]), (3000, [300])):
+        journal.record(fingerprint(moment), {"set_points": set_points}, [[148, set_points]], {148: set_points[0]}, True, True, moment=moment)
+
+    assert journal.at(999) is None
+    assert journal.at(1000)["plan"]["set_points"] == [100]
+    assert journal.at(2999)["plan"]["set_points"] == [200]
+    assert journal.at(5000)["plan"]["set_points"] == [300]
+    assert journal.at(2000)["registers"] == {148: 200}
+    assert journal.at(2000)["writes"] == [[148, [200]]]
+
+
+def test_fingerprint_ignores_key_order():
+    assert fingerprint({"a": 1, "b": 2}) == fingerprint({"b": 2, "a": 1})
+    assert fingerprint({"a": 1}) != fingerprint({"a": 2})
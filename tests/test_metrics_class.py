@@ -0,0 +1,57 @@
+import json
+
+from classes.metrics_class import NO_SPAN, Metrics
+
+
+def test_disabled_metrics_record_nothing(tmp_path):
+    metrics = Metrics(False, str(tmp_path / "trace.jsonl"), str(tmp_path / "kiwatt.prom"))
+    assert metrics.span("plan") is NO_SPAN
+    metrics.count("modbus_reads")
+    metrics.end()
+    assert metrics.counters == {}
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_run_is_one_trace_line(tmp_path):
+    trace = tmp_path / "trace.jsonl"
+    metrics = Metrics(True, str(trace), None)
+    for run in range(2):
+        metrics.begin()
+        with metrics.span("plan"):
+            pass
+        metrics.count("modbus_reads", 2)
+        metrics.end(perc=40 + run)
+
+    runs = [json.loads(line) for line in trace.read_text().splitlines()]
+    assert len(runs) == 2
+    assert [span["name"] for span in runs[1]["spans"]] == ["plan"]
+    assert runs[1]["counters"] == {"modbus_reads": 2}
+    assert runs[1]["perc"] == 41
+
+
+def test_histogram_buckets_are_cumulative(tmp_path):
+    metrics = Metrics(True, None, str(tmp_path / "kiwatt.prom"))
+    metrics.observe("optimize", 0, 0.02)
+    metrics.observe("optimize", 0, 3)
+    text = metrics.exposition()
+    assert 'kiwatt_phase_seconds_bucket{phase="optimize",le="0.01"} 0' in text
+    assert 'kiwatt_phase_seconds_bucket{phase="optimize",le="0.025"} 1' in text
+    assert 'kiwatt_phase_seconds_bucket{phase="optimize",le="5"} 2' in text
+    assert 'kiwatt_phase_seconds_bucket{phase="optimize",le="+Inf"} 2' in text
+    assert 'kiwatt_phase_seconds_count{phase="optimize"} 2' in text
+
+
+def test_counters_never_go_down_across_processes(tmp_path):
+    prom = str(tmp_path / "kiwatt.prom")
+    metrics = Metrics(True, None, prom)
+    metrics.begin()
+    metrics.count("modbus_retries", 3)
+    metrics.end()
+
+    metrics = Metrics(True, None, prom)
+    metrics.begin()
+    metrics.count("modbus_retries")
+    metrics.end()
+    with open(prom) as f:
+        assert 'kiwatt_events_total{event="modbus_retries"} 4' in f.read()
+    assert not (tmp_path / "kiwatt.prom.tmp").exists()
@@ -0,0 +1,79 @@
+import pytest
+
+from classes.modbus_class import CircuitOpenError, ModbusSession
+
+
+class FlakyClient:
+    """
+    A PySolarmanV5 whose reads fail a number of times before they succeed.
+    """
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.reads = 0
+
+    def read_holding_registers(self, register_addr, quantity):
+        self.reads += 1
+        if self.reads <= self.failures:
+            raise OSError("no answer")
+        return [1] * quantity
+
+    def disconnect(self):
+        pass
+
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr("time.sleep", lambda seconds: None)
+    events = []
+    session = ModbusSession("127.0.0.1", 1, retries=2, backoff=0, failures=2, cooldown=300, count=events.append)
+    session.events = events
+    return session
+
+
+def connect(session, client):
+    # Every reconnect gets the same client
+    session.connect = lambda: client
+    return client
+
+
+def test_retry_succeeds(session):
+    client = connect(session, FlakyClient(2))
+    assert session.read_holding_registers(148, 6) == [1] * 6
+    assert client.reads == 3
+    assert session.events == ["modbus_retries", "modbus_retries"]
+    assert session.failed == 0
+
+
+def test_breaker_opens_after_failed_requests(session):
+    client = connect(session, FlakyClient(100))
+    for x in range(2):
+        with pytest.raises(OSError):
+            session.read_holding_registers(148, 6)
+    assert client.reads == 6
+    assert "modbus_circuit_open" in session.events
+
+    # Open: no request reaches the logger until the cooldown passed
+    with pytest.raises(CircuitOpenError):
+        session.read_holding_registers(148, 6)
+    assert client.reads == 6
+
+    session.open_until = 0
+    client.failures = 0
+    assert session.read_holding_registers(148, 6) == [1] * 6
+
+
+def test_closed_session_does_not_retry(session):
+    client = connect(session, FlakyClient(100))
+    session.close()
+    with pytest.raises(OSError):
+        session.read_holding_registers(148, 6)
+    assert client.reads == 1
+    assert "modbus_retries" not in session.events
+
+
+def test_closed_session_does_not_connect():
+    session = ModbusSession("127.0.0.1", 1)
+    session.close()
+    with pytest.raises(ConnectionError):
+        session.connect()
@@ -0,0 +1,78 @@
+import json
+import threading
+
+from classes.notifier_class import Notifier
+
+
+def notifier(tmp_path, accepted):
+    notifier = Notifier("bot", "chat", path=str(tmp_path / "notified.json"))
+    notifier.posted = []
+
+    def post(text):
+        notifier.posted.append(text)
+        return accepted
+
+    notifier.post = post
+    return notifier
+
+
+def test_sent_message_is_deduplicated(tmp_path):
+    sender = notifier(tmp_path, True)
+    assert sender.send(["Sell first ON"])
+    sender.wait()
+    assert not sender.send(["Sell first ON"])
+    assert sender.posted == ["Sell first ON"]
+
+    # Also in the next run
+    with open(tmp_path / "notified.json") as f:
+        assert len(json.load(f)) == 1
+    assert not notifier(tmp_path, True).send(["Sell first ON"])
+
+
+def test_failed_message_is_sent_again(tmp_path):
+    sender = notifier(tmp_path, False)
+    assert sender.send(["Sell first ON"])
+    sender.wait()
+    assert sender.sent == {}
+    assert not (tmp_path / "notified.json").exists()
+
+    assert sender.send(["Sell first ON"])
+    sender.wait()
+    assert sender.posted == ["Sell first ON", "Sell first ON"]
+
+
+def test_messages_queued_while_sending_are_merged(tmp_path):
+    sender = notifier(tmp_path, True)
+    started = threading.Event()
+    release = threading.Event()
+    post = sender.post
+
+    def slow(text):
+        started.set()
+        release.wait(5)
+        return post(text)
+
+    sender.post = slow
+    assert sender.send(["first"])
+    thread = sender.thread
+    started.wait(5)
+    assert not thread.daemon
+    assert sender.send(["second", "second"])
+    assert sender.send(["third"])
+    assert not sender.send(["third"])
+    release.set()
+    sender.wait(5)
+
+    assert sender.posted == ["first", "second\n\nthird"]
+    assert not thread.is_alive()
+    assert sender.thread is None
+
+
+def test_message_is_sent_again_after_the_dedupe_period(tmp_path):
+    sender = notifier(tmp_path, True)
+    sender.send(["Battery empty"])
+    sender.wait()
+    sender.sent = {digest: sent - sender.dedupe for digest, sent in sender.sent.items()}
+    assert sender.send(["Battery empty"])
+    sender.wait()
+    assert sender.posted == ["Battery empty", "Battery empty"]
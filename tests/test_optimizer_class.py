@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+from classes.backtest_class import valid_table
+from classes.optimizer_class import Optimizer
+
+
+def instance(seed):
+    """
+    Returns random prices, consumption, production and battery percentage of two days.
+    """
+    rng = random.Random(seed)
+    n = rng.choice([10, 24, 36, 48])
+    prices = [rng.uniform(0.05, 0.4) for x in range(n)]
+    drain = [rng.uniform(0.2, 1.0) for x in range(n)]
+    pv = [max(0, rng.uniform(-2, 3)) if 8 <= x % 24 <= 17 else 0 for x in range(n)]
+    return prices, drain, pv, rng.randint(10, 90)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_table_is_the_schedule(seed):
+    prices, drain, pv, perc = instance(seed)
+    optimizer = Optimizer(20, 10, 90, 5)
+    schedule = optimizer.optimize(prices, drain, pv, perc)
+    start = seed % 24 * 60
+
+    table = optimizer.to_table(schedule, start)
+    assert valid_table(*table)
+
+    # The table repeats after 24 hours, the schedule of the first day is exact
+    day = min(24, len(schedule))
+    back = optimizer.from_table(*table, start, day)
+    assert back == schedule[:day]
+    assert optimizer.simulate(back, prices[:day], drain, pv, perc)[0] == pytest.approx(optimizer.simulate(schedule[:day], prices[:day], drain, pv, perc)[0])
+
+
+@pytest.mark.parametrize("schedule", [[90] * 24, [None] * 24, [None] * 5 + [50, 60, 60] + [None] * 16, [40] * 3 + [None] * 21])
+def test_table_has_six_entries(schedule):
+    optimizer = Optimizer(20, 10, 90, 5)
+    table = optimizer.to_table(schedule, 180)
+    assert valid_table(*table)
+    assert optimizer.from_table(*table, 180, 24) == schedule
+
+
+def test_known_optimum():
+    # Cheap nights, a dear evening peak: charge at night, cover the peak and four more hours
+    prices = [0.05] * 6 + [0.25] * 12 + [0.5] * 4 + [0.25] * 2
+    optimizer = Optimizer(10, 10, 90, 5)
+    schedule = optimizer.optimize(prices, [1] * 24, [0] * 24, 10)
+    cost, trajectory, bought = optimizer.simulate(schedule, prices, [1] * 24, [0] * 24, 10)
+
+    assert cost == pytest.approx(6 * 0.05 + 8 * 0.05 + 10 * 0.25)
+    assert bought == pytest.approx(6 + 8 + 10)
+    assert trajectory[5] == pytest.approx(90)
+    assert all(schedule[x] is None for x in range(18, 22))
+    assert trajectory[21] == pytest.approx(trajectory[17] - 40)
+
+
+def horizon(battery, hours=24):
+    """
+    Returns the prices, consumption and production of the next hours of a planned battery.
+    """
+    hours = range(battery.hour_now, min(battery.hour_now + hours, len(battery.series)))
+    prices = [battery.consumer_price(battery.series[x]) for x in hours]
+    drain = [battery.drain_perc(x) * battery.batt_capacity / 100 for x in hours]
+    pv = [battery.production[x] / 1000 if x < len(battery.production) else 0 for x in hours]
+    return hours[0] % 24 * 60, prices, drain, pv
+
+
+@pytest.mark.parametrize("hour", [3, 9, 14, 22])
+def test_optimum_costs_no_more_than_heuristic_over_24_hours(make_battery, hour):
+    battery = make_battery(hour)
+    battery.dry_run = True
+    battery.run()
+    assert valid_table(battery.set_points, battery.loads, battery.load_points)
+
+    start, prices, drain, pv = horizon(battery)
+    kiwatt = battery.cfg["kiwatt"]
+    optimizer = Optimizer(battery.batt_capacity, kiwatt["min_percload"], kiwatt["max_percload"], battery.maxload)
+    optimal = optimizer.simulate(optimizer.optimize(prices, drain, pv, battery.perc), prices, drain, pv, battery.perc)[0]
+    heuristic = optimizer.simulate(optimizer.from_table(battery.set_points, battery.loads, battery.load_points, start, 24), prices, drain, pv, battery.perc)[0]
+    assert optimal <= heuristic + 1e-9
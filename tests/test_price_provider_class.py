@@ -0,0 +1,76 @@
+import array
+import datetime
+import threading
+import time
+
+from classes.entsoe_class import PriceCurve
+from classes.metrics_class import Metrics
+from classes.price_provider_class import PriceProvider, race
+
+START = datetime.datetime(2025, 1, 5, 23, tzinfo=datetime.timezone.utc)
+END = START + datetime.timedelta(hours=24)
+
+
+class FixedProvider(PriceProvider):
+    """
+    Returns a flat curve, after the release event is set when one is given.
+    """
+
+    def __init__(self, name, price, release=None):
+        self.name = name
+        self.price = price
+        self.release = release
+        self.done = threading.Event()
+
+    def fetch(self, start, end, timeout):
+        if self.release is not None:
+            self.release.wait(timeout)
+        self.done.set()
+        return PriceCurve(start, 60, array.array("d", [self.price] * 24))
+
+
+def test_late_disagreement_is_counted_from_the_provider_thread():
+    metrics = Metrics(enabled=True)
+    release = threading.Event()
+    slow = FixedProvider("slow", 500, release)
+    fast = FixedProvider("fast", 50)
+
+    curve, winner = race([slow, fast], START, END, timeout=5, hedge=0.05, count=metrics.count)
+    assert winner == "fast"
+    assert list(curve.prices) == [50] * 24
+    assert "price_disagreements" not in metrics.counters
+
+    threads = [threading.Thread(target=lambda: [metrics.count("price_hedges") for x in range(1000)]) for x in range(4)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    slow.done.wait(5)
+
+    # The check runs in a done callback right after fetch returned
+    for x in range(100):
+        if "price_disagreements" in metrics.counters:
+            break
+        time.sleep(0.01)
+    assert metrics.counters["price_disagreements"] == 1
+    assert metrics.counters["price_hedges"] == 4001
+
+
+def test_no_valid_curve():
+    class Failing(PriceProvider):
+        name = "failing"
+
+        def fetch(self, start, end, timeout):
+            raise OSError("down")
+
+    assert race([Failing()], START, END, timeout=1) == (None, None)
+
+
+def test_curve_of_the_first_day_wins_when_the_next_day_is_not_published():
+    today = FixedProvider("today", 50)
+    assert race([today], START, END + datetime.timedelta(hours=24), timeout=1) == (None, None)
+
+    curve, winner = race([today], START, END + datetime.timedelta(hours=24), timeout=1, needed=END)
+    assert winner == "today"
+    assert len(curve) == 24
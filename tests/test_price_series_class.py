@@ -0,0 +1,51 @@
+from classes.price_series_class import PriceSeries
+
+PRICES = [50, 20, 80, 20, 90, 10, 90, 60]
+
+
+def test_cheapest_ranks_ties_by_slot():
+    series = PriceSeries(PRICES)
+    assert series.cheapest(3) == [5, 1, 3]
+    assert series.cheapest(2, 2, 5) == [3, 2]
+    assert series.cheapest(10, 6) == [7, 6]
+    assert series.rank[5] == 0
+
+
+def test_dearest_ranks_ties_by_slot():
+    series = PriceSeries(PRICES)
+    assert series.dearest(3) == [4, 6, 2]
+    assert series.dearest(2, 5) == [6, 7]
+
+
+def test_lowest_and_highest_of_a_range():
+    series = PriceSeries(PRICES)
+    assert series.lowest(0, 5) == 1
+    assert series.highest(0, 5) == 4
+    assert series.lowest(6, 100) == 7
+    assert series.lowest(8, 10, default=-1) == -1
+    assert series.highest(3, 3) is None
+    assert len(series) == 8 and series[2] == 80
+
+
+def test_rolling_min_and_max():
+    series = PriceSeries(PRICES)
+    lows, highs = series.rolling(3)
+    assert list(lows) == [20, 20, 20, 10, 10, 10, 60, 60]
+    assert list(highs) == [80, 80, 90, 90, 90, 90, 90, 60]
+    assert series.rolling(3) is series.rolling(3)
+    assert list(series.rolling(1)[0]) == PRICES
+
+
+def test_average_of_a_range():
+    series = PriceSeries(PRICES)
+    assert series.average(0, 4) == 42.5
+    assert series.average(6, 100) == 75
+    assert series.average(5, 5) == 0
+
+
+def test_cheapest_windows_do_not_overlap():
+    series = PriceSeries(PRICES)
+    assert series.cheapest_windows(2) == [0]
+    assert series.cheapest_windows(2, 3) == [0, 2, 4]
+    assert series.cheapest_windows(3, 1, 3) == [3]
+    assert series.cheapest_windows(9) == []
@@ -0,0 +1,58 @@
+import array
+import datetime
+import zoneinfo
+
+import pytest
+
+from classes.entsoe_class import PriceCurve
+from classes.price_store_class import PriceStore
+
+DAY = datetime.date(2025, 1, 6)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PriceStore(str(tmp_path / "prices.db"), zoneinfo.ZoneInfo("Europe/Amsterdam"))
+
+
+def test_only_fully_covered_days_are_stored(store):
+    # 36 hours from local midnight: all of DAY and half of the next day
+    curve = PriceCurve(store.day_start(DAY), 60, array.array("d", range(36)))
+    assert store.save("NL", curve) == [DAY]
+    assert store.missing("NL", [DAY, DAY + datetime.timedelta(days=1)]) == [DAY + datetime.timedelta(days=1)]
+    assert list(store.load("NL", DAY).prices) == list(range(24))
+
+
+def test_curve_starting_before_local_midnight_is_split_per_day(store):
+    # ENTSO-e curves start at 23:00 UTC, the day before in UTC
+    start = datetime.datetime(2025, 1, 5, 23, tzinfo=datetime.timezone.utc)
+    assert store.day_start(DAY) == start
+    curve = PriceCurve(start - datetime.timedelta(hours=2), 60, array.array("d", range(50)))
+    assert store.save("NL", curve) == [DAY, DAY + datetime.timedelta(days=1)]
+    loaded = store.load("NL", DAY, 2)
+    assert loaded.start == start
+    assert list(loaded.prices) == list(range(2, 50))
+
+
+def test_load_stops_at_the_first_missing_day(store):
+    store.save("NL", PriceCurve(store.day_start(DAY), 60, array.array("d", [1] * 24)))
+    assert len(store.load("NL", DAY, 3)) == 24
+    assert store.load("NL", DAY - datetime.timedelta(days=1)) is None
+    assert store.load("BE", DAY) is None
+
+
+def test_days_of_different_resolutions_load_on_the_finest_grid(store):
+    store.save("NL", PriceCurve(store.day_start(DAY), 60, array.array("d", range(24))))
+    tomorrow = DAY + datetime.timedelta(days=1)
+    store.save("NL", PriceCurve(store.day_start(tomorrow), 15, array.array("d", [7] * 96)))
+    curve = store.load("NL", DAY, 2)
+    assert curve.resolution == 15
+    assert len(curve) == 192
+    assert list(curve.prices[:8]) == [0, 0, 0, 0, 1, 1, 1, 1]
+    assert curve.hourly(store.day_start(tomorrow), 1) == [7]
+
+
+def test_saving_again_replaces_the_day(store):
+    store.save("NL", PriceCurve(store.day_start(DAY), 60, array.array("d", [1] * 24)))
+    store.save("NL", PriceCurve(store.day_start(DAY), 60, array.array("d", [2] * 24)))
+    assert list(store.load("NL", DAY).prices) == [2] * 24
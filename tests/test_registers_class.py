@@ -0,0 +1,92 @@
+import pytest
+
+from classes.registers_class import RegisterMap, WriteError, plan_writes
+from conftest import FakeModbus
+
+
+def test_unchanged_registers_are_left_out():
+    current = {148: 100, 149: 200, 150: 300}
+    assert plan_writes(current, dict(current)) == []
+    assert plan_writes(current, {148: 100, 149: 201, 150: 300}) == [(149, [201])]
+
+
+def test_adjacent_changes_are_one_write():
+    current = {148 + x: 0 for x in range(6)}
+    assert plan_writes(current, {148 + x: x + 1 for x in range(6)}) == [(148, [1, 2, 3, 4, 5, 6])]
+
+
+def test_gaps_are_bridged_with_the_current_value():
+    current = {148: 1, 149: 2, 150: 3}
+    desired = {148: 9, 150: 9}
+    assert plan_writes(current, desired) == [(148, [9]), (150, [9])]
+    assert plan_writes(current, desired, max_gap=1) == [(148, [9, 2, 9])]
+
+
+def test_unknown_registers_are_not_bridged():
+    assert plan_writes({148: 1, 150: 3}, {148: 9, 150: 9}, max_gap=1) == [(148, [9]), (150, [9])]
+
+
+def test_writes_keep_the_order_of_desired():
+    current = {142: 0, 148: 0, 166: 0}
+    writes = plan_writes(current, {166: 5, 148: 5, 142: 1})
+    assert [address for address, values in writes] == [166, 148, 142]
+
+
+def test_writes_are_split_at_max_write():
+    current = {x: 0 for x in range(10)}
+    assert plan_writes(current, {x: 1 for x in range(10)}, max_write=4) == [(0, [1] * 4), (4, [1] * 4), (8, [1] * 2)]
+
+
+def test_apply_reads_back_once():
+    modbus = FakeModbus()
+    current = {x: modbus.registers[x] for x in range(148, 178)}
+    desired = {148: 100, 149: 200, 166: 50}
+    writes, wrong = RegisterMap().apply(modbus, current, desired)
+    assert writes == [(148, [100, 200]), (166, [50])]
+    assert wrong == {}
+    assert modbus.reads == 1
+
+
+def test_failed_write_rolls_back_the_earlier_writes():
+    modbus = FakeModbus()
+    modbus.registers[148] = 7
+    current = {x: modbus.registers[x] for x in range(148, 178)}
+    modbus.fail = {166}
+
+    with pytest.raises(WriteError) as error:
+        RegisterMap().apply(modbus, current, {148: 100, 166: 50, 172: 1})
+    assert error.value.written == [(148, [100])]
+    assert error.value.rolled_back
+    assert modbus.registers[148] == 7
+    assert modbus.registers[172] == 0
+
+
+def test_rollback_of_unknown_registers_is_reported():
+    modbus = FakeModbus()
+    modbus.fail = {166}
+    with pytest.raises(WriteError) as error:
+        RegisterMap().apply(modbus, {}, {148: 100, 166: 50})
+    assert not error.value.rolled_back
+    assert modbus.registers[148] == 100
+
+
+def test_blocks_cover_every_register_in_few_reads():
+    # 102-177 fit in one read, 588 is too far away
+    assert RegisterMap().blocks() == [(102, 76), (588, 1)]
+    assert RegisterMap(max_gap=10).blocks() == [(102, 7), (142, 12), (166, 12), (588, 1)]
+    assert RegisterMap(max_read=50).blocks() == [(102, 41), (148, 30), (588, 1)]
+
+
+def test_snapshot_reads_once_per_block():
+    modbus = FakeModbus()
+    modbus.registers.update({148 + x: x * 100 for x in range(6)})
+    modbus.registers[172] = 1
+    snapshot = RegisterMap().snapshot(modbus)
+    assert modbus.reads == 2
+    assert snapshot.batt_capacity == 20
+    assert snapshot.maxload == 5
+    assert snapshot.work_mode == 1
+    assert snapshot.set_points == [0, 100, 200, 300, 400, 500]
+    assert snapshot.load_points == [1, 0, 0, 0, 0, 0]
+    assert snapshot.perc == 40
+    assert len(snapshot.registers) == 77
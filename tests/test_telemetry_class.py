@@ -0,0 +1,60 @@
+import pytest
+
+from classes.telemetry_class import RingBuffer
+
+
+def sample(moment, soc=50):
+    return (moment, soc, 100, -200, 300, 400, 0)
+
+
+def test_wrap_around_keeps_the_newest_samples(tmp_path):
+    ring = RingBuffer(str(tmp_path / "telemetry.bin"), capacity=5)
+    for moment in range(1000, 1080, 10):
+        ring.append(sample(moment))
+    assert len(ring) == 5
+    assert [ring.timestamp(x) for x in range(5)] == [1030, 1040, 1050, 1060, 1070]
+    assert [x[0] for x in ring.samples(0, 2000)] == [1030, 1040, 1050, 1060, 1070]
+    ring.close()
+
+
+def test_window_across_the_end_of_the_file(tmp_path):
+    ring = RingBuffer(str(tmp_path / "telemetry.bin"), capacity=5)
+    for moment in range(1000, 1080, 10):
+        ring.append(sample(moment))
+    views = ring.window(1035, 1065)
+    # Slots 4, 0 and 1 hold 1040, 1050 and 1060
+    assert len(views) == 2
+    assert [x[0] for x in ring.samples(1035, 1065)] == [1040, 1050, 1060]
+    for view in views:
+        view.release()
+    ring.close()
+
+
+@pytest.mark.parametrize("moment, index", [(0, 0), (1030, 0), (1031, 1), (1070, 4), (1071, 5)])
+def test_bisect(tmp_path, moment, index):
+    ring = RingBuffer(str(tmp_path / "telemetry.bin"), capacity=5)
+    for x in range(1000, 1080, 10):
+        ring.append(sample(x))
+    assert ring.bisect(moment) == index
+    ring.close()
+
+
+def test_reopen_keeps_the_samples_and_capacity(tmp_path):
+    path = str(tmp_path / "telemetry.bin")
+    ring = RingBuffer(path, capacity=3)
+    for moment in (1, 2, 3, 4):
+        ring.append(sample(moment))
+    ring.close()
+
+    ring = RingBuffer(path, capacity=100)
+    assert ring.capacity == 3
+    assert [x[0] for x in ring.samples(0, 10)] == [2, 3, 4]
+    ring.close()
+
+
+def test_empty_window(tmp_path):
+    ring = RingBuffer(str(tmp_path / "telemetry.bin"), capacity=5)
+    assert ring.window(0, 10) == []
+    ring.append(sample(100))
+    assert ring.window(0, 100) == []
+    ring.close()